@@ -0,0 +1,388 @@
+#!/usr/bin/env python3
+
+"""
+Hardware-free streaming benchmark.
+
+Starts the server with the synthetic camera, opens N /video_feed and /event_stream clients, drives the control
+endpoints and reports throughput, latency percentiles, server CPU and memory.
+
+Usage:
+    bench/stream_bench.py --clients 4 --duration 20 --save-baseline bench/baseline.json
+    bench/stream_bench.py --clients 4 --duration 20 --baseline bench/baseline.json
+    bench/stream_bench.py --pixelformat YUYV --size 1920x1080 --encoders 4
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+from pathlib import Path
+import subprocess
+import sys
+import time
+
+
+REPO_DIR = Path(__file__).absolute().parent.parent
+
+# Metric path in the report: True if higher is better.
+COMPARED_METRICS = {
+    'video.total_fps': True,
+    'video.throughput_mbps': True,
+    'video.frame_interval.p99': False,
+    'events.latency.p50': False,
+    'events.latency.p99': False,
+    'control.rtt.p50': False,
+    'control.rtt.p99': False,
+    'server.cpu_percent': False,
+    'server.max_rss_mb': False,
+}
+
+
+def percentiles(samples: list[float]) -> dict[str, float] | None:
+    if not samples:
+        return None
+
+    ordered = sorted(samples)
+    return {
+        f'p{p}': ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))] for p in [50, 95, 99]
+    } | {'max': ordered[-1]}
+
+
+class HTTPStream:
+    """
+    Minimal HTTP/1.1 client over asyncio streams: the benchmark has no dependencies except of the server ones.
+    """
+
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter, status: int,
+                 headers: dict[str, str]):
+        self._reader = reader
+        self._writer = writer
+        self.status = status
+        self.headers = headers
+        self._chunked = 'chunked' == headers.get('transfer-encoding')
+        self._remaining = int(headers['content-length']) if 'content-length' in headers else None
+
+    @classmethod
+    async def open(cls, host: str, port: int, method: str, path: str, body: bytes | None = None) -> 'HTTPStream':
+        reader, writer = await asyncio.open_connection(host, port)
+        request = [f'{method} {path} HTTP/1.1', f'Host: {host}:{port}', 'Connection: close']
+        if body is not None:
+            request += ['Content-Type: application/json', f'Content-Length: {len(body)}']
+        writer.write(('\r\n'.join(request) + '\r\n\r\n').encode() + (body or b''))
+        await writer.drain()
+
+        status_line = await reader.readline()
+        headers = {}
+        while (line := await reader.readline()) not in (b'\r\n', b''):
+            name, _, value = line.decode().partition(':')
+            headers[name.strip().lower()] = value.strip()
+
+        return cls(reader, writer, int(status_line.split()[1]), headers)
+
+    async def read_chunk(self) -> bytes:
+        """
+        :return: next piece of the body, empty bytes at the end.
+        """
+        if self._chunked:
+            size = int((await self._reader.readline()).split(b';')[0], 16)
+            if 0 == size:
+                return b''
+            data = await self._reader.readexactly(size)
+            await self._reader.readline()
+            return data
+
+        if self._remaining is not None:
+            if self._remaining <= 0:
+                return b''
+            data = await self._reader.read(min(self._remaining, 65536))
+            self._remaining -= len(data)
+            return data
+
+        return await self._reader.read(65536)
+
+    async def read_all(self) -> bytes:
+        body = b''
+        while chunk := await self.read_chunk():
+            body += chunk
+        return body
+
+    def close(self):
+        self._writer.close()
+
+
+async def request(host: str, port: int, method: str, path: str, payload=None) -> tuple[int, bytes]:
+    stream = await HTTPStream.open(host, port, method, path, None if payload is None else json.dumps(payload).encode())
+    try:
+        return stream.status, await stream.read_all()
+    finally:
+        stream.close()
+
+
+class Results:
+    def __init__(self):
+        self.frames = 0
+        self.frame_bytes = 0
+        self.frame_intervals: list[float] = []
+        self.client_frames: list[int] = []
+        self.event_latencies: list[float] = []
+        self.events = 0
+        self.control_rtt: list[float] = []
+        self.control_errors = 0
+        # Focus value: time when it was submitted.
+        self.focus_submitted: dict[int, float] = {}
+
+
+async def video_client(host: str, port: int, results: Results, deadline: float, path: str):
+    stream = await HTTPStream.open(host, port, 'GET', path)
+    buffer = b''
+    frames = 0
+    last_frame = None
+
+    try:
+        while time.monotonic() < deadline and (chunk := await stream.read_chunk()):
+            buffer += chunk
+
+            while (header_end := buffer.find(b'\r\n\r\n')) >= 0:
+                headers = buffer[:header_end].decode(errors='replace')
+                length = next((int(line.split(':')[1]) for line in headers.split('\r\n')
+                               if line.lower().startswith('content-length')), None)
+                if length is None or len(buffer) < header_end + 4 + length + 2:
+                    break
+
+                buffer = buffer[header_end + 4 + length + 2:]
+                now = time.monotonic()
+                if last_frame is not None:
+                    results.frame_intervals.append(now - last_frame)
+                last_frame = now
+                frames += 1
+                results.frames += 1
+                results.frame_bytes += length
+    finally:
+        stream.close()
+        results.client_frames.append(frames)
+
+
+async def event_client(host: str, port: int, results: Results, deadline: float):
+    stream = await HTTPStream.open(host, port, 'GET', '/event_stream')
+    buffer = b''
+
+    try:
+        while time.monotonic() < deadline:
+            try:
+                chunk = await asyncio.wait_for(stream.read_chunk(), max(0.01, deadline - time.monotonic()))
+            except asyncio.TimeoutError:
+                break
+            if not chunk:
+                break
+
+            buffer += chunk.replace(b'\r\n', b'\n')
+            while (end := buffer.find(b'\n\n')) >= 0:
+                message, buffer = buffer[:end], buffer[end + 2:]
+                data = [line[5:].strip() for line in message.split(b'\n') if line.startswith(b'data:')]
+                if not data:
+                    continue
+
+                results.events += 1
+                event = json.loads(b'\n'.join(data))
+                payload = event.get('payload')
+                if 'Focus' == event.get('event_type') and (submitted := results.focus_submitted.get(
+                        payload.get('value'))) is not None:
+                    results.event_latencies.append(time.monotonic() - submitted)
+    finally:
+        stream.close()
+
+
+async def control_driver(host: str, port: int, results: Results, deadline: float, rate: float):
+    commands = [
+        lambda i: ('/api/camera/focus', {'auto': False, 'value': i % 256}),
+        lambda i: ('/api/camera/ptz', {'pan': 0, 'tilt': 0, 'zoom': i % 10}),
+        lambda i: ('/api/motion/direction', {'direction': 'N', 'x': 0, 'y': 50}),
+    ]
+    i = 0
+
+    while time.monotonic() < deadline:
+        path, payload = commands[i % len(commands)](i // len(commands))
+        started = time.monotonic()
+        if 'value' in payload:
+            results.focus_submitted[payload['value']] = started
+
+        status, _ = await request(host, port, 'POST', path, payload)
+        results.control_rtt.append(time.monotonic() - started)
+        if 200 != status:
+            results.control_errors += 1
+
+        i += 1
+        await asyncio.sleep(max(0.0, started + 1 / rate - time.monotonic()))
+
+
+class ProcessMonitor:
+    """
+    Server CPU time and resident memory from /proc.
+    """
+
+    def __init__(self, pid: int):
+        self._pid = pid
+        self._ticks = os.sysconf('SC_CLK_TCK')
+        self.max_rss = 0
+        self._cpu_started = self._cpu_time()
+        self._started = time.monotonic()
+
+    def _cpu_time(self) -> float:
+        with open(f'/proc/{self._pid}/stat') as f:
+            # Process name may contain spaces: fields after it.
+            fields = f.read().rsplit(')', 1)[1].split()
+        return (int(fields[11]) + int(fields[12])) / self._ticks
+
+    def sample(self):
+        with open(f'/proc/{self._pid}/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    self.max_rss = max(self.max_rss, int(line.split()[1]) * 1024)
+
+    def cpu_percent(self) -> float:
+        return 100 * (self._cpu_time() - self._cpu_started) / (time.monotonic() - self._started)
+
+
+async def monitor_process(monitor: ProcessMonitor, deadline: float):
+    while time.monotonic() < deadline:
+        monitor.sample()
+        await asyncio.sleep(0.5)
+
+
+async def run_benchmark(host: str, port: int, clients: int, event_clients: int, duration: float, control_rate: float,
+                        video_path: str, pid: int | None) -> dict:
+    results = Results()
+    monitor = ProcessMonitor(pid) if pid is not None else None
+    deadline = time.monotonic() + duration
+    started = time.monotonic()
+
+    tasks = [video_client(host, port, results, deadline, video_path) for _ in range(clients)]
+    tasks += [event_client(host, port, results, deadline) for _ in range(event_clients)]
+    tasks.append(control_driver(host, port, results, deadline, control_rate))
+    if monitor is not None:
+        tasks.append(monitor_process(monitor, deadline))
+
+    await asyncio.gather(*tasks)
+    elapsed = time.monotonic() - started
+
+    return {
+        'clients': clients,
+        'event_clients': event_clients,
+        'duration': elapsed,
+        'video': {
+            'total_fps': results.frames / elapsed,
+            'client_fps': {'min': min(results.client_frames, default=0) / elapsed,
+                           'max': max(results.client_frames, default=0) / elapsed},
+            'throughput_mbps': 8 * results.frame_bytes / elapsed / 1e6,
+            'frame_interval': percentiles(results.frame_intervals),
+        },
+        'events': {'received': results.events, 'latency': percentiles(results.event_latencies)},
+        'control': {'requests': len(results.control_rtt), 'errors': results.control_errors,
+                    'rtt': percentiles(results.control_rtt)},
+        'server': None if monitor is None else {'cpu_percent': monitor.cpu_percent(),
+                                                'max_rss_mb': monitor.max_rss / 2 ** 20},
+    }
+
+
+def get_metric(report: dict, path: str) -> float | None:
+    value = report
+    for name in path.split('.'):
+        if not isinstance(value, dict) or (value := value.get(name)) is None:
+            return None
+    return value
+
+
+def compare(report: dict, baseline: dict, tolerance: float) -> list[str]:
+    """
+    :return: regressions.
+    """
+    regressions = []
+
+    for path, higher_is_better in COMPARED_METRICS.items():
+        current, base = get_metric(report, path), get_metric(baseline, path)
+        if current is None or base is None or 0 == base:
+            continue
+
+        change = (current - base) / abs(base)
+        regressed = change < -tolerance if higher_is_better else change > tolerance
+        print(f'{path:30} {base:12.4f} -> {current:12.4f} {change:+8.1%}{"  REGRESSION" if regressed else ""}')
+
+        if regressed:
+            regressions.append(path)
+
+    return regressions
+
+
+async def wait_ready(host: str, port: int, timeout: float):
+    deadline = time.monotonic() + timeout
+
+    while time.monotonic() < deadline:
+        try:
+            if 200 == (await request(host, port, 'GET', '/api/ready'))[0]:
+                return
+        except OSError:
+            pass
+        await asyncio.sleep(0.2)
+
+    raise TimeoutError(f'Server was not ready in {timeout} s')
+
+
+def start_server(host: str, port: int, pixelformat: str, size: str, encoders: int,
+                 recordings: str = '') -> subprocess.Popen:
+    """
+    :param recordings: recordings directory, empty - recording is disabled (it isn't a part of the baseline).
+    """
+    env = dict(os.environ, SIMPLE_ROBO_CAMERA='synthetic', SIMPLE_ROBO_PIXELFORMAT=pixelformat,
+               SIMPLE_ROBO_SYNTHETIC_SIZE=size, SIMPLE_ROBO_ENCODERS=str(encoders), SIMPLE_ROBO_RECORDINGS=recordings)
+    return subprocess.Popen([sys.executable, '-m', 'uvicorn', 'main:app', '--host', host, '--port', str(port),
+                             '--log-level', 'warning'], cwd=REPO_DIR, env=env)
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--external', action='store_true', help='use already running server')
+    parser.add_argument('--pid', type=int, help='external server pid for CPU and memory statistics')
+    parser.add_argument('--pixelformat', default='MJPG', help='synthetic camera pixel format: MJPG, RGB3, YUYV')
+    parser.add_argument('--size', default='640x480', help='synthetic camera frame size')
+    parser.add_argument('--encoders', type=int, default=1, help='JPEG encoder threads')
+    parser.add_argument('--recordings', default='', help='record the stream into this directory, disabled by default')
+    parser.add_argument('--clients', type=int, default=4, help='video clients')
+    parser.add_argument('--event-clients', type=int, default=2)
+    parser.add_argument('--duration', type=float, default=20)
+    parser.add_argument('--control-rate', type=float, default=10, help='control requests per second')
+    parser.add_argument('--video-path', default='/video_feed', help='i.e. "/video_feed?width=320"')
+    parser.add_argument('--baseline', type=Path, help='compare with the stored report')
+    parser.add_argument('--save-baseline', type=Path, help='store the report')
+    parser.add_argument('--tolerance', type=float, default=0.1, help='allowed relative regression')
+    args = parser.parse_args()
+
+    server = None if args.external else start_server(args.host, args.port, args.pixelformat, args.size,
+                                                            args.encoders, args.recordings)
+    pid = args.pid if args.external else server.pid
+
+    try:
+        await wait_ready(args.host, args.port, 30)
+        report = await run_benchmark(args.host, args.port, args.clients, args.event_clients, args.duration,
+                                     args.control_rate, args.video_path, pid)
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait(10)
+
+    print(json.dumps(report, indent=2))
+
+    if args.save_baseline is not None:
+        args.save_baseline.write_text(json.dumps(report, indent=2))
+
+    if args.baseline is not None:
+        regressions = compare(report, json.loads(args.baseline.read_text()), args.tolerance)
+        if regressions:
+            logging.error('Regressions: %s', ', '.join(regressions))
+            sys.exit(1)
+
+
+if '__main__' == __name__:
+    asyncio.run(main())
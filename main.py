@@ -1,18 +1,25 @@
 #!/usr/bin/env python3
 
 import asyncio
-from fastapi import FastAPI, Request, Response, BackgroundTasks
+from fastapi import FastAPI, Request, Response, BackgroundTasks, Query, WebSocket, WebSocketDisconnect, \
+    HTTPException
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import StreamingResponse
+from fastapi.responses import StreamingResponse, JSONResponse, PlainTextResponse
 from contextlib import asynccontextmanager
+from dataclasses import replace
+from functools import partial
 import uvicorn
 import logging
 from fastapi.templating import Jinja2Templates
 from sse_starlette.sse import EventSourceResponse
 import json
+import os
 
 from pathlib import Path
 import sys
+import time
+
+BOOT_TIME = time.monotonic()
 
 SCRIPT_DIR = Path(__file__).parent
 STATIC_DIR = SCRIPT_DIR / 'pkg' / 'static'
@@ -24,83 +31,511 @@ from pkg.capturers.opencv2 import CV2Capturer as CameraCapturer
 #from pkg.capturers.v4l_cameractrls import V4LCapturer as CameraCapturer
 #from pkg.capturers.ffmpeg import FFMPEGCapturer as CameraCapturer
 
+from pkg.robot_motion_controller import RobotMotionController
+from pkg.motor_control_loop import MotorControlLoop
+from pkg.api_data_structures import PTZRecord, PTZApplied, ControlChange, Focus, Direction, ServerEvent, \
+    ServerEventData, ConnectionInfo, CameraList, ProcessingResult
+from pkg.renditions import Rendition
+from pkg.adaptive_stream import AdaptiveLimits, AdaptiveStreamController
+from pkg.event_bus import EventBus
+from pkg.ptz_scheduler import PTZTarget
+from pkg.control_protocol import decode_command, encode_ack, AckStatus, RESET
+from pkg.wifi_monitor import LinkSample, LinkSampler
+from pkg.camera_list import list_cameras, CameraWatcher
+from pkg.camera_pipeline import CameraPipeline, camera_cpu
 from pkg.camera_motion_controller import CameraMotionController
-from pkg.robot_motion_controller import RobotMotionController, Direction as RobotDirection, Side
-from pkg.api_data_structures import PTZRecord, Focus, Direction, ServerEvent, ServerEventData, ConnectionInfo
-from pkg.frame_generator import FrameGenerator
-from pkg.wifi_monitor import get_wifi_signal_strength
-from pkg.camera_list import list_cameras
+from pkg.capturers.synthetic import SyntheticCapturer
+from pkg.fake_camera_controller import FakeCameraMotionController
+from pkg.subsystems import SubsystemManager
+from pkg.recorder import Recorder
+from pkg.h264_stream import H264EncoderError
+from pkg.processing import STAGES, StageResult
+from pkg.metrics import REGISTRY, CONTROL_COMMAND_SECONDS, PTZ_APPLY_SECONDS
+
+
+# JPEG encoder threads per camera.
+ENCODERS = int(os.environ.get('SIMPLE_ROBO_ENCODERS', min(4, os.cpu_count() or 1)))
+# Capturers without the encoder pool are selected by the import above too.
+capturer_factory = partial(CameraCapturer, encoders=ENCODERS) if CameraCapturer.has_encoder_pool else CameraCapturer
+# 'auto' - discover cameras, 'synthetic' - hardware-free camera (tests and benchmarks).
+CAMERA_MODE = os.environ.get('SIMPLE_ROBO_CAMERA', 'auto')
+SYNTHETIC_PIXELFORMAT = os.environ.get('SIMPLE_ROBO_PIXELFORMAT', 'MJPG')
+SYNTHETIC_CAMERAS = int(os.environ.get('SIMPLE_ROBO_SYNTHETIC_CAMERAS', 1))
+SYNTHETIC_SIZE = tuple(map(int, os.environ.get('SIMPLE_ROBO_SYNTHETIC_SIZE', '640x480').split('x')))
+# Stream recordings, empty value disables recording. Recording is on by default (into
+# $XDG_DATA_HOME/simple_robo/recordings, ~/.local/share/... without it): the recorder is a permanent FrameHub
+# subscriber, so cameras capture and encode all the time, even without viewers.
+RECORDINGS_DIR = os.environ.get('SIMPLE_ROBO_RECORDINGS', str(
+    Path(os.environ.get('XDG_DATA_HOME', Path.home() / '.local' / 'share')) / 'simple_robo' / 'recordings'))
+RECORDINGS_BUDGET_MB = int(os.environ.get('SIMPLE_ROBO_RECORDINGS_BUDGET_MB', 1024))
+# Comma separated processing stages, see pkg.processing.STAGES.
+PROCESSING_STAGES = [name for name in os.environ.get('SIMPLE_ROBO_STAGES', '').split(',') if name]
+if unknown_stages := set(PROCESSING_STAGES) - set(STAGES):
+    raise ValueError(f'Unknown processing stages: {unknown_stages}, use: {list(STAGES)}')
+templates = Jinja2Templates(directory=(STATIC_DIR / 'templates'))
+event_bus = EventBus()
+adaptive_limits = AdaptiveLimits()
+camera_watcher = CameraWatcher(lambda added, removed: on_cameras_changed(added, removed))
+REGISTRY.gauge('robo_event_queue_depth', 'The longest event subscriber queue.',
+               function=lambda: event_bus.queue_depth)
+REGISTRY.gauge('robo_event_subscribers', 'Event subscribers.', function=lambda: event_bus.subscribers)
+link_sampler = LinkSampler(on_change=lambda sample: on_link_changed(sample))
+subsystems = SubsystemManager(BOOT_TIME)
+
+# Hardware is initialized in the lifespan hook: no cameras and None until the subsystem is ready.
+cameras: dict[str, CameraPipeline] = {}
+default_camera_id: str | None = None
+# Serializes the camera start, hot-plug updates and stop.
+cameras_lock = asyncio.Lock()
+cameras_stopping = asyncio.Event()
+# Devices, which failed to open: real path to device, retried in the background.
+failed_devices: dict[str, object] = {}
+# Hot-plug updates and the retry loop.
+camera_tasks: set[asyncio.Task] = set()
+CAMERA_RETRY_INTERVAL = 5.0
+motor_control_loop: MotorControlLoop | None = None
 
+app = FastAPI()
+app.mount('/static', StaticFiles(directory=STATIC_DIR), name='static')
 
-cameras = list_cameras()
 
-if not cameras:
-    logging.warning('PTZ cameras were not found!')
-    cameras = list_cameras(ptz_only=False)
+async def log_first_frame(pipeline: CameraPipeline):
+    # Producer starts with the first viewer.
+    await pipeline.frame_hub.wait_first_frame()
+    subsystems.mark('first_frame')
 
-if not cameras:
-    logging.error('Cameras were not found!')
-    sys.exit(3)
 
+def pipeline_options(camera_id: str, index: int) -> dict:
+    return {
+        'on_ptz_applied': lambda target, applied, errors: on_ptz_applied(camera_id, target, applied),
+        'recordings_dir': Path(RECORDINGS_DIR) / camera_id if RECORDINGS_DIR else None,
+        'recordings_budget': RECORDINGS_BUDGET_MB * 2 ** 20,
+        # Cameras are encoded on the different CPUs.
+        'cpu': camera_cpu(index),
+        'stages': [STAGES[name]() for name in PROCESSING_STAGES],
+        'on_stage_result': lambda result: on_stage_result(camera_id, result),
+    }
 
-CAMERA_PATH = cameras[0].real_path
 
-logging.info('Selected camera: %s', cameras[0].path)
+async def open_camera(camera_id: str, device_path: str, capturer, controller_factory, index: int) -> CameraPipeline:
+    pipeline = await CameraPipeline.open(camera_id, device_path, capturer, controller_factory,
+                                         **pipeline_options(camera_id, index))
+    if pipeline.controller is not None:
+        pipeline.controller.add_change_listener(
+            lambda version, controls: on_controls_changed(camera_id, version, controls))
 
-capturer = CameraCapturer(CAMERA_PATH)
-frame_generator = FrameGenerator(capturer)
-templates = Jinja2Templates(directory=(STATIC_DIR / 'templates'))
-camera_motion_controller = CameraMotionController(CAMERA_PATH)
-robot_motion_controller = RobotMotionController()
-message_queue: asyncio.Queue[ServerEvent] = asyncio.Queue()
+    try:
+        await pipeline.start()
+    except (Exception, asyncio.CancelledError):
+        # Cancelled by the shutdown too: the pipeline isn't in cameras yet, so stop_camera() doesn't stop it.
+        await pipeline.stop()
+        raise
 
-app = FastAPI()
-app.mount('/static', StaticFiles(directory=STATIC_DIR), name='static')
+    cameras[camera_id] = pipeline
+    app.state.first_frame_tasks.add(asyncio.create_task(log_first_frame(pipeline)))
+
+    return pipeline
+
+
+def device_camera_id(device) -> str:
+    return Path(device.real_path).name
+
+
+async def open_device(device, index: int) -> CameraPipeline:
+    # Only PTZ cameras get the motion controller.
+    return await open_camera(device_camera_id(device), device.real_path, capturer_factory,
+                             CameraMotionController if device.has_ptz else None, index)
+
+
+async def open_synthetic_camera(index: int) -> CameraPipeline:
+    # The first synthetic camera has fake PTZ controls, the rest have no controls.
+    return await open_camera(f'synthetic{index}', f'synthetic{index}',
+                             partial(SyntheticCapturer, width=SYNTHETIC_SIZE[0], height=SYNTHETIC_SIZE[1],
+                                     pixelformat=SYNTHETIC_PIXELFORMAT, encoders=ENCODERS),
+                             FakeCameraMotionController if 0 == index else None, index)
+
+
+def select_default_camera():
+    global default_camera_id
+
+    if default_camera_id not in cameras:
+        default_camera_id = next(iter(cameras), None)
+        logging.info('Default camera: %s', default_camera_id)
+
+
+async def start_camera():
+    async with cameras_lock:
+        cameras_stopping.clear()
+        await open_cameras()
+
+
+async def open_cameras():
+    if 'synthetic' == CAMERA_MODE:
+        openers = [open_synthetic_camera(index) for index in range(SYNTHETIC_CAMERAS)]
+        order = [f'synthetic{index}' for index in range(SYNTHETIC_CAMERAS)]
+        devices = None
+    else:
+        # All devices are probed once, PTZ cameras are preferred.
+        devices = sorted(await asyncio.to_thread(list_cameras, ptz_only=False), key=lambda c: not c.has_ptz)
+
+        if not devices:
+            raise RuntimeError('Cameras were not found!')
+
+        if not devices[0].has_ptz:
+            logging.warning('PTZ cameras were not found!')
+
+        subsystems.mark('camera_discovered')
+        openers = [open_device(device, index) for index, device in enumerate(devices)]
+        order = [device_camera_id(device) for device in devices]
+
+    failed = {}
+    for index, result in enumerate(await asyncio.gather(*openers, return_exceptions=True)):
+        if isinstance(result, Exception):
+            logging.error('Camera %s start failed: %s', order[index], result)
+            if devices is not None:
+                failed[devices[index].real_path] = devices[index]
+
+    if not cameras:
+        raise RuntimeError('No camera could be started!')
+
+    # Keep the order of preference: the first camera is the default one.
+    cameras.update({camera_id: cameras.pop(camera_id) for camera_id in order if camera_id in cameras})
+    select_default_camera()
+
+    if devices is not None:
+        failed_devices.update(failed)
+        # Watcher knows all devices: the failed ones are retried by the retry loop, not by the watcher.
+        camera_watcher.start(devices)
+        add_camera_task(retry_failed_cameras())
+
+
+def add_camera_task(coroutine):
+    task = asyncio.create_task(coroutine)
+    camera_tasks.add(task)
+    task.add_done_callback(camera_task_done)
+
+
+def camera_task_done(task: asyncio.Task):
+    camera_tasks.discard(task)
+    if not task.cancelled() and (error := task.exception()) is not None:
+        logging.error('Camera update failed: %s', error)
+
+
+async def retry_failed_cameras():
+    # Not cancelled, it may be opening a device: exits, when the cameras are stopping.
+    while True:
+        try:
+            await asyncio.wait_for(cameras_stopping.wait(), CAMERA_RETRY_INTERVAL)
+            return
+        except asyncio.TimeoutError:
+            pass
+
+        if failed_devices:
+            await update_cameras([], [])
+
+
+async def update_cameras(added: list, removed: list):
+    """
+    Hot-plug: start pipelines for the added devices and stop them for the removed ones, retry the failed ones.
+    """
+    async with cameras_lock:
+        if cameras_stopping.is_set():
+            return
+
+        for device in removed:
+            failed_devices.pop(device.real_path, None)
+            if (pipeline := cameras.pop(device_camera_id(device), None)) is not None:
+                await pipeline.stop()
+
+        retried = [device for path, device in failed_devices.items()
+                   if path not in {device.real_path for device in added}]
+        for device in [*added, *retried]:
+            try:
+                await open_device(device, len(cameras))
+                failed_devices.pop(device.real_path, None)
+            except Exception as e:
+                logging.error('Camera %s start failed: %s', device.real_path, e)
+                failed_devices[device.real_path] = device
+
+        select_default_camera()
+
+
+async def stop_camera():
+    global default_camera_id
+
+    # Queued hot-plug updates return at once, the running one is awaited: it may be opening a device.
+    cameras_stopping.set()
+    camera_watcher.stop()
+    await asyncio.gather(*camera_tasks, return_exceptions=True)
+
+    async with cameras_lock:
+        pipelines = list(cameras.values())
+        cameras.clear()
+        failed_devices.clear()
+        default_camera_id = None
+
+        for task in app.state.first_frame_tasks:
+            task.cancel()
+        await asyncio.gather(*[pipeline.stop() for pipeline in pipelines])
+
+
+def start_motors():
+    global motor_control_loop
+
+    control_loop = MotorControlLoop(RobotMotionController())
+    control_loop.start()
+    motor_control_loop = control_loop
+
+
+def stop_motors():
+    global motor_control_loop
+
+    control_loop, motor_control_loop = motor_control_loop, None
+    # Not started: the start was cancelled.
+    if control_loop is not None:
+        control_loop.stop()
+
+
+# Subsystems start concurrently, the camera start is retried: it may be plugged in later.
+subsystems.add('camera', start_camera, stop_camera, retry_delay=5.0)
+subsystems.add('motors', lambda: asyncio.to_thread(start_motors), stop_motors)
+subsystems.add('link_sampler', link_sampler.start, link_sampler.stop, required=False)
+
+
+def require_camera(camera_id: str | None = None) -> CameraPipeline:
+    """
+    :param camera_id: None - the default camera.
+    """
+    if (pipeline := cameras.get(default_camera_id if camera_id is None else camera_id)) is not None:
+        return pipeline
+
+    if camera_id is not None and subsystems.is_ready('camera'):
+        raise HTTPException(status_code=404, detail=f'Camera {camera_id} was not found.')
+
+    raise HTTPException(status_code=503, detail='Camera is not ready.')
+
+
+def require_controller(camera_id: str | None = None) -> CameraMotionController:
+    if (controller := require_camera(camera_id).controller) is None:
+        raise HTTPException(status_code=404, detail='Camera has no PTZ controls.')
+    return controller
+
+
+def require_motors() -> MotorControlLoop:
+    if motor_control_loop is None:
+        raise HTTPException(status_code=503, detail='Motor control is not ready.')
+    return motor_control_loop
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """
     Lifespan context manager for startup and shutdown events.
+
+    Hardware starts in the background: UI is served in the degraded mode, while devices are coming up.
     """
     try:
-        logging.info('Video capturing starting...')
-        capturer.start_capturing()
-        logging.info('Capturing started.')
+        app.state.loop = asyncio.get_running_loop()
+        app.state.first_frame_tasks = set()
+        subsystems.mark('server_started')
+        subsystems.start()
         yield
     except asyncio.exceptions.CancelledError as error:
         logging.error(error.args)
     finally:
-        capturer.stop_capturing()
-        logging.info('Camera resource released.')
+        await subsystems.stop()
+        logging.info('Hardware resources released.')
 
 
 app.router.lifespan_context = lifespan
 
 
 async def ev_gen(request: Request):
-    while not await request.is_disconnected():
-        message = await message_queue.get()
-        prepared_message = json.loads(message.model_dump_json())
-        prepared_message['data'] = json.dumps(prepared_message['data'])
-        logging.debug('Server event: %s', prepared_message)
+    last_event_id = request.headers.get('last-event-id')
+
+    async for message in event_bus.subscribe(int(last_event_id) if last_event_id and last_event_id.isdigit()
+                                             else None):
+        if await request.is_disconnected():
+            break
+
+        yield message.sse
+
+
+# Joystick x/y for the cardinal directions, when coordinates weren't sent.
+GEO_DIRECTIONS = {
+    'N': (0, 100), 'S': (0, -100), 'E': (100, 0), 'W': (-100, 0),
+    'NE': (70, 70), 'NW': (-70, 70), 'SE': (70, -70), 'SW': (-70, -70),
+    'C': (0, 0),
+}
+
+JOYSTICK_RANGE = 100
+
+
+def apply_direction(direction: Direction):
+    if direction.x is not None and direction.y is not None:
+        x, y = direction.x, direction.y
+    elif (xy := GEO_DIRECTIONS.get(direction.direction)) is not None:
+        x, y = xy
+    else:
+        return
+
+    require_motors().set_command(x / JOYSTICK_RANGE, y / JOYSTICK_RANGE)
+    # The robot moves: all cameras see it.
+    for pipeline in cameras.values():
+        pipeline.frame_generator.scene_detector.wake()
+
+
+def publish_threadsafe(event: ServerEvent):
+    """
+    Publish event from the worker thread.
+    """
+    if (loop := getattr(app.state, 'loop', None)) is not None:
+        loop.call_soon_threadsafe(event_bus.publish, event)
+
+
+def on_ptz_applied(camera_id: str, target: PTZTarget, applied: float):
+    """
+    Called from the PTZ scheduler thread.
+    """
+    PTZ_APPLY_SECONDS.observe(applied - target.submitted, camera=camera_id)
+    publish_threadsafe(ServerEvent(data=ServerEventData(payload=PTZApplied(
+        seq=target.seq, pan=target.pan, tilt=target.tilt, zoom=target.zoom, latency=applied - target.submitted,
+        camera_id=camera_id))))
+
+
+def on_controls_changed(camera_id: str, version: int, controls: dict):
+    """
+    Called from the camera events thread or after own writes.
+    """
+    publish_threadsafe(ServerEvent(data=ServerEventData(payload=ControlChange(version=version, controls=controls,
+                                                                              camera_id=camera_id))))
+
+
+def on_stage_result(camera_id: str, result: StageResult):
+    """
+    Called from the processing stage thread.
+    """
+    publish_threadsafe(ServerEvent(data=ServerEventData(payload=ProcessingResult(
+        camera_id=camera_id, stage=result.stage, seq=result.seq, age=time.monotonic() - result.timestamp,
+        duration=result.duration, late=result.late, data=result.data))))
+
+
+def on_cameras_changed(added: list, removed: list):
+    """
+    Called from the camera watcher thread.
+    """
+    if (loop := getattr(app.state, 'loop', None)) is not None:
+        loop.call_soon_threadsafe(add_camera_task, update_cameras(added, removed))
+
+    publish_threadsafe(ServerEvent(data=ServerEventData(payload=CameraList(
+        cameras=[device.real_path for device in camera_watcher.cameras],
+        added=[device.real_path for device in added], removed=[device.real_path for device in removed]))))
+
+
+def connection_info(sample: LinkSample | None) -> ConnectionInfo:
+    if sample is None or sample.interface is None:
+        return ConnectionInfo(conn_type=None, level=None)
+
+    return ConnectionInfo(conn_type='wifi', level=sample.level, noise=sample.noise, quality=sample.quality,
+                          bitrate=sample.bitrate, tx_retries=sample.tx_retries, tx_failed=sample.tx_failed,
+                          stats=link_sampler.stats())
+
+
+def on_link_changed(sample: LinkSample):
+    """
+    Called from the link sampler thread.
+    """
+    publish_threadsafe(ServerEvent(data=ServerEventData(payload=connection_info(sample))))
+
+
+def apply_ptz(ptz_record: PTZRecord, camera_id: str | None = None) -> int:
+    # Applied asynchronously, PTZApplied event will be published.
+    require_controller(camera_id)
+    pipeline = require_camera(camera_id)
+    pipeline.frame_generator.scene_detector.wake()
+    return pipeline.ptz_scheduler.submit(ptz_record.pan, ptz_record.tilt, ptz_record.zoom)
+
+
+def apply_focus(focus: Focus, camera_id: str | None = None):
+    require_controller(camera_id).set_focus(focus.auto, focus.value)
+    require_camera(camera_id).frame_generator.scene_detector.wake()
+    event_bus.publish(ServerEvent(data=ServerEventData(payload=focus)))
 
-        yield prepared_message
+
+def apply_reset(camera_id: str | None = None):
+    errors = require_controller(camera_id).reset()
+    require_camera(camera_id).frame_generator.scene_detector.wake()
+    event_bus.publish(ServerEvent(data=ServerEventData(payload=RESET)))
+    return errors
 
 
 @app.get('/video_feed')
-async def video_feed() -> StreamingResponse:
+@app.get('/video_feed/{camera_id}')
+async def video_feed(camera_id: str | None = None, width: int | None = Query(None, gt=0),
+                     quality: int | None = Query(None, ge=1, le=100), max_fps: float | None = Query(None, gt=0),
+                     adaptive: bool = False, suppress_static: bool = False) -> StreamingResponse:
     """
     Video streaming route.
 
+    :param camera_id: the default camera, when not set.
+    :param width: frame width, height is scaled proportionally.
+    :param quality: JPEG quality.
+    :param max_fps: maximal frame rate.
+    :param adaptive: adapt stream to the link quality, other parameters are ceilings.
+    :param suppress_static: send only keepalive frames, while the scene is static.
     :return: StreamingResponse with multipart JPEG frames.
     """
+    controller = None
+
+    if adaptive:
+        limits = adaptive_limits
+        if width is not None:
+            limits = replace(limits, max_width=max(width, limits.min_width))
+        if quality is not None:
+            limits = replace(limits, max_quality=max(quality, limits.min_quality))
+        if max_fps is not None:
+            limits = replace(limits, max_fps=max(max_fps, limits.min_fps))
+        controller = AdaptiveStreamController(limits, link_sampler.level)
+
     return StreamingResponse(
-        frame_generator(),
+        require_camera(camera_id).frame_generator(Rendition(width, quality), max_fps, controller, suppress_static),
         media_type='multipart/x-mixed-replace; boundary=frame'
     )
 
 
+@app.websocket('/video_ws')
+@app.websocket('/video_ws/{camera_id}')
+async def video_ws(websocket: WebSocket, camera_id: str | None = None):
+    """
+    H.264 streaming route: codec string as a text message, then fragmented MP4 segments.
+    """
+    await websocket.accept()
+
+    try:
+        pipeline = require_camera(camera_id)
+    except HTTPException as e:
+        await websocket.close(code=1013 if 503 == e.status_code else 1008, reason=e.detail)
+        return
+
+    h264_streamer = pipeline.h264_streamer
+    segments = h264_streamer.subscribe()
+
+    try:
+        init_segment = await anext(segments)
+        await websocket.send_text(json.dumps({'codec': h264_streamer.mime_codec}))
+        await websocket.send_bytes(init_segment)
+
+        async for segment in segments:
+            await websocket.send_bytes(segment)
+    except WebSocketDisconnect:
+        logging.info('H.264 viewer disconnected.')
+    except H264EncoderError as e:
+        logging.error('H.264 stream failed: %s', e)
+        await websocket.close(code=1011, reason=str(e))
+    finally:
+        await segments.aclose()
+
+
 @app.get('/')
 def entrypoint(request: Request):
     logging.debug('Requested /')
@@ -109,72 +544,199 @@ def entrypoint(request: Request):
 
 @app.post('/api/motion/direction')
 async def direction_set(direction: Direction):
-    # loop = asyncio.get_running_loop()
-    # loop.call_later(2, lambda: asyncio.create_task(my_callback_function("Hello from the timer!")))
-
-    geo_direction = {
-        'N': lambda: robot_motion_controller.shift(RobotDirection.FORWARD),
-        'S': lambda: robot_motion_controller.shift(RobotDirection.BACK),
-        'E': lambda: robot_motion_controller.rotate(Side.RIGHT),
-        'W': lambda: robot_motion_controller.rotate(Side.LEFT),
-        'NE': None, # 'Lf',
-        'NW': None, # 'Rf',
-        'SE': None, # 'Lb',
-        'SW': None, # 'Rb',
-        'C': robot_motion_controller.stop
-    }
+    apply_direction(direction)
+    return {'message': 'Direction submitted successfully!', 'data': direction.model_dump_json() }
 
-    if (m_dir := geo_direction.get(direction.direction)) is not None:
-        m_dir()
 
-    return {'message': 'Direction submitted successfully!', 'data': direction.model_dump_json() }
+@app.get('/api/motion/stats')
+async def motion_stats():
+    control_loop = require_motors()
+    return {'speeds': control_loop.speeds, **control_loop.stats()}
+
+
+@app.get('/api/cameras')
+async def cameras_get():
+    """
+    Started cameras, the default one is the first.
+    """
+    return {'data': [{'id': camera_id, 'path': pipeline.device_path, 'has_ptz': pipeline.controller is not None,
+                      'cpu': pipeline.cpu, 'recording': pipeline.recorder is not None}
+                     for camera_id, pipeline in cameras.items()], 'selected': default_camera_id}
 
 
 @app.get('/api/camera/controls')
-async def controls_get():
-    return { 'data': camera_motion_controller.get_controls()  }
+@app.get('/api/camera/{camera_id}/controls')
+async def controls_get(camera_id: str | None = None):
+    controller = require_controller(camera_id)
+    return { 'data': controller.get_controls(), 'version': controller.version }
+
+
+@app.post('/api/camera/controls')
+@app.post('/api/camera/{camera_id}/controls')
+async def controls_set(controls: dict[str, int | bool | str], camera_id: str | None = None):
+    """
+    Set any controls with one device round trip, when the driver allows it.
+    """
+    controller = require_controller(camera_id)
+    # Any control (pan, tilt, zoom, exposure...) may change the picture.
+    require_camera(camera_id).frame_generator.scene_detector.wake()
+    errors = await asyncio.to_thread(controller.apply_controls, controls)
+    return {'message': 'Controls submitted!', 'errors': errors, 'version': controller.version }
 
 
 @app.post('/api/camera/ptz')
-async def set_camera_ptz(ptz_record: PTZRecord, background_tasks: BackgroundTasks):
+@app.post('/api/camera/{camera_id}/ptz')
+async def set_camera_ptz(ptz_record: PTZRecord, background_tasks: BackgroundTasks, camera_id: str | None = None):
     # background_tasks.add_task(camera_motion_controller.set_ptz, ptz_record.pan, ptz_record.tilt, ptz_record.zoom)
-    camera_motion_controller.ptz = (ptz_record.pan, ptz_record.tilt, ptz_record.zoom)
-    await message_queue.put(ServerEvent(data=ServerEventData(payload=ptz_record)))
-    return {'message': 'PTZ submitted successfully!', 'data': ptz_record.model_dump_json() }
+    seq = apply_ptz(ptz_record, camera_id)
+    return {'message': 'PTZ submitted successfully!', 'data': ptz_record.model_dump_json(), 'seq': seq }
 
 
 @app.get('/api/camera/ptz')
-async def get_camera_ptz():
-    return PTZRecord.from_tuple(camera_motion_controller.ptz).model_dump_json()
+@app.get('/api/camera/{camera_id}/ptz')
+async def get_camera_ptz(camera_id: str | None = None):
+    return PTZRecord.from_tuple(require_controller(camera_id).ptz).model_dump_json()
 
 
 @app.post('/api/camera/focus')
-async def set_camera_focus(focus: Focus):
-    camera_motion_controller.set_focus(focus.auto, focus.value)
-    await message_queue.put(ServerEvent(data=ServerEventData(payload=focus)))
+@app.post('/api/camera/{camera_id}/focus')
+async def set_camera_focus(focus: Focus, camera_id: str | None = None):
+    apply_focus(focus, camera_id)
     return {'message': 'Focus submitted successfully!', 'data': focus.model_dump_json() }
 
 
 @app.get('/api/camera/focus')
-async def get_camera_focus():
-    return Focus.from_tuple(camera_motion_controller.focus).model_dump_json()
+@app.get('/api/camera/{camera_id}/focus')
+async def get_camera_focus(camera_id: str | None = None):
+    return Focus.from_tuple(require_controller(camera_id).focus).model_dump_json()
 
 
 @app.post('/api/camera/reset')
-async def camera_reset():
-    errors = camera_motion_controller.reset()
-    await message_queue.put(ServerEvent(data=ServerEventData(payload='reset')))
+@app.post('/api/camera/{camera_id}/reset')
+async def camera_reset(camera_id: str | None = None):
+    errors = apply_reset(camera_id)
     return {'message': 'Camera was reset successfully!' }
 
 
-@app.get('/api/connection')
-async def wifi_info():
-    level = get_wifi_signal_strength()
+@app.websocket('/api/control_ws')
+async def control_ws(websocket: WebSocket, last_event_id: int | None = None):
+    """
+    Bidirectional control channel: binary commands from the client (see pkg.control_protocol), binary acks and
+    JSON server events to the client.
+
+    PTZ, focus and reset commands drive the default camera only, the other cameras are controlled by
+    /api/camera/{camera_id}/... endpoints.
+    """
+    await websocket.accept()
+
+    async def push_events():
+        async for message in event_bus.subscribe(last_event_id):
+            await websocket.send_text(message.json)
+
+    commands = {
+        Direction: apply_direction,
+        PTZRecord: apply_ptz,
+        Focus: apply_focus,
+        str: lambda _: apply_reset(),
+    }
+
+    pusher = asyncio.create_task(push_events())
+
+    try:
+        while True:
+            message = await websocket.receive()
+            if 'websocket.disconnect' == message['type']:
+                raise WebSocketDisconnect(message.get('code', 1000))
+
+            if (data := message.get('bytes')) is None:
+                # receive_bytes() would fail on the text message and close the channel.
+                logging.warning('Control channel: text message, binary commands are expected.')
+                await websocket.send_bytes(encode_ack(0, AckStatus.INVALID))
+                continue
+
+            try:
+                seq, command = decode_command(data)
+            except ValueError as e:
+                logging.warning('Control channel: %s', e)
+                await websocket.send_bytes(encode_ack(0, AckStatus.INVALID))
+                continue
+
+            started = time.monotonic()
+            try:
+                commands[type(command)](command)
+                status = AckStatus.OK
+            except Exception as e:
+                logging.error('Control command %s failed: %s', command, e)
+                status = AckStatus.FAILED
+            CONTROL_COMMAND_SECONDS.observe(time.monotonic() - started, command=type(command).__name__)
+
+            await websocket.send_bytes(encode_ack(seq, status))
+    except WebSocketDisconnect:
+        logging.info('Control channel closed.')
+    finally:
+        pusher.cancel()
+
+
+@app.get('/api/health')
+async def health():
+    """
+    Subsystem states and startup phase timings (seconds since boot).
+    """
+    return subsystems.health()
+
+
+@app.get('/api/ready')
+async def ready():
+    return JSONResponse(subsystems.health(), status_code=200 if subsystems.ready else 503)
+
+
+def require_recorder(camera_id: str | None = None) -> Recorder:
+    if (recorder := require_camera(camera_id).recorder) is None:
+        raise HTTPException(status_code=404, detail='Recording is disabled.')
+    return recorder
 
-    if level is not None:
-        return ConnectionInfo.from_tuple(('wifi', level)).model_dump_json()
 
-    return ConnectionInfo.from_tuple((None, None)).model_dump_json()
+@app.get('/api/recordings')
+@app.get('/api/camera/{camera_id}/recordings')
+async def recordings_list(camera_id: str | None = None):
+    """
+    Recorded segments, timestamps are UNIX time.
+    """
+    return {'data': [segment.to_dict() for segment in require_recorder(camera_id).segments()]}
+
+
+@app.get('/api/recordings/stream')
+@app.get('/api/camera/{camera_id}/recordings/stream')
+async def recordings_stream(start: float, end: float | None = None, speed: float = Query(1.0, ge=0),
+                            camera_id: str | None = None):
+    """
+    Replay recorded time range.
+
+    :param start: UNIX time.
+    :param end: UNIX time, now by default.
+    :param speed: playback speed, 0 - as fast as possible.
+    :return: StreamingResponse with multipart JPEG frames.
+    """
+    return StreamingResponse(
+        require_recorder(camera_id).replay(start, time.time() if end is None else end, speed),
+        media_type='multipart/x-mixed-replace; boundary=frame'
+    )
+
+
+@app.get('/metrics')
+async def metrics():
+    """
+    Metrics in the Prometheus text format.
+    """
+    return PlainTextResponse(REGISTRY.render(), media_type='text/plain; version=0.0.4')
+
+
+@app.get('/api/connection')
+async def wifi_info():
+    """
+    Cached link metrics, changes are pushed as ConnectionInfo events.
+    """
+    return connection_info(link_sampler.latest).model_dump_json()
 
 
 #@app.get('/{path:path}')
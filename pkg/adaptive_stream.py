@@ -0,0 +1,150 @@
+"""
+Congestion-aware stream quality control.
+"""
+
+from dataclasses import dataclass
+import logging
+import time
+from typing import Callable
+
+from .renditions import Rendition
+
+
+@dataclass(frozen=True)
+class AdaptiveLimits:
+    """
+    Floor and ceiling of the adaptive stream parameters.
+    """
+
+    min_width: int = 320
+    max_width: int | None = None
+    min_quality: int = 25
+    max_quality: int = 85
+    min_fps: float = 2
+    max_fps: float = 30
+    # Width to scale down from, when the ceiling is the source width.
+    reference_width: int = 1280
+    # Maximal age of the frame, when it was delivered to the client.
+    target_latency: float = 0.25
+    levels: int = 6
+
+
+@dataclass(frozen=True)
+class StreamLevel:
+    rendition: Rendition
+    max_fps: float
+
+
+def build_ladder(limits: AdaptiveLimits) -> list[StreamLevel]:
+    """
+    Stream levels from the best to the worst.
+    """
+    top_width = limits.max_width or limits.reference_width
+    ladder = []
+
+    for i in range(limits.levels):
+        k = i / max(1, limits.levels - 1)
+        width = None if 0 == i and limits.max_width is None else round(top_width - (top_width - limits.min_width) * k)
+        quality = round(limits.max_quality - (limits.max_quality - limits.min_quality) * k)
+        fps = limits.max_fps - (limits.max_fps - limits.min_fps) * k
+        ladder.append(StreamLevel(Rendition(width, quality).normalized(), fps))
+
+    return ladder
+
+
+def wifi_level_ceiling(level: int | float | None, levels: int) -> int:
+    """
+    The best stream level index allowed by Wi-Fi signal.
+
+    :param level: signal level in dBm (negative) or link quality in percents.
+    """
+    if level is None:
+        return 0
+
+    # Convert dBm to the rough quality percents.
+    quality = min(100, max(0, 2 * (level + 100))) if level < 0 else level
+
+    if quality >= 50:
+        return 0
+    if quality >= 30:
+        return levels // 3
+
+    return levels // 2
+
+
+class AdaptiveStreamController:
+    """
+    Per-client controller, adjusts JPEG quality, frame size and frame rate.
+
+    Watches the frame age when the frame was sent (capture, encode and socket backpressure) and the Wi-Fi level.
+    """
+
+    def __init__(self, limits: AdaptiveLimits = AdaptiveLimits(),
+                 wifi_level: Callable[[], int | float | None] | None = None,
+                 smoothing: float = 0.3, upgrade_delay: float = 2.0, downgrade_delay: float = 0.5,
+                 wifi_interval: float = 1.0):
+        self._limits = limits
+        self._ladder = build_ladder(limits)
+        self._wifi_level = wifi_level
+        self._smoothing = smoothing
+        self._upgrade_delay = upgrade_delay
+        self._downgrade_delay = downgrade_delay
+        self._wifi_interval = wifi_interval
+
+        self._level = 0
+        self._wifi_ceiling = 0
+        self._latency = None
+        self._changed = time.monotonic()
+        self._wifi_checked = 0
+
+    @property
+    def level(self) -> int:
+        return self._level
+
+    @property
+    def latency(self) -> float | None:
+        return self._latency
+
+    @property
+    def rendition(self) -> Rendition:
+        return self._ladder[self._level].rendition
+
+    @property
+    def max_fps(self) -> float:
+        return self._ladder[self._level].max_fps
+
+    def _update_wifi(self, now: float):
+        if self._wifi_level is None or now - self._wifi_checked < self._wifi_interval:
+            return
+
+        self._wifi_checked = now
+        self._wifi_ceiling = wifi_level_ceiling(self._wifi_level(), len(self._ladder))
+
+    def _set_level(self, level: int, now: float):
+        level = min(len(self._ladder) - 1, max(self._wifi_ceiling, level))
+        if level != self._level:
+            logging.debug('Stream level %d -> %d, latency = %.3f', self._level, level, self._latency)
+            self._level = level
+            self._changed = now
+
+    def on_frame_sent(self, frame_timestamp: float, now: float | None = None):
+        """
+        Must be called when the frame was written to the client.
+
+        :param frame_timestamp: frame capture time (time.monotonic()).
+        """
+        now = time.monotonic() if now is None else now
+        latency = now - frame_timestamp
+        self._latency = latency if self._latency is None else \
+            self._smoothing * latency + (1 - self._smoothing) * self._latency
+
+        self._update_wifi(now)
+        since_change = now - self._changed
+
+        if self._latency > self._limits.target_latency and since_change >= self._downgrade_delay:
+            self._set_level(self._level + 1, now)
+        elif self._latency < self._limits.target_latency / 2 and since_change >= self._upgrade_delay:
+            self._set_level(self._level - 1, now)
+        else:
+            # Wi-Fi ceiling could be changed.
+            self._set_level(self._level, now)
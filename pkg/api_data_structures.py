@@ -3,8 +3,8 @@ Data structures for interaction via REST API.
 """
 
 from datetime import datetime
+from typing import Any
 from pydantic import BaseModel, Field, computed_field
-from uuid import UUID, uuid4
 
 
 class ExtBaseModel(BaseModel):
@@ -28,6 +28,20 @@ class PTZRecord(ExtBaseModel):
     zoom: int
 
 
+class PTZApplied(ExtBaseModel):
+    """
+    PTZ target, which was applied to the camera.
+    """
+
+    seq: int
+    pan: int
+    tilt: int
+    zoom: int
+    # Seconds from the submission to the application.
+    latency: float
+    camera_id: str | None = None
+
+
 class Focus(ExtBaseModel):
     """
     Focus automatic flag and focus value.
@@ -47,9 +61,57 @@ class Direction(ExtBaseModel):
     y: int | None
 
 
+class ControlChange(ExtBaseModel):
+    """
+    Changed camera control values and the control cache version.
+    """
+
+    version: int
+    controls: dict[str, Any]
+    camera_id: str | None = None
+
+
+class CameraList(ExtBaseModel):
+    """
+    Camera device paths: all available, added and removed since the previous event.
+    """
+
+    cameras: list[str]
+    added: list[str] = []
+    removed: list[str] = []
+
+
+class ProcessingResult(ExtBaseModel):
+    """
+    Result of the frame processing stage.
+    """
+
+    camera_id: str
+    stage: str
+    # Capture seq of the processed frame.
+    seq: int
+    # Seconds since the frame capture.
+    age: float
+    duration: float
+    # Processing took longer than the stage budget.
+    late: bool
+    data: dict[str, Any]
+
+
 class ConnectionInfo(ExtBaseModel):
+    """
+    Link metrics from the link sampler, level and noise are in dBm.
+    """
+
     conn_type: str | None
-    level: int | None
+    level: float | None
+    noise: float | None = None
+    quality: float | None = None
+    bitrate: float | None = None
+    tx_retries: int | None = None
+    tx_failed: int | None = None
+    # Rolling min/avg/max values.
+    stats: dict[str, dict[str, float] | None] | None = None
 
 
 class ServerEventData(BaseModel):
@@ -58,8 +120,9 @@ class ServerEventData(BaseModel):
     def event_type(self) -> str:
         return str(self.payload.__class__.__name__)
 
-    timestamp: datetime = Field(default=datetime.now())
-    payload: PTZRecord | Focus | Direction | str | None
+    timestamp: datetime = Field(default_factory=datetime.now)
+    payload: PTZRecord | PTZApplied | Focus | Direction | ControlChange | CameraList | ConnectionInfo | \
+        ProcessingResult | str | None
 
 
 class ServerEvent(ExtBaseModel):
@@ -71,5 +134,5 @@ class ServerEvent(ExtBaseModel):
 
     event: str = Field(default='state_changed', freeze=True)
 
-    id: UUID = Field(default_factory=uuid4)
+    # Event id is assigned by the event bus: BusMessage.id.
     data: ServerEventData
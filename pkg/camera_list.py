@@ -1,30 +1,252 @@
+"""
+Camera discovery: parallel probing, capabilities cache and hot-plug tracking.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+import json
 import logging
 import os
 from pathlib import Path
-from third_party.cameractrls.cameractrls import get_devices, v4ldirs, CameraCtrls, PTZController
+import select
+import threading
+from typing import Callable
+
+from third_party.cameractrls.cameractrls import get_devices, v4ldirs, CameraCtrls
+
+
+SYSFS_V4L_DIR = Path('/sys/class/video4linux')
+DEFAULT_CACHE_PATH = Path(os.environ.get('XDG_CACHE_HOME', Path.home() / '.cache')) / 'simple_robo' / 'cameras.json'
+CACHE_VERSION = 1
+
+
+def _read_sysfs(path: Path) -> str:
+    try:
+        return path.read_text().strip()
+    except OSError:
+        return ''
+
+
+def device_identity(real_path: str) -> str | None:
+    """
+    Stable device identity from sysfs: bus path, USB VID/PID, serial and node index.
+
+    Unlike /dev/videoN, the identity survives re-enumeration, while the device stays in the same port.
+
+    :return: None, when sysfs entry wasn't found.
+    """
+    sys_dir = SYSFS_V4L_DIR / Path(real_path).name
+
+    try:
+        device_dir = (sys_dir / 'device').resolve(strict=True)
+    except OSError:
+        return None
+
+    vid = pid = serial = ''
+    for parent in [device_dir, *device_dir.parents]:
+        if (parent / 'idVendor').exists():
+            vid, pid, serial = [_read_sysfs(parent / name) for name in ['idVendor', 'idProduct', 'serial']]
+            break
+
+    return '|'.join([str(device_dir), vid, pid, serial, _read_sysfs(sys_dir / 'index')])
 
 
-def list_cameras(dirs: list[Path | str] = v4ldirs, ptz_only: bool = True):
+def probe_ptz(real_path: str) -> bool:
+    camera_fd = os.open(real_path, os.O_RDONLY, 0)
+    try:
+        return CameraCtrls(real_path, camera_fd).has_ptz()
+    finally:
+        os.close(camera_fd)
+
+
+def load_cache(cache_path: Path | None) -> dict[str, dict]:
+    if cache_path is None:
+        return {}
+
+    try:
+        with open(cache_path, 'r') as f:
+            cache = json.load(f)
+    except FileNotFoundError:
+        return {}
+    except (OSError, ValueError) as e:
+        logging.warning('Camera cache %s can\'t be read: %s', cache_path, e)
+        return {}
+
+    return cache.get('devices', {}) if CACHE_VERSION == cache.get('version') else {}
+
+
+def save_cache(cache_path: Path | None, devices: dict[str, dict]):
+    if cache_path is None:
+        return
+
+    tmp_path = cache_path.with_suffix('.tmp')
+    try:
+        cache_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(tmp_path, 'w') as f:
+            json.dump({'version': CACHE_VERSION, 'devices': devices}, f, indent=2)
+        os.replace(tmp_path, cache_path)
+    except OSError as e:
+        logging.warning('Camera cache %s can\'t be written: %s', cache_path, e)
+
+
+def list_cameras(dirs: list[Path | str] = v4ldirs, ptz_only: bool = True, cache_path: Path | None = DEFAULT_CACHE_PATH,
+                 max_workers: int = 8):
     """
     List camera devices and check device for the PTZ support.
+
+    Devices are probed concurrently, probe results are cached by the device identity, so only new devices are probed.
+
+    :param cache_path: capabilities cache, None to always probe.
     """
 
+    cache = load_cache(cache_path)
+    all_devices = get_devices(dirs)
+    to_probe = []
+
+    for device in all_devices:
+        identity = device_identity(device.real_path)
+        if identity is not None and (cached := cache.get(identity)) is not None:
+            device.has_ptz = cached['has_ptz']
+        else:
+            to_probe.append((device, identity))
+
+    if to_probe:
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(to_probe)), thread_name_prefix='camera_probe') as pool:
+            futures = [(device, identity, pool.submit(probe_ptz, device.real_path)) for device, identity in to_probe]
+
+            for device, identity, future in futures:
+                try:
+                    device.has_ptz = future.result()
+                except Exception as e:
+                    # Busy or not a capture device: skip it, other devices are still usable.
+                    logging.error('Device "%s" probing failed: %s', device.real_path, e)
+                    device.has_ptz = None
+                    continue
+
+                if identity is not None:
+                    cache[identity] = {'has_ptz': device.has_ptz, 'path': device.real_path}
+
+        save_cache(cache_path, cache)
+
     devices = []
 
-    for device in get_devices(dirs):
-        try:
-            camera_fd = os.open(device.real_path, os.O_RDONLY, 0)
-            ctrls = CameraCtrls(device.real_path, camera_fd)
-            device.has_ptz = ctrls.has_ptz()
-
-            if not ptz_only:
-                logging.info('Appending device "%s" [PTZ = %d]', device.real_path, device.has_ptz)
-                devices.append(device)
-            elif device.has_ptz:
-                logging.info('Appending PTZ device "%s"', device.real_path)
-                devices.append(device)
-        except Exception as e:
-            logging.error(f'os.open: {e}')
-            raise
+    for device in all_devices:
+        if device.has_ptz is None:
+            continue
+
+        if not ptz_only:
+            logging.info('Appending device "%s" [PTZ = %d]', device.real_path, device.has_ptz)
+            devices.append(device)
+        elif device.has_ptz:
+            logging.info('Appending PTZ device "%s"', device.real_path)
+            devices.append(device)
 
     return devices
+
+
+def _video_nodes(dev_dir: str = '/dev') -> set[str]:
+    try:
+        return {name for name in os.listdir(dev_dir) if name.startswith('video')}
+    except OSError:
+        return set()
+
+
+class CameraWatcher:
+    """
+    Tracks cameras, added or removed at runtime.
+
+    udev events are used, when pyudev is installed, otherwise /dev is polled for the video nodes.
+    """
+
+    def __init__(self, on_change: Callable[[list, list], None], dirs: list[Path | str] = v4ldirs,
+                 cache_path: Path | None = DEFAULT_CACHE_PATH, poll_interval: float = 2.0, settle_time: float = 0.5):
+        """
+        :param on_change: called from the watcher thread with the added and removed devices.
+        :param settle_time: one device creates several nodes: events are collected during this time (seconds).
+        """
+        self._on_change = on_change
+        self._dirs = dirs
+        self._cache_path = cache_path
+        self._poll_interval = poll_interval
+        self._settle_time = settle_time
+
+        self._cameras: dict[str, object] = {}
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    @property
+    def cameras(self) -> list:
+        return list(self._cameras.values())
+
+    def start(self, cameras: list | None = None):
+        """
+        :param cameras: already discovered cameras, to skip the initial scan.
+        """
+        if self._thread is not None:
+            return
+
+        if cameras is None:
+            cameras = list_cameras(self._dirs, ptz_only=False, cache_path=self._cache_path)
+        self._cameras = {camera.real_path: camera for camera in cameras}
+
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='camera_watcher', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if self._thread is None:
+            return
+
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+
+    def _rescan(self):
+        cameras = {camera.real_path: camera
+                   for camera in list_cameras(self._dirs, ptz_only=False, cache_path=self._cache_path)}
+
+        added = [camera for path, camera in cameras.items() if path not in self._cameras]
+        removed = [camera for path, camera in self._cameras.items() if path not in cameras]
+        self._cameras = cameras
+
+        if added or removed:
+            logging.info('Cameras changed: added %s, removed %s', [c.real_path for c in added],
+                         [c.real_path for c in removed])
+            self._on_change(added, removed)
+
+    @staticmethod
+    def _udev_monitor():
+        try:
+            import pyudev
+        except ModuleNotFoundError:
+            logging.info('pyudev is not installed, /dev will be polled for the cameras.')
+            return None
+
+        monitor = pyudev.Monitor.from_netlink(pyudev.Context())
+        monitor.filter_by('video4linux')
+        monitor.start()
+
+        return monitor
+
+    def _run(self):
+        monitor = self._udev_monitor()
+        nodes = _video_nodes()
+
+        while not self._stop.is_set():
+            if monitor is not None:
+                # Timeout only to check the stop flag.
+                if not select.select([monitor], [], [], self._poll_interval)[0]:
+                    continue
+                # Drain the burst of events.
+                while monitor.poll(timeout=self._settle_time) is not None:
+                    pass
+            else:
+                if self._stop.wait(self._poll_interval) or (current := _video_nodes()) == nodes:
+                    continue
+                nodes = current
+                # Let udev set permissions and create the symlinks.
+                self._stop.wait(self._settle_time)
+
+            try:
+                self._rescan()
+            except Exception as e:
+                logging.error('Cameras rescan failed: %s', e)
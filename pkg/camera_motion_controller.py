@@ -1,15 +1,74 @@
+import ctypes
+from fcntl import ioctl
 import logging
 import os
 from pathlib import Path
-import sys
+import threading
+from typing import Any, Callable
 
 from third_party.cameractrls.cameractrls import CameraCtrls, PTZController, V4L2Ctrl, \
     V4L2_CID_FOCUS_ABSOLUTE, V4L2_CID_FOCUS_AUTO
 
 
+V4L2_CTRL_WHICH_CUR_VAL = 0
+
+
+class v4l2_ext_control(ctypes.Structure):
+    class _value(ctypes.Union):
+        _fields_ = [('value', ctypes.c_int32), ('value64', ctypes.c_int64), ('ptr', ctypes.c_void_p)]
+
+    _fields_ = [('id', ctypes.c_uint32), ('size', ctypes.c_uint32), ('reserved2', ctypes.c_uint32 * 1),
+                ('_u', _value)]
+    _anonymous_ = ('_u',)
+    _pack_ = 1
+
+
+class v4l2_ext_controls(ctypes.Structure):
+    _fields_ = [('which', ctypes.c_uint32), ('count', ctypes.c_uint32), ('error_idx', ctypes.c_uint32),
+                ('request_fd', ctypes.c_int32), ('reserved', ctypes.c_uint32 * 1),
+                ('controls', ctypes.POINTER(v4l2_ext_control))]
+
+
+# _IOWR('V', 72, struct v4l2_ext_controls)
+VIDIOC_S_EXT_CTRLS = (3 << 30) | (ctypes.sizeof(v4l2_ext_controls) << 16) | (ord('V') << 8) | 72
+
+
+CONTROL_PARAMS = ['name', 'tooltip', 'type', 'value', 'min', 'max', 'default', 'step', 'inactive', 'readonly',
+                  'unrestorable']
+
+
+class ControlTransaction:
+    """
+    Collects control changes and applies them at once, see CameraMotionController.apply_controls().
+    """
+
+    def __init__(self, controller: 'CameraMotionController'):
+        self._controller = controller
+        self._changes: dict[str, int | bool | str] = {}
+
+    @property
+    def changes(self) -> dict[str, int | bool | str]:
+        return self._changes
+
+    def set(self, text_id: str, value: int | bool | str) -> 'ControlTransaction':
+        # Control order is preserved: i.e. auto flag must be changed before the value.
+        self._changes.pop(text_id, None)
+        self._changes[text_id] = value
+        return self
+
+    def commit(self) -> dict[str, str]:
+        """
+        :return: per-control errors.
+        """
+        changes, self._changes = self._changes, {}
+        return self._controller.apply_controls(changes)
+
+
 class CameraMotionController:
     """
     Camera PTZ and focus controller.
+
+    Control states are cached in memory: the cache is filled once and kept coherent by V4L2 control events.
     """
 
     def __init__(self, camera_device: int | str | Path):
@@ -20,36 +79,56 @@ class CameraMotionController:
 
         try:
             self._camera_fd = os.open(self._device, os.O_RDWR, 0)
-        except Exception as e:
+        except OSError as e:
             logging.error(f'os.open: {e}')
-            sys.exit(3)
+            raise
 
         self._ctrls = CameraCtrls(self._device, self._camera_fd)
         self._ptz = PTZController(self._ctrls)
         self._prev_zoom = 0
         self._focus_absolute = self._ctrls.v4l_ctrls.find_by_v4l2_id(V4L2_CID_FOCUS_ABSOLUTE)
         self._focus_auto = self._ctrls.v4l_ctrls.find_by_v4l2_id(V4L2_CID_FOCUS_AUTO)
-        #self._listener = self._ctrls.subscribe_events(
-        #    self._update_params,
-        #    lambda errs: logging.error('Error event: %s', '\n'.join(errs)),
-        #)
 
-        self._position_parameters = dict()
+        self._cache_lock = threading.Lock()
+        self._ctrl_objects = {ctrl.text_id: ctrl for ctrl in self._ctrls.get_ctrls()}
+        self._controls = {text_id: self._control_state(ctrl) for text_id, ctrl in self._ctrl_objects.items()}
+        self._version = 0
+        self._change_listeners: list[Callable[[int, dict[str, Any]], None]] = []
+
+        self._listener = self._ctrls.subscribe_events(
+            self._update_params,
+            lambda errs: logging.error('Error event: %s', '\n'.join(errs)),
+        )
 
     @property
     def has_ptz(self) -> bool:
         return self._ctrls.has_ptz()
 
+    @property
+    def version(self) -> int:
+        """
+        Control cache version, incremented on every change.
+        """
+        return self._version
+
+    def add_change_listener(self, listener: Callable[[int, dict[str, Any]], None]):
+        """
+        Listener is called with the cache version and changed values, possibly from the events thread.
+        """
+        self._change_listeners.append(listener)
+
+    def _cached_value(self, ctrl: V4L2Ctrl | None, default=0):
+        if ctrl is None or (state := self._controls.get(ctrl.text_id)) is None:
+            return default
+        return state['value']
+
     @property
     def ptz(self) -> (int, int, int):
         if self._ptz is None:
             return 0, 0, 0
 
-        pan = 0 if self._ptz.pan_absolute is None else self._ptz.pan_absolute.value
-        tilt = 0 if self._ptz.tilt_absolute is None else self._ptz.tilt_absolute.value
-        zoom = 0 if self._ptz.zoom_absolute is None else self._ptz.zoom_absolute.value
-
-        return pan, tilt, zoom
+        return self._cached_value(self._ptz.pan_absolute), self._cached_value(self._ptz.tilt_absolute), \
+            self._cached_value(self._ptz.zoom_absolute)
 
     @ptz.setter
     def ptz(self, value: (int, int, int)):
@@ -57,8 +136,7 @@ class CameraMotionController:
 
     @property
     def focus(self) -> (bool, int):
-        return False if self._focus_auto is None else bool(self._focus_auto.value), \
-            False if self._focus_absolute is None else int(self._focus_absolute.value)
+        return bool(self._cached_value(self._focus_auto, False)), int(self._cached_value(self._focus_absolute, 0))
 
     @focus.setter
     def focus(self, value: (bool, int)):
@@ -86,53 +164,180 @@ class CameraMotionController:
         return errors
 
     def set_focus(self, auto: bool, value: int | None = None):
-        errs = []
-
-        self._ptz.ctrls.setup_ctrls({self._focus_auto.text_id: auto}, errs)
+        transaction = self.transaction().set(self._focus_auto.text_id, auto)
 
         if value is not None:
-            self._ptz.ctrls.setup_ctrls({self._focus_absolute.text_id: value}, errs)
+            transaction.set(self._focus_absolute.text_id, value)
+
+        return list(transaction.commit().values())
+
+    def _ptz_step(self, transaction: ControlTransaction, ctrl: V4L2Ctrl | None, step: int, fallback) -> list[str]:
+        """
+        Absolute PTZ controls are batched, others (i.e. speed controls) are stepped by PTZController.
+        """
+        if 0 == step:
+            return []
+
+        if ctrl is None or ctrl.text_id not in self._controls:
+            return fallback(step)
 
-        return errs
+        value = self._cached_value(ctrl) + step * (ctrl.step or 1)
+        transaction.set(ctrl.text_id, min(ctrl.max, max(ctrl.min, value)))
+
+        return []
 
     def set_ptz(self, pan: int, tilt: int, zoom: int):
         errors = []
-        errors.extend(self.rotate(pan))
-        errors.extend(self.lift(tilt))
-        errors.extend(self.zoom(zoom))
+        transaction = self.transaction()
+
+        errors.extend(self._ptz_step(transaction, self._ptz.pan_absolute, pan, self.rotate))
+        errors.extend(self._ptz_step(transaction, self._ptz.tilt_absolute, tilt, self.lift))
+        errors.extend(self._ptz_step(transaction, self._ptz.zoom_absolute, zoom - self._prev_zoom,
+                                     lambda step: self.zoom(zoom)))
+        self._prev_zoom = zoom
+
+        errors.extend(transaction.commit().values())
+        self._refresh([self._ptz.pan_absolute, self._ptz.tilt_absolute, self._ptz.zoom_absolute])
 
         return errors
 
     def reset(self):
         errors = []
-        self._ptz.do_reset(errs=errors)
+        ptz_ctrls = [ctrl for ctrl in [self._ptz.pan_absolute, self._ptz.tilt_absolute, self._ptz.zoom_absolute]
+                     if ctrl is not None]
+
+        if ptz_ctrls:
+            transaction = self.transaction()
+            for ctrl in ptz_ctrls:
+                transaction.set(ctrl.text_id, ctrl.default)
+            errors.extend(transaction.commit().values())
+        else:
+            self._ptz.do_reset(errs=errors)
+
+        self._prev_zoom = 0
+        self._refresh(ptz_ctrls)
+
+        return errors
+
+    def transaction(self) -> ControlTransaction:
+        return ControlTransaction(self)
+
+    def _write_ext_ctrls(self, ctrls: list[tuple[V4L2Ctrl, int]]) -> tuple[int, int] | None:
+        """
+        Set controls with the single VIDIOC_S_EXT_CTRLS call.
+
+        :return: None on success, otherwise (errno, error index).
+        """
+        ext_ctrls = (v4l2_ext_control * len(ctrls))()
+        for ext_ctrl, (ctrl, value) in zip(ext_ctrls, ctrls):
+            ext_ctrl.id = ctrl.v4l2_id
+            ext_ctrl.value = value
+
+        request = v4l2_ext_controls(which=V4L2_CTRL_WHICH_CUR_VAL, count=len(ctrls), controls=ext_ctrls)
+
+        try:
+            ioctl(self._camera_fd, VIDIOC_S_EXT_CTRLS, request)
+        except OSError as e:
+            return e.errno, request.error_idx
+
+        for ctrl, value in ctrls:
+            ctrl.value = value
+
+        return None
+
+    def apply_controls(self, changes: dict[str, int | bool | str]) -> dict[str, str]:
+        """
+        Apply control changes with as few VIDIOC_S_EXT_CTRLS calls as the driver allows.
+
+        :return: per-control errors.
+        """
+        errors = {}
+        batch = []
+        others = {}
+
+        for text_id, value in changes.items():
+            ctrl = self._ctrl_objects.get(text_id)
+            if ctrl is None:
+                errors[text_id] = f'control {text_id} was not found'
+            elif isinstance(ctrl, V4L2Ctrl) and isinstance(value, (bool, int)):
+                batch.append((ctrl, int(value)))
+            else:
+                # Menus by name, extension unit controls, etc.
+                others[text_id] = value
+
+        if batch and (failure := self._write_ext_ctrls(batch)) is not None:
+            logging.debug('Batched controls write failed: errno = %d, index = %d', *failure)
+            # Some drivers reject the whole batch: retry one by one to get per-control errors.
+            for ctrl, value in batch:
+                if (failure := self._write_ext_ctrls([(ctrl, value)])) is not None:
+                    errors[ctrl.text_id] = f'{ctrl.text_id} = {value} can\'t be set: {os.strerror(failure[0])}'
+
+        for text_id, value in others.items():
+            errs = []
+            self._ctrls.setup_ctrls({text_id: value}, errs)
+            if errs:
+                errors[text_id] = '\n'.join(errs)
+
+        self._refresh([self._ctrl_objects.get(text_id) for text_id in changes])
 
         return errors
 
     def get_controls(self, hierarchy: bool = False):
-        necessary_params = ['name', 'tooltip', 'type', 'value', 'min', 'max', 'default', 'step', 'inactive',
-                            'readonly', 'unrestorable']
+        """
+        Controls from the cache, the device isn't touched (except of the hierarchy mode).
+        """
+        return self._ctrls.get_ctrl_pages() if hierarchy else self._controls
+
+    @staticmethod
+    def _control_state(ctrl: V4L2Ctrl) -> dict[str, Any]:
+        return {param_name: getattr(ctrl, param_name) for param_name in CONTROL_PARAMS}
 
-        return self._ctrls.get_ctrl_pages() if hierarchy else {
-            ctrl.text_id: {
-                param_name: getattr(ctrl, param_name) for param_name in necessary_params
-            } for ctrl in self._ctrls.get_ctrls()
-        }
+    def _refresh(self, ctrls: list[V4L2Ctrl | None]):
+        """
+        Update cache after own writes: the driver may not send events to the writer.
+        """
+        self._store([ctrl for ctrl in ctrls if ctrl is not None])
+
+    def _store(self, ctrls: list[V4L2Ctrl]):
+        changes = {}
+
+        with self._cache_lock:
+            controls = dict(self._controls)
+            for ctrl in ctrls:
+                state = self._control_state(ctrl)
+                if controls.get(ctrl.text_id) != state:
+                    controls[ctrl.text_id] = state
+                    changes[ctrl.text_id] = state['value']
+
+            if not changes:
+                return
+
+            # Readers get the whole dictionary at once, without locking.
+            self._controls = controls
+            self._version += 1
+            version = self._version
+
+        for listener in self._change_listeners:
+            listener(version, changes)
 
     def _get_control_values(self):
         return {ctrl.text_id: ctrl.value for ctrl in self._ctrls.get_ctrls()}
 
     def _update_params(self, event: V4L2Ctrl):
         logging.debug(f'V4LEvent: %s %s %s', event.text_id, event.name, event.value)
-        {
-            self._ptz.pan_absolute.text_id: lambda: logging.debug('PAN'),
-            self._ptz.tilt_absolute.text_id: lambda: logging.debug('TILT'),
-            self._ptz.zoom_absolute.text_id: lambda: logging.debug('ZOOM'),
-            self._focus_absolute.text_id: lambda: logging.debug('FOCUS_FLAG'),
-            self._focus_auto.text_id: lambda: logging.debug('FOCUS_VALUE')
-        }[event.text_id]()
-
-        print()
+        self._store([event])
+
+    def close(self):
+        """
+        Stop the control events thread and close the device.
+        """
+        if self._listener is not None:
+            self._listener.stop()
+            self._listener = None
+
+        if self._camera_fd is not None:
+            os.close(self._camera_fd)
+            self._camera_fd = None
 
     def __del__(self):
         pass
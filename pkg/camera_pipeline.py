@@ -0,0 +1,149 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import logging
+import os
+from pathlib import Path
+from typing import Callable
+
+from .camera_motion_controller import CameraMotionController
+from .capturers.capturer import CameraCapturer
+from .frame_generator import FrameGenerator
+from .frame_hub import FrameHub
+from .h264_stream import H264Streamer
+from .processing import FrameProcessor, ProcessingStage, StageResult
+from .ptz_scheduler import PTZScheduler, PTZTarget
+from .recorder import Recorder
+
+
+def camera_cpu(index: int) -> int | None:
+    """
+    CPU for the camera with this index: cameras are spread across the available CPUs.
+    """
+    if not hasattr(os, 'sched_getaffinity'):
+        return None
+
+    cpus = sorted(os.sched_getaffinity(0))
+    return cpus[index % len(cpus)]
+
+
+def _pin_thread(cpu: int):
+    try:
+        # 0 is the calling thread on Linux.
+        os.sched_setaffinity(0, {cpu})
+    except OSError as e:
+        logging.warning('Thread can\'t be pinned to CPU %d: %s', cpu, e)
+
+
+def camera_executor(name: str, cpu: int | None = None) -> ThreadPoolExecutor:
+    """
+    Capture and encode worker of one camera, optionally pinned to the CPU.
+
+    Encoders (OpenCV, PIL, libturbojpeg) release the GIL, so cameras are encoded in parallel.
+    """
+    return ThreadPoolExecutor(max_workers=1, thread_name_prefix=f'camera_{name}',
+                              initializer=None if cpu is None else _pin_thread,
+                              initargs=() if cpu is None else (cpu,))
+
+
+class CameraPipeline:
+    """
+    Camera device with its capturer, stream generators and motion controller (for the PTZ cameras).
+
+    Use CameraPipeline.open(): devices are opened in the worker threads, without blocking the event loop.
+    """
+
+    def __init__(self, camera_id: str, device_path: str, capturer: CameraCapturer,
+                 controller: CameraMotionController | None, ptz_rate: float = 15,
+                 on_ptz_applied: Callable[[PTZTarget, float, list[str]], None] | None = None,
+                 recordings_dir: Path | None = None, recordings_budget: int = 1024 * 2 ** 20,
+                 cpu: int | None = None, stages: list[ProcessingStage] | None = None,
+                 on_stage_result: Callable[[StageResult], None] | None = None):
+        """
+        :param recordings_dir: record the stream into this directory, None - don't record.
+        :param recordings_budget: disk budget for the recordings (bytes).
+        :param cpu: pin capture and encoding to this CPU.
+        :param stages: processing stages, which get the raw frames (raw capturers only).
+        """
+        self.camera_id = camera_id
+        self.device_path = device_path
+        self.cpu = cpu
+        self.capturer = capturer
+        self.controller = controller
+        self.executor = camera_executor(camera_id, cpu)
+        capturer.executor = self.executor
+        capturer.camera_id = camera_id
+        if stages and not capturer.provides_raw_frames:
+            logging.warning('Camera %s (%s) provides no raw frames, processing stages are disabled: %s', camera_id,
+                            type(capturer).__name__, ', '.join(stage.name for stage in stages))
+            stages = None
+        self.processor = FrameProcessor(stages, on_stage_result, camera_id)
+        if stages:
+            capturer.processor = self.processor
+        self.frame_hub = FrameHub(capturer, camera_id)
+        self.frame_generator = FrameGenerator(self.frame_hub)
+        self.h264_streamer = H264Streamer(self.frame_hub)
+        self.ptz_scheduler = None if controller is None else PTZScheduler(controller, max_rate=ptz_rate,
+                                                                           on_applied=on_ptz_applied)
+        self.recorder = None if recordings_dir is None else Recorder(self.frame_hub, recordings_dir,
+                                                                     recordings_budget)
+
+    @classmethod
+    async def open(cls, camera_id: str, device_path: str, capturer_factory: Callable[[str], CameraCapturer],
+                   controller_factory: Callable[[str], CameraMotionController] | None = CameraMotionController,
+                   **kwargs) -> 'CameraPipeline':
+        """
+        Open capturer and motion controller concurrently.
+
+        :param controller_factory: None for the cameras without PTZ.
+        """
+        async def no_controller():
+            return None
+
+        def close(capturer, controller):
+            if isinstance(capturer, CameraCapturer):
+                capturer.stop_capturing()
+            if controller is not None and not isinstance(controller, BaseException):
+                controller.close()
+
+        opening = asyncio.gather(asyncio.to_thread(capturer_factory, device_path),
+                                 no_controller() if controller_factory is None
+                                 else asyncio.to_thread(controller_factory, device_path),
+                                 return_exceptions=True)
+
+        try:
+            results = await asyncio.shield(opening)
+        except asyncio.CancelledError:
+            # Threads can't be cancelled: close the devices they open.
+            await asyncio.to_thread(close, *await opening)
+            raise
+
+        if errors := [result for result in results if isinstance(result, BaseException)]:
+            close(*results)
+            raise errors[0]
+
+        return cls(camera_id, device_path, *results, **kwargs)
+
+    async def start(self):
+        if self.ptz_scheduler is not None:
+            self.ptz_scheduler.start()
+        # Stage threads are started here: threads, started in the executor, inherit its CPU.
+        self.processor.start()
+        await asyncio.get_running_loop().run_in_executor(self.executor, self.capturer.start_capturing)
+        self.frame_hub.start()
+        if self.recorder is not None:
+            self.recorder.start()
+        logging.info('Camera %s (%s) pipeline started, CPU: %s.', self.camera_id, self.device_path, self.cpu)
+
+    async def stop(self):
+        if self.recorder is not None:
+            await self.recorder.stop()
+        await self.h264_streamer.stop()
+        await self.frame_hub.stop()
+        await asyncio.get_running_loop().run_in_executor(self.executor, self.capturer.stop_capturing)
+        await asyncio.to_thread(self.processor.stop)
+        if self.ptz_scheduler is not None:
+            self.ptz_scheduler.stop()
+        if self.controller is not None:
+            await asyncio.to_thread(self.controller.close)
+        self.executor.shutdown(wait=False)
+        logging.info('Camera %s (%s) pipeline stopped.', self.camera_id, self.device_path)
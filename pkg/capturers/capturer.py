@@ -1,12 +1,27 @@
 from abc import ABC, abstractmethod
+import asyncio
+from concurrent.futures import Executor
 from pathlib import Path
 
+import numpy as np
+
+from ..processing import FrameProcessor
+
 
 class CameraCapturer(ABC):
     """
     Abstract interface for camera capturers.
     """
 
+    # Blocking capture work runs here, None - the default executor.
+    executor: Executor | None = None
+    # Raw frames are passed to the processing stages, None - no processing.
+    processor: FrameProcessor | None = None
+    # Frames are encoded by the pool of threads, the constructor takes the 'encoders' argument.
+    has_encoder_pool = False
+    # Camera id for the metrics labels, assigned by the camera pipeline.
+    camera_id = ''
+
     def __init__(self, camera_device: int | str | Path):
         if isinstance(camera_device, int):
             self._camera_device = f'/dev/video{camera_device}'
@@ -25,6 +40,35 @@ class CameraCapturer(ABC):
     def capture_image(self):
         pass
 
+    async def capture_image_async(self):
+        """
+        Capture image without blocking the event loop.
+
+        Default implementation runs blocking capture_image() in the capturer executor.
+        """
+        return await asyncio.get_running_loop().run_in_executor(self.executor, self.capture_image)
+
+    @property
+    def provides_raw_frames(self) -> bool:
+        """
+        Raw frames are passed to the processing stages.
+        """
+        return False
+
+    @property
+    def capture_seq(self) -> int | None:
+        """
+        Capture seq of the last captured frame (the same as of its raw frame), None - not tracked.
+        """
+        return None
+
+    def process_raw(self, image: np.ndarray, pixelformat: str, seq: int, timestamp: float):
+        """
+        Pass the raw frame to the processing stages, called by the capturers with raw frames.
+        """
+        if self.processor is not None:
+            self.processor.submit(image, pixelformat, seq, timestamp)
+
     @property
     def camera_device(self) -> str:
         return self._camera_device
@@ -0,0 +1,189 @@
+import logging
+import os
+import threading
+import time
+from typing import Any, Callable
+
+from ..metrics import REGISTRY, FRAME_STAGE_SECONDS
+
+
+ENCODER_DROPPED = REGISTRY.counter('robo_encoder_dropped', 'Frames dropped, because the encoders were behind.',
+                                   ('camera', 'reason'))
+
+
+def _unpin_thread():
+    # Threads inherit the creator affinity, which may be pinned to the camera CPU: encoders use all process CPUs
+    # (the main thread id is the process id).
+    if hasattr(os, 'sched_setaffinity'):
+        try:
+            os.sched_setaffinity(0, os.sched_getaffinity(os.getpid()))
+        except OSError as e:
+            logging.warning('Encoder thread affinity can\'t be reset: %s', e)
+
+
+class EncodePipeline:
+    """
+    Grab thread and the pool of encoder threads.
+
+    Grab thread reads raw frames at the sensor rate and keeps only the newest one: when all encoders are busy,
+    the waiting raw frame is replaced. OpenCV, PIL and TurboJPEG release the GIL, so frames are encoded in parallel.
+    Encoded frames are delivered strictly in the capture order: a frame, which was encoded after the newer one,
+    is dropped. Frames are grabbed only while somebody reads them.
+    """
+
+    # Camera id for the metrics labels, the capturer assigns it before start().
+    camera_id = ''
+
+    def __init__(self, grab: Callable[[], Any | None], encode: Callable[[Any], bytes | None], encoders: int = 2,
+                 name: str = 'camera', idle_timeout: float = 1.0, retry_delay: float = 0.1,
+                 on_grabbed: Callable[[int, float, Any], None] | None = None):
+        """
+        :param grab: blocking read of the raw frame, None - frame isn't available.
+        :param encode: raw frame to JPEG, called from the encoder threads concurrently.
+        :param on_grabbed: called from the grab thread with the capture seq, capture time and raw frame.
+        :param idle_timeout: grabbing is paused, when get() wasn't called during this time (seconds).
+        """
+        if encoders < 1:
+            raise ValueError(f'At least one encoder is required, got {encoders}')
+
+        self._grab = grab
+        self._encode = encode
+        self._on_grabbed = on_grabbed
+        self._encoders = encoders
+        self._name = name
+        self._idle_timeout = idle_timeout
+        self._retry_delay = retry_delay
+
+        self._lock = threading.Lock()
+        self._demand = threading.Condition(self._lock)
+        self._raw_ready = threading.Condition(self._lock)
+        self._encoded_ready = threading.Condition(self._lock)
+
+        # (seq, grab time, raw frame) waiting for the free encoder.
+        self._raw: tuple[int, float, Any] | None = None
+        self._encoded = b''
+        self._seq = 0
+        self._delivered_seq = 0
+        self._consumed_seq = 0
+        self._requested = 0.0
+        self._running = False
+        self._threads: list[threading.Thread] = []
+
+    @property
+    def encoders(self) -> int:
+        return self._encoders
+
+    @property
+    def consumed_seq(self) -> int:
+        """
+        Capture seq of the frame, which was returned by get() last.
+        """
+        return self._consumed_seq
+
+    def start(self):
+        if self._running:
+            return
+
+        self._running = True
+        self._threads = [threading.Thread(target=self._grab_frames, name=f'{self._name}_grab', daemon=True)]
+        self._threads.extend(threading.Thread(target=self._encode_frames, name=f'{self._name}_encoder{index}',
+                                              daemon=True) for index in range(self._encoders))
+        for thread in self._threads:
+            thread.start()
+        logging.info('Encode pipeline %s started: %d encoders.', self._name, self._encoders)
+
+    def stop(self):
+        with self._lock:
+            if not self._running:
+                return
+            self._running = False
+            self._demand.notify_all()
+            self._raw_ready.notify_all()
+            self._encoded_ready.notify_all()
+
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+        self._raw = None
+
+    def get(self, timeout: float | None = None) -> bytes:
+        """
+        Wait for the encoded frame newer than the previously returned one.
+
+        :return: JPEG, b'' on timeout or when the pipeline is stopped.
+        """
+        with self._lock:
+            self._requested = time.monotonic()
+            self._demand.notify()
+
+            if not self._encoded_ready.wait_for(lambda: not self._running or self._delivered_seq > self._consumed_seq,
+                                                timeout) or not self._running:
+                return b''
+
+            self._consumed_seq = self._delivered_seq
+            return self._encoded
+
+    def _wanted(self) -> bool:
+        return not self._running or time.monotonic() - self._requested < self._idle_timeout
+
+    def _grab_frames(self):
+        while True:
+            with self._lock:
+                self._demand.wait_for(self._wanted)
+                if not self._running:
+                    return
+
+            try:
+                raw = self._grab()
+            except Exception as e:
+                logging.error('Frame grabbing failed: %s', e)
+                raw = None
+
+            if raw is None:
+                time.sleep(self._retry_delay)
+                continue
+
+            grabbed = time.monotonic()
+            with self._lock:
+                if self._raw is not None:
+                    ENCODER_DROPPED.inc(camera=self.camera_id, reason='busy')
+                self._seq += 1
+                seq = self._seq
+                self._raw = (seq, grabbed, raw)
+                self._raw_ready.notify()
+
+            if self._on_grabbed is not None:
+                self._on_grabbed(seq, grabbed, raw)
+
+    def _encode_frames(self):
+        _unpin_thread()
+
+        while True:
+            with self._lock:
+                self._raw_ready.wait_for(lambda: not self._running or self._raw is not None)
+                if not self._running:
+                    return
+                (seq, grabbed, raw), self._raw = self._raw, None
+
+            started = time.monotonic()
+            FRAME_STAGE_SECONDS.observe(started - grabbed, camera=self.camera_id, stage='encode_queue')
+
+            try:
+                data = self._encode(raw)
+            except Exception as e:
+                logging.error('Frame encoding failed: %s', e)
+                continue
+
+            FRAME_STAGE_SECONDS.observe(time.monotonic() - started, camera=self.camera_id, stage='encode')
+            if not data:
+                continue
+
+            with self._lock:
+                if seq < self._delivered_seq:
+                    # Newer frame was encoded faster.
+                    ENCODER_DROPPED.inc(camera=self.camera_id, reason='stale')
+                    continue
+
+                self._delivered_seq = seq
+                self._encoded = data
+                self._encoded_ready.notify_all()
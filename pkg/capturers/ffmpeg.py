@@ -9,11 +9,15 @@ from third_party.cameractrls.cameractrls import V4L2_PIX_FMT_RGB565, V4L2_PIX_FM
 from third_party.cameractrls.cameractrls import V4L2_PIX_FMT_MJPEG, V4L2_PIX_FMT_JPEG
 import ffmpeg
 
-import sys
+import subprocess
+import threading
 
 from .capturer import CameraCapturer
 
 
+READ_CHUNK_SIZE = 64 * 1024
+
+
 def v4l2_format2_ffmpeg(fmt) -> str:
     f_map = {
         V4L2_PIX_FMT_YUYV: 'yuyv', V4L2_PIX_FMT_YVYU: 'yvyu', V4L2_PIX_FMT_UYVY: 'uyvy', V4L2_PIX_FMT_NV12: 'nv12',
@@ -32,33 +36,200 @@ def v4l2_format2_ffmpeg(fmt) -> str:
     raise RuntimeError(f'Invalid pixel format: {fmt}')
 
 
+class JpegFrameSplitter:
+    """
+    Splits MJPEG byte stream into separate JPEG images on SOI/EOI markers.
+    """
+
+    SOI = b'\xff\xd8'
+    EOI = b'\xff\xd9'
+
+    def __init__(self):
+        self._buffer = bytearray()
+
+    def feed(self, data: bytes) -> list[bytes]:
+        self._buffer += data
+        frames = []
+
+        while True:
+            begin = self._buffer.find(self.SOI)
+            if begin < 0:
+                # Keep the last byte, it can be the first half of the marker.
+                del self._buffer[:-1]
+                break
+
+            end = self._buffer.find(self.EOI, begin + len(self.SOI))
+            if end < 0:
+                del self._buffer[:begin]
+                break
+
+            end += len(self.EOI)
+            frames.append(bytes(self._buffer[begin:end]))
+            del self._buffer[:end]
+
+        return frames
+
+
 class FFMPEGCapturer(CameraCapturer):
     """
-    Image capturer, uses ffmpeg.
+    Image capturer, uses long-lived ffmpeg process, which writes MJPEG to the pipe.
+
+    ffmpeg is restarted, when it exits (or fails to start) while capturing.
     """
-    def __init__(self, camera_device: int | str | Path):
+    def __init__(self, camera_device: int | str | Path, framerate: int = 30, quality: int = 5,
+                 video_filter: str | None = None, timeout: float = 1.0, restart_delay: float = 1.0):
+        """
+        :param quality: ffmpeg mjpeg quality scale, 2 (best) - 31 (worst).
+        :param video_filter: ffmpeg filter graph, i.e. scaling filters.
+        :param timeout: capture_image() returns empty frame after this time (seconds).
+        :param restart_delay: delay before the exited ffmpeg is restarted (seconds).
+        """
         super().__init__(camera_device)
+        self._framerate = framerate
+        self._quality = quality
+        self._video_filter = video_filter
+        self._timeout = timeout
+        self._restart_delay = restart_delay
+
+        # Serializes start and stop of the process: capture_image() restarts it from the capture thread.
+        self._process_lock = threading.Lock()
+        self._capturing = False
         self._ffmpeg_process = None
+        self._exit_code = None
+        self._reader = None
+        self._frame_ready = threading.Condition()
+        self._image = None
+        self._seq = 0
+        self._last_seq = 0
 
     def start_capturing(self):
-        pass
+        with self._process_lock:
+            with self._frame_ready:
+                self._capturing = True
+            self._start_process()
 
     def stop_capturing(self):
+        with self._process_lock:
+            with self._frame_ready:
+                self._capturing = False
+                # Wake up waiting consumers and the pending restart.
+                self._frame_ready.notify_all()
+            self._stop_process()
+
+    def _start_process(self):
         if self._ffmpeg_process is not None:
-            self._ffmpeg_process.interrupt()
+            return
+
+        output_args = {'format': 'mjpeg', 'vcodec': 'mjpeg', 'q:v': self._quality}
+        if self._video_filter is not None:
+            output_args['vf'] = self._video_filter
 
-    def capture_image(self):
         try:
-            self._ffmpeg_process = (
+            process = (
                 ffmpeg
-                .input(self._camera_device, format='v4l2', framerate=30)
-                .output('pipe:', format='image2pipe', pix_fmt='bgr24', preset='veryfast', v=1)
+                .input(self._camera_device, format='v4l2', framerate=self._framerate)
+                .output('pipe:', **output_args)
                 #.output('pipe:', format='webm', vcodec='libvpx-vp9', acodec='libvorbis', preset='fast', crf=20)
                 #.output('pipe:', format='mpegts', vcodec='libx264', acodec='aac', preset='fast') #, crf=23)
-                #.output('pipe:', format='mpeg', vcodec='libx264', acodec='aac', preset='veryfast') #, crf=23)
+                .global_args('-loglevel', 'error', '-nostdin')
                 .run_async(pipe_stdout=True)
             )
+        except (ffmpeg.Error, OSError) as e:
+            logging.error('ffmpeg start failed %s: %s', self._camera_device, e)
+            return
+
+        with self._frame_ready:
+            self._ffmpeg_process = process
+            self._exit_code = None
+
+        self._reader = threading.Thread(target=self._read_frames, args=(process,), name='ffmpeg_reader', daemon=True)
+        self._reader.start()
+
+    def _stop_process(self):
+        if self._ffmpeg_process is None:
+            return
+
+        with self._frame_ready:
+            process, self._ffmpeg_process = self._ffmpeg_process, None
+            self._frame_ready.notify_all()
+
+        process.terminate()
+
+        try:
+            process.wait(self._timeout)
+        except subprocess.TimeoutExpired:
+            logging.warning('ffmpeg was not terminated, killing it.')
+            process.kill()
+            process.wait()
+
+        if self._reader is not None:
+            self._reader.join(self._timeout)
+            self._reader = None
+
+    def _restart(self):
+        with self._process_lock:
+            if not self._capturing:
+                return
+            self._stop_process()
+
+        with self._frame_ready:
+            if self._frame_ready.wait_for(lambda: not self._capturing, self._restart_delay):
+                return
+
+        with self._process_lock:
+            if self._capturing:
+                logging.info('Restarting ffmpeg %s.', self._camera_device)
+                self._start_process()
+
+    def _read_frames(self, process):
+        splitter = JpegFrameSplitter()
+
+        while data := process.stdout.read1(READ_CHUNK_SIZE):
+            frames = splitter.feed(data)
+            if not frames:
+                continue
+
+            # Only the newest frame is interesting.
+            with self._frame_ready:
+                self._image = frames[-1]
+                self._seq += 1
+                self._frame_ready.notify_all()
+
+        exit_code = process.wait()
+        logging.info('ffmpeg output closed, exit code: %s', exit_code)
+
+        with self._frame_ready:
+            if self._ffmpeg_process is process:
+                self._exit_code = exit_code
+                self._frame_ready.notify_all()
+
+    def capture_image(self):
+        """
+        Wait for the frame, which wasn't returned yet.
+
+        :return: JPEG, b'' on timeout or when ffmpeg isn't running.
+        """
+        with self._frame_ready:
+            self._frame_ready.wait_for(lambda: self._seq != self._last_seq or not self._capturing
+                                       or self._ffmpeg_process is None or self._exit_code is not None,
+                                       self._timeout)
+
+            if self._seq != self._last_seq:
+                self._last_seq = self._seq
+                return self._image
+
+            if not self._capturing:
+                return b''
+
+            # Not started: the start failure is already logged.
+            exited = self._ffmpeg_process is None or self._exit_code is not None
+            if self._exit_code is not None:
+                logging.error('ffmpeg %s exited with code %s, restarting in %.1f s.', self._camera_device,
+                              self._exit_code, self._restart_delay)
+            elif not exited:
+                logging.warning('%s: timeout occured', self._camera_device)
+
+        if exited:
+            self._restart()
 
-            return self._ffmpeg_process.stdout.read()
-        except ffmpeg.Error as e:
-            logging.error(e.stderr.decode(), file=sys.stderr)
+        return b''
@@ -1,35 +1,71 @@
 import cv2
 from pathlib import Path
 import threading
+import time
 from .capturer import CameraCapturer
+from .encode_pipeline import EncodePipeline
+from ..metrics import FRAME_STAGE_SECONDS
 
 
 class CV2Capturer(CameraCapturer):
     """
     OpenCV camera capturer.
+
+    One thread reads frames from the camera, the pool of encoders compresses them concurrently.
     """
 
-    def __init__(self, camera_device: int | str | Path):
+    has_encoder_pool = True
+
+    def __init__(self, camera_device: int | str | Path, encoders: int = 2, timeout: float = 1.0):
+        """
+        :param encoders: number of the JPEG encoder threads.
+        :param timeout: capture_image() returns empty frame after this time (seconds).
+        """
         super().__init__(camera_device)
         self._cv2_camera = cv2.VideoCapture(camera_device)
         self._lock = threading.Lock()
+        self._timeout = timeout
+        self._pipeline = EncodePipeline(self._read, self._encode, encoders, name=f'cv2_{Path(str(camera_device)).name}',
+                                        on_grabbed=self._process_grabbed)
 
     def start_capturing(self):
-        pass
+        self._pipeline.camera_id = self.camera_id
+        self._pipeline.start()
 
     def stop_capturing(self):
+        self._pipeline.stop()
         with self._lock:
             if self._cv2_camera.isOpened():
                 self._cv2_camera.release()
 
-    def capture_image(self):
+    def _read(self):
         with self._lock:
+            started = time.monotonic()
             ret, frame = self._cv2_camera.read()
             if not ret:
-                return b''
+                return None
 
-            ret, jpeg = cv2.imencode('.jpg', frame)
-            if not ret:
-                return b''
+            # Includes waiting for the sensor.
+            FRAME_STAGE_SECONDS.observe(time.monotonic() - started, camera=self.camera_id, stage='dequeue')
+
+            # New array for every frame: stages and encoders share it.
+            return frame
 
-            return jpeg.tobytes()
+    def _process_grabbed(self, seq: int, grabbed: float, frame):
+        self.process_raw(frame, 'BGR', seq, grabbed)
+
+    @staticmethod
+    def _encode(frame) -> bytes:
+        ret, jpeg = cv2.imencode('.jpg', frame)
+        return jpeg.tobytes() if ret else b''
+
+    @property
+    def provides_raw_frames(self) -> bool:
+        return True
+
+    @property
+    def capture_seq(self) -> int | None:
+        return self._pipeline.consumed_seq
+
+    def capture_image(self):
+        return self._pipeline.get(self._timeout)
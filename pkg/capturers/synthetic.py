@@ -0,0 +1,199 @@
+import io
+import logging
+from pathlib import Path
+import threading
+import time
+
+import numpy as np
+from PIL import Image
+
+from .capturer import CameraCapturer
+from .encode_pipeline import EncodePipeline
+from ..metrics import FRAME_STAGE_SECONDS
+
+
+PIXEL_FORMATS = ['MJPG', 'RGB3', 'YUYV']
+
+
+def _test_pattern(width: int, height: int, index: int, frames: int) -> np.ndarray:
+    """
+    Moving gradient with the bar: frames differ, so JPEG sizes are realistic.
+    """
+    x = np.linspace(0, 255, width, dtype=np.float32)
+    y = np.linspace(0, 255, height, dtype=np.float32)[:, None]
+    shift = 255 * index / frames
+
+    rgb = np.empty((height, width, 3), dtype=np.uint8)
+    rgb[..., 0] = (x + shift) % 256
+    rgb[..., 1] = (y + shift) % 256
+    rgb[..., 2] = ((x + y) / 2) % 256
+
+    bar = int(width * index / frames)
+    rgb[:, bar:bar + max(1, width // 32)] = 255
+
+    return rgb
+
+
+def _rgb_to_yuyv(rgb: np.ndarray) -> bytes:
+    ycbcr = np.asarray(Image.fromarray(rgb).convert('YCbCr'))
+    yuyv = np.empty((rgb.shape[0], rgb.shape[1] * 2), dtype=np.uint8)
+    yuyv[:, 0::2] = ycbcr[..., 0]
+    yuyv[:, 1::4] = ycbcr[:, 0::2, 1]
+    yuyv[:, 3::4] = ycbcr[:, 0::2, 2]
+
+    return yuyv.tobytes()
+
+
+def _yuyv_to_image(data: bytes, width: int, height: int) -> Image.Image:
+    yuyv = np.frombuffer(data, dtype=np.uint8).reshape(height, width * 2)
+    ycbcr = np.empty((height, width, 3), dtype=np.uint8)
+    ycbcr[..., 0] = yuyv[:, 0::2]
+    ycbcr[..., 1] = np.repeat(yuyv[:, 1::4], 2, axis=1)
+    ycbcr[..., 2] = np.repeat(yuyv[:, 3::4], 2, axis=1)
+
+    return Image.fromarray(ycbcr, 'YCbCr')
+
+
+class SyntheticCapturer(CameraCapturer):
+    """
+    Hardware-free capturer for tests and benchmarks.
+
+    Frames are generated (or loaded from the video file) in the sensor pixel format once and replayed in a loop
+    with the camera frame rate. Raw formats are encoded on every capture by the encoder pool, as real raw cameras are.
+    """
+
+    has_encoder_pool = True
+
+    def __init__(self, camera_device: int | str | Path = 'synthetic', width: int = 640, height: int = 480,
+                 fps: float = 30, pixelformat: str = 'MJPG', source: str | Path | None = None,
+                 frames: int = 60, quality: int = 85, encoders: int = 1, timeout: float = 1.0):
+        """
+        :param pixelformat: 'MJPG' (passthrough), 'RGB3' or 'YUYV'.
+        :param source: video file to replay (OpenCV is required), test pattern otherwise.
+        :param frames: number of the generated (or maximal number of the loaded) frames.
+        :param encoders: number of the JPEG encoder threads.
+        :param timeout: capture_image() returns empty frame after this time (seconds).
+        """
+        super().__init__(camera_device)
+
+        if pixelformat not in PIXEL_FORMATS:
+            raise ValueError(f'Pixel format {pixelformat} is not supported, use one of: {PIXEL_FORMATS}')
+
+        self._width = width
+        self._height = height
+        self._interval = 1 / fps
+        self._pixelformat = pixelformat
+        self._source = source
+        self._frames_count = frames
+        self._quality = quality
+
+        self._frames: list[bytes] = []
+        self._index = 0
+        self._next_frame_time = 0.0
+        self._lock = threading.Lock()
+        self._timeout = timeout
+        self._pipeline = EncodePipeline(self._grab, self._encode, encoders, name=f'synthetic_{camera_device}',
+                                        on_grabbed=self._process_grabbed)
+
+    def _load_rgb_frames(self) -> list[np.ndarray]:
+        if self._source is None:
+            return [_test_pattern(self._width, self._height, i, self._frames_count)
+                    for i in range(self._frames_count)]
+
+        import cv2
+
+        video = cv2.VideoCapture(str(self._source))
+        frames = []
+        try:
+            while len(frames) < self._frames_count:
+                ret, frame = video.read()
+                if not ret:
+                    break
+                frame = cv2.resize(frame, (self._width, self._height), interpolation=cv2.INTER_AREA)
+                frames.append(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
+        finally:
+            video.release()
+
+        if not frames:
+            raise OSError(f'Video {self._source} can\'t be read')
+
+        return frames
+
+    def _encode_jpeg(self, image: Image.Image) -> bytes:
+        jpeg = io.BytesIO()
+        image.save(jpeg, format='jpeg', quality=self._quality)
+        return jpeg.getvalue()
+
+    def start_capturing(self):
+        started = time.monotonic()
+        rgb_frames = self._load_rgb_frames()
+
+        match self._pixelformat:
+            case 'MJPG':
+                self._frames = [self._encode_jpeg(Image.fromarray(frame)) for frame in rgb_frames]
+            case 'YUYV':
+                self._frames = [_rgb_to_yuyv(frame) for frame in rgb_frames]
+            case _:
+                self._frames = [frame.tobytes() for frame in rgb_frames]
+
+        self._next_frame_time = time.monotonic()
+        logging.info('Synthetic camera: %d %s frames %dx%d prepared in %.3f s.', len(self._frames),
+                     self._pixelformat, self._width, self._height, time.monotonic() - started)
+        self._pipeline.camera_id = self.camera_id
+        self._pipeline.start()
+
+    def stop_capturing(self):
+        self._pipeline.stop()
+        self._frames = []
+
+    def _grab(self) -> bytes | None:
+        with self._lock:
+            if not self._frames:
+                return None
+
+            # Sensor frame rate: wait for the next frame, late frames are skipped.
+            started = time.monotonic()
+            if (delay := self._next_frame_time - started) > 0:
+                time.sleep(delay)
+                self._next_frame_time += self._interval
+            else:
+                self._next_frame_time = started + self._interval
+
+            data = self._frames[self._index]
+            self._index = (self._index + 1) % len(self._frames)
+
+            FRAME_STAGE_SECONDS.observe(time.monotonic() - started, camera=self.camera_id, stage='wait')
+
+            return data
+
+    def _process_grabbed(self, seq: int, grabbed: float, data: bytes):
+        match self._pixelformat:
+            case 'YUYV':
+                self.process_raw(np.frombuffer(data, dtype=np.uint8).reshape(self._height, self._width * 2), 'YUYV',
+                                 seq, grabbed)
+            case 'RGB3':
+                self.process_raw(np.frombuffer(data, dtype=np.uint8).reshape(self._height, self._width, 3), 'RGB',
+                                 seq, grabbed)
+
+    def _encode(self, data: bytes) -> bytes:
+        match self._pixelformat:
+            case 'MJPG':
+                return data
+            case 'YUYV':
+                image = _yuyv_to_image(data, self._width, self._height)
+            case _:
+                image = Image.frombytes('RGB', (self._width, self._height), data)
+
+        return self._encode_jpeg(image)
+
+    @property
+    def provides_raw_frames(self) -> bool:
+        # MJPG frames are passed through, never decoded.
+        return self._pixelformat != 'MJPG'
+
+    @property
+    def capture_seq(self) -> int | None:
+        return self._pipeline.consumed_seq
+
+    def capture_image(self):
+        return self._pipeline.get(self._timeout)
@@ -1,3 +1,4 @@
+import asyncio
 import ctypes
 from fcntl import ioctl
 import io
@@ -6,6 +7,7 @@ from pathlib import Path
 from select import poll, POLLIN
 import struct
 import sys
+import time
 
 from third_party.cameractrls.cameractrls import V4L2_PIX_FMT_YUYV, V4L2_PIX_FMT_YVYU, V4L2_PIX_FMT_UYVY, V4L2_PIX_FMT_YU12, V4L2_PIX_FMT_YV12
 from third_party.cameractrls.cameractrls import V4L2_PIX_FMT_NV12, V4L2_PIX_FMT_NV21  #, V4L2_PIX_FMT_GREY
@@ -22,6 +24,8 @@ from third_party.cameractrls.cameractrls import v4l2_capability, v4l2_format, v4
 from PIL import Image
 
 from .capturer import CameraCapturer
+from ..encoders.turbojpeg import YUVJpegEncoder
+from ..metrics import FRAME_STAGE_SECONDS
 
 
 class V4LCapturer(CameraCapturer):
@@ -29,9 +33,11 @@ class V4LCapturer(CameraCapturer):
     V4L capturer, uses cameractrls library.
     """
 
-    def __init__(self, camera_device: int | str | Path):
+    def __init__(self, camera_device: int | str | Path, timeout: float = 0.1):
         super().__init__(camera_device)
 
+        self._timeout = timeout
+
         self._camera = V4L2Camera(self.camera_device)
         self._camera.pipe = self
 
@@ -47,6 +53,11 @@ class V4LCapturer(CameraCapturer):
             self._outbuffer = (ctypes.c_uint8 * (width * height * 3))()
             self._bytesperline = width * 3
 
+        self._yuv_encoder = None
+
+        if YUVJpegEncoder.supports(self._camera.pixelformat):
+            self._yuv_encoder = YUVJpegEncoder(self._camera.pixelformat, width, height, self._camera.bytesperline)
+
         self._qbuf = None
         self._image = None
         self._poll = poll()
@@ -74,31 +85,72 @@ class V4LCapturer(CameraCapturer):
         except Exception as e:
             logging.error('VIDIOC_STREAMOFF failed %s: %s', self._camera.device, e)
 
-    def _capture(self):
+    def _dequeue(self) -> bool:
+        """
+        Dequeue filled buffer, convert it and queue it back. Device must be ready for reading.
+
+        :return: False, when no frame was dequeued.
+        """
         qbuf = self._qbuf
         camera = self._camera
         camera_fd = camera.fd
 
-        # DQBUF can block forever, so poll with 1000 ms timeout before
-        # quit after 0.1s.
-        if 0 == len(self._poll.poll(100)):
-           logging.warning('%s: timeout occured', camera.device)
-           return
+        started = time.monotonic()
 
         try:
             ioctl(camera_fd, VIDIOC_DQBUF, qbuf)
         except Exception as e:
             logging.error('VIDIOC_DQBUF failed %s: %s', camera.device, e)
             # self.pipe.write_buf(None)
-            return
+            return False
 
         buf = camera.cap_bufs[qbuf.index]
         buf.bytesused = qbuf.bytesused
         # buf.timestamp = qbuf.timestamp
 
+        dequeued = time.monotonic()
+        FRAME_STAGE_SECONDS.observe(dequeued - started, camera=self.camera_id, stage='dequeue')
+
         self.write_buf(buf)
+        FRAME_STAGE_SECONDS.observe(time.monotonic() - dequeued, camera=self.camera_id, stage='encode')
 
         ioctl(camera_fd, VIDIOC_QBUF, buf)
+        return True
+
+    def _capture(self) -> bool:
+        # DQBUF can block forever, so poll with timeout before.
+        started = time.monotonic()
+        if 0 == len(self._poll.poll(int(self._timeout * 1000))):
+           # Normal for the slow cameras, i.e. in low light.
+           logging.debug('%s: timeout occured', self._camera.device)
+           return False
+        FRAME_STAGE_SECONDS.observe(time.monotonic() - started, camera=self.camera_id, stage='wait')
+
+        return self._dequeue()
+
+    async def _capture_async(self) -> bool:
+        loop = asyncio.get_running_loop()
+        camera_fd = self._camera.fd
+        ready = loop.create_future()
+
+        started = time.monotonic()
+        loop.add_reader(camera_fd, lambda: ready.done() or ready.set_result(None))
+        try:
+            await asyncio.wait_for(ready, self._timeout)
+        except asyncio.TimeoutError:
+            logging.debug('%s: timeout occured', self._camera.device)
+            return False
+        finally:
+            loop.remove_reader(camera_fd)
+
+        FRAME_STAGE_SECONDS.observe(time.monotonic() - started, camera=self.camera_id, stage='wait')
+
+        # Buffer is ready, so DQBUF returns immediately.
+        if self._camera.pixelformat in [V4L2_PIX_FMT_MJPEG, V4L2_PIX_FMT_JPEG]:
+            return self._dequeue()
+
+        # Raw frames must be encoded, don't do it in the event loop.
+        return await loop.run_in_executor(self.executor, self._dequeue)
 
     def write_buf(self, buf):
         """
@@ -109,23 +161,40 @@ class V4LCapturer(CameraCapturer):
             return
 
         logging.debug('write_buf() called, buffer size = %d', buf.bytesused)
-        ptr = (ctypes.c_uint8 * buf.bytesused).from_buffer(buf.buffer)
-
-        img_byte_arr = io.BytesIO()
 
         if self._camera.pixelformat == V4L2_PIX_FMT_MJPEG or self._camera.pixelformat == V4L2_PIX_FMT_JPEG:
-            img_byte_arr.write(ptr)
+            # Passthrough: the only copy is from the kernel buffer, which must be queued back.
+            with memoryview(buf.buffer) as kernel_buf:
+                self._image = kernel_buf[:buf.bytesused].tobytes()
             # tj_decompress(self._tj, ptr, buf.bytesused, self._outbuffer, self._camera.width,
             #               self._bytesperline, self._camera.height, TJPF_RGB, 0)
             # Ignore decode errors, some cameras only send imperfect frames.
             # ptr = self._outbuffer
-        else:
-            logging.debug('Pixel format: %d', self._camera.pixelformat)
-            Image.frombytes('RGB', (self._camera.width, self._camera.height), ptr, 'raw') \
-                .save(img_byte_arr, format='jpeg')
+            return
+
+        logging.debug('Pixel format: %d', self._camera.pixelformat)
+
+        if self._yuv_encoder is not None:
+            # YUV is compressed as is, without RGB conversion.
+            with memoryview(buf.buffer) as kernel_buf:
+                self._image = self._yuv_encoder.encode(kernel_buf[:buf.bytesused])
+            return
+
+        ptr = (ctypes.c_uint8 * buf.bytesused).from_buffer(buf.buffer)
+        img_byte_arr = io.BytesIO()
+        Image.frombytes('RGB', (self._camera.width, self._camera.height), ptr, 'raw') \
+            .save(img_byte_arr, format='jpeg')
 
         self._image = img_byte_arr.getvalue()
 
     def capture_image(self):
-        self._capture()
-        return self._image
+        """
+        :return: JPEG, b'' on timeout: the previous frame must not be published again.
+        """
+        return self._image if self._capture() else b''
+
+    async def capture_image_async(self):
+        """
+        Wait for the camera fd in the running event loop, so capture never blocks request handling.
+        """
+        return self._image if await self._capture_async() else b''
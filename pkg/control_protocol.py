@@ -0,0 +1,78 @@
+"""
+Compact binary format of the WebSocket control channel.
+
+All values are little-endian. Every message starts with the header: message type (uint8), flags (uint8),
+sequence number (uint16). Payloads:
+
+* MOTION: direction code (uint8), x (int8), y (int8), -128 means "no coordinate".
+* PTZ: pan, tilt, zoom (int32).
+* FOCUS: auto flag (uint8), value (int32), -1 means "no value".
+* RESET: no payload.
+* ACK (server to client): status (uint8), 0 is success.
+
+Messages have no camera address: PTZ, FOCUS and RESET are applied to the default camera.
+"""
+
+from enum import IntEnum
+import struct
+
+from .api_data_structures import PTZRecord, Focus, Direction
+
+
+class MessageType(IntEnum):
+    MOTION = 1
+    PTZ = 2
+    FOCUS = 3
+    RESET = 4
+    ACK = 0x80
+
+
+class AckStatus(IntEnum):
+    OK = 0
+    INVALID = 1
+    FAILED = 2
+
+
+HEADER = struct.Struct('<BBH')
+MOTION = struct.Struct('<Bbb')
+PTZ = struct.Struct('<iii')
+FOCUS = struct.Struct('<Bi')
+ACK = struct.Struct('<B')
+
+DIRECTIONS = ['C', 'N', 'NE', 'E', 'SE', 'S', 'SW', 'W', 'NW']
+NO_COORDINATE = -128
+NO_FOCUS_VALUE = -1
+
+RESET = 'reset'
+
+
+def decode_command(data: bytes) -> tuple[int, PTZRecord | Focus | Direction | str]:
+    """
+    :return: sequence number and command, raises ValueError for malformed messages.
+    """
+    try:
+        message_type, _, seq = HEADER.unpack_from(data)
+
+        match message_type:
+            case MessageType.MOTION:
+                code, x, y = MOTION.unpack_from(data, HEADER.size)
+                # Fields are already validated by the layout.
+                return seq, Direction.model_construct(direction=DIRECTIONS[code],
+                                                      x=None if NO_COORDINATE == x else x,
+                                                      y=None if NO_COORDINATE == y else y)
+            case MessageType.PTZ:
+                pan, tilt, zoom = PTZ.unpack_from(data, HEADER.size)
+                return seq, PTZRecord.model_construct(pan=pan, tilt=tilt, zoom=zoom)
+            case MessageType.FOCUS:
+                auto, value = FOCUS.unpack_from(data, HEADER.size)
+                return seq, Focus.model_construct(auto=bool(auto), value=None if NO_FOCUS_VALUE == value else value)
+            case MessageType.RESET:
+                return seq, RESET
+    except (struct.error, IndexError) as e:
+        raise ValueError(f'Malformed control message: {e}') from e
+
+    raise ValueError(f'Unknown control message type: {message_type}')
+
+
+def encode_ack(seq: int, status: AckStatus = AckStatus.OK) -> bytes:
+    return HEADER.pack(MessageType.ACK, 0, seq) + ACK.pack(status)
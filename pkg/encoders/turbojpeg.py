@@ -0,0 +1,187 @@
+"""
+Direct YUV to JPEG compression, uses libjpeg-turbo (the same library cameraview loads for decompression).
+"""
+
+import ctypes
+import ctypes.util
+import functools
+import logging
+import threading
+
+import numpy as np
+
+from third_party.cameractrls.cameractrls import V4L2_PIX_FMT_YUYV, V4L2_PIX_FMT_YVYU, V4L2_PIX_FMT_UYVY
+from third_party.cameractrls.cameractrls import V4L2_PIX_FMT_YU12, V4L2_PIX_FMT_YV12
+from third_party.cameractrls.cameractrls import V4L2_PIX_FMT_NV12, V4L2_PIX_FMT_NV21
+
+
+TJSAMP_422 = 1
+TJSAMP_420 = 2
+TJFLAG_NOREALLOC = 1024
+TJFLAG_FASTDCT = 2048
+
+tj_handle = ctypes.c_void_p
+
+
+class _TurboJpeg:
+    """
+    libjpeg-turbo compression functions.
+    """
+
+    def __init__(self):
+        library = ctypes.CDLL(ctypes.util.find_library('turbojpeg') or 'libturbojpeg.so.0')
+
+        self.init_compress = library.tjInitCompress
+        self.init_compress.argtypes = []
+        self.init_compress.restype = tj_handle
+
+        self.destroy = library.tjDestroy
+        self.destroy.argtypes = [tj_handle]
+        self.destroy.restype = ctypes.c_int
+
+        self.buf_size = library.tjBufSize
+        self.buf_size.argtypes = [ctypes.c_int, ctypes.c_int, ctypes.c_int]
+        self.buf_size.restype = ctypes.c_ulong
+
+        self.compress_from_yuv_planes = library.tjCompressFromYUVPlanes
+        self.compress_from_yuv_planes.argtypes = [
+            tj_handle, ctypes.POINTER(ctypes.c_void_p), ctypes.c_int, ctypes.POINTER(ctypes.c_int), ctypes.c_int,
+            ctypes.c_int, ctypes.POINTER(ctypes.POINTER(ctypes.c_ubyte)), ctypes.POINTER(ctypes.c_ulong), ctypes.c_int,
+            ctypes.c_int
+        ]
+        self.compress_from_yuv_planes.restype = ctypes.c_int
+
+        self.get_error_str = library.tjGetErrorStr2
+        self.get_error_str.argtypes = [tj_handle]
+        self.get_error_str.restype = ctypes.c_char_p
+
+
+@functools.cache
+def _turbojpeg() -> _TurboJpeg:
+    # Loaded on the first use: MJPEG passthrough doesn't need the library.
+    return _TurboJpeg()
+
+
+def _packed_422_planes(frame: np.ndarray, y_offset: int, u_offset: int, v_offset: int):
+    # Packed 4:2:2 has two pixels in four bytes: Y0 U Y1 V (component order depends on format).
+    return (np.ascontiguousarray(frame[:, y_offset::2]),
+            np.ascontiguousarray(frame[:, u_offset::4]),
+            np.ascontiguousarray(frame[:, v_offset::4]))
+
+
+def _semi_planar_420_planes(frame: np.ndarray, height: int, u_offset: int, v_offset: int):
+    # Full Y plane, then interleaved half-height chroma plane.
+    chroma = frame[height:height + height // 2]
+    return (frame[:height],
+            np.ascontiguousarray(chroma[:, u_offset::2]),
+            np.ascontiguousarray(chroma[:, v_offset::2]))
+
+
+def _planar_420_planes(data: np.ndarray, width: int, height: int, bytesperline: int, swap_chroma: bool):
+    y_size = bytesperline * height
+    c_stride = bytesperline // 2
+    c_size = c_stride * (height // 2)
+
+    y_plane = data[:y_size].reshape(height, bytesperline)[:, :width]
+    first = data[y_size:y_size + c_size].reshape(height // 2, c_stride)[:, :width // 2]
+    second = data[y_size + c_size:y_size + 2 * c_size].reshape(height // 2, c_stride)[:, :width // 2]
+
+    return (y_plane, second, first) if swap_chroma else (y_plane, first, second)
+
+
+class YUVJpegEncoder:
+    """
+    Compresses raw YUV camera buffers straight to JPEG, without RGB conversion.
+    """
+
+    SUPPORTED_FORMATS = [V4L2_PIX_FMT_YUYV, V4L2_PIX_FMT_YVYU, V4L2_PIX_FMT_UYVY, V4L2_PIX_FMT_NV12,
+                         V4L2_PIX_FMT_NV21, V4L2_PIX_FMT_YU12, V4L2_PIX_FMT_YV12]
+
+    def __init__(self, pixelformat: int, width: int, height: int, bytesperline: int, quality: int = 85,
+                 fast_dct: bool = True):
+        if pixelformat not in self.SUPPORTED_FORMATS:
+            raise RuntimeError(f'Invalid pixel format: {pixelformat}')
+
+        try:
+            self._tj = _turbojpeg()
+        except (OSError, AttributeError) as e:
+            raise RuntimeError(f'libjpeg-turbo is required for the YUV pixel format {pixelformat}: {e}') from e
+
+        self._pixelformat = pixelformat
+        self._width = width
+        self._height = height
+        self._bytesperline = bytesperline
+        self.quality = quality
+
+        self._subsamp = TJSAMP_422 if pixelformat in [V4L2_PIX_FMT_YUYV, V4L2_PIX_FMT_YVYU, V4L2_PIX_FMT_UYVY] \
+            else TJSAMP_420
+        self._flags = TJFLAG_NOREALLOC | (TJFLAG_FASTDCT if fast_dct else 0)
+
+        # Handles aren't thread safe, but encoder may be shared between worker threads.
+        self._local = threading.local()
+        self._handles = []
+        self._handles_lock = threading.Lock()
+
+    @classmethod
+    def supports(cls, pixelformat: int) -> bool:
+        return pixelformat in cls.SUPPORTED_FORMATS
+
+    def _get_state(self):
+        state = getattr(self._local, 'state', None)
+        if state is None:
+            handle = self._tj.init_compress()
+            if not handle:
+                raise RuntimeError('tjInitCompress failed')
+
+            with self._handles_lock:
+                self._handles.append(handle)
+
+            out_size = self._tj.buf_size(self._width, self._height, self._subsamp)
+            state = self._local.state = (handle, (ctypes.c_ubyte * out_size)(), out_size)
+
+        return state
+
+    def _planes(self, buffer) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        data = np.frombuffer(buffer, dtype=np.uint8)
+        width, height, bpl = self._width, self._height, self._bytesperline
+        fmt = self._pixelformat
+
+        if fmt in [V4L2_PIX_FMT_YU12, V4L2_PIX_FMT_YV12]:
+            return _planar_420_planes(data, width, height, bpl, fmt == V4L2_PIX_FMT_YV12)
+
+        if fmt in [V4L2_PIX_FMT_NV12, V4L2_PIX_FMT_NV21]:
+            frame = data[:bpl * (height + height // 2)].reshape(height + height // 2, bpl)[:, :width]
+            return _semi_planar_420_planes(frame, height, *((0, 1) if fmt == V4L2_PIX_FMT_NV12 else (1, 0)))
+
+        frame = data[:bpl * height].reshape(height, bpl)[:, :width * 2]
+        return _packed_422_planes(frame, *{
+            V4L2_PIX_FMT_YUYV: (0, 1, 3),
+            V4L2_PIX_FMT_YVYU: (0, 3, 1),
+            V4L2_PIX_FMT_UYVY: (1, 0, 2),
+        }[fmt])
+
+    def encode(self, buffer, quality: int | None = None) -> bytes:
+        """
+        Encode raw frame buffer (bytes, mmap or anything supporting buffer protocol).
+        """
+        handle, out_buf, out_size = self._get_state()
+        planes = self._planes(buffer)
+
+        plane_ptrs = (ctypes.c_void_p * 3)(*[p.ctypes.data for p in planes])
+        strides = (ctypes.c_int * 3)(*[p.strides[0] for p in planes])
+        jpeg_buf = ctypes.cast(out_buf, ctypes.POINTER(ctypes.c_ubyte))
+        jpeg_size = ctypes.c_ulong(out_size)
+
+        if self._tj.compress_from_yuv_planes(handle, plane_ptrs, self._width, strides, self._height, self._subsamp,
+                                             ctypes.byref(jpeg_buf), ctypes.byref(jpeg_size),
+                                             self.quality if quality is None else quality, self._flags) != 0:
+            error = self._tj.get_error_str(handle).decode()
+            logging.error('tjCompressFromYUVPlanes failed: %s', error)
+            return b''
+
+        return ctypes.string_at(out_buf, jpeg_size.value)
+
+    def __del__(self):
+        # Constructor may fail before the handles list is created.
+        for handle in getattr(self, '_handles', []):
+            self._tj.destroy(handle)
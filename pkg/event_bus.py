@@ -0,0 +1,129 @@
+"""
+Broadcast bus for the server-sent events.
+"""
+
+import asyncio
+from collections import deque
+from dataclasses import dataclass
+from functools import cached_property
+import logging
+import time
+from typing import AsyncGenerator
+
+from sse_starlette.sse import ServerSentEvent
+
+from .api_data_structures import ServerEvent
+from .metrics import EVENTS_DROPPED
+
+
+@dataclass(frozen=True)
+class BusMessage:
+    """
+    Event, serialized once for all subscribers, wire formats are built once on demand.
+    """
+
+    id: int
+    event: str
+    data: str
+
+    @cached_property
+    def sse(self) -> bytes:
+        return ServerSentEvent(data=self.data, event=self.event, id=str(self.id)).encode()
+
+    @cached_property
+    def json(self) -> str:
+        # data is already JSON.
+        return f'{{"id":{self.id},"event":"{self.event}","data":{self.data}}}'
+
+
+class Subscriber:
+    """
+    Subscriber with the bounded ring buffer: when it's full, the oldest events are dropped.
+    """
+
+    def __init__(self, buffer_size: int):
+        self.events: deque[BusMessage] = deque(maxlen=buffer_size)
+        self.ready = asyncio.Event()
+        self.dropped = 0
+
+    def push(self, message: BusMessage):
+        if len(self.events) == self.events.maxlen:
+            self.dropped += 1
+            EVENTS_DROPPED.inc()
+        self.events.append(message)
+        self.ready.set()
+
+
+class EventBus:
+    """
+    Fan-out event bus: every subscriber gets every event, events are serialized once.
+
+    Event ids are monotonic, so reconnecting clients can replay missed events (Last-Event-ID).
+    """
+
+    def __init__(self, history_size: int = 256, subscriber_buffer: int = 64):
+        self._history: deque[BusMessage] = deque(maxlen=history_size)
+        self._subscriber_buffer = subscriber_buffer
+        self._subscribers: set[Subscriber] = set()
+        # Start from the wall clock, so ids grow across the server restarts.
+        self._last_id = time.time_ns() // 1000_000
+
+    @property
+    def last_id(self) -> int:
+        return self._last_id
+
+    @property
+    def subscribers(self) -> int:
+        return len(self._subscribers)
+
+    @property
+    def queue_depth(self) -> int:
+        """
+        The longest subscriber queue.
+        """
+        return max((len(subscriber.events) for subscriber in self._subscribers), default=0)
+
+    def publish(self, event: ServerEvent) -> int:
+        """
+        Publish event to all subscribers, must be called from the event loop thread.
+
+        :return: event id.
+        """
+        self._last_id += 1
+        message = BusMessage(self._last_id, event.event, event.data.model_dump_json())
+        logging.debug('Server event: %s', message)
+
+        self._history.append(message)
+        for subscriber in self._subscribers:
+            subscriber.push(message)
+
+        return self._last_id
+
+    async def subscribe(self, last_event_id: int | None = None) -> AsyncGenerator[BusMessage, None]:
+        """
+        Yields serialized events.
+
+        :param last_event_id: replay events after this one.
+        """
+        subscriber = Subscriber(self._subscriber_buffer)
+
+        if last_event_id is not None:
+            for message in self._history:
+                if message.id > last_event_id:
+                    subscriber.push(message)
+
+        self._subscribers.add(subscriber)
+
+        try:
+            while True:
+                await subscriber.ready.wait()
+                subscriber.ready.clear()
+
+                while subscriber.events:
+                    yield subscriber.events.popleft()
+
+                if subscriber.dropped:
+                    logging.warning('Slow event subscriber: %d events dropped', subscriber.dropped)
+                    subscriber.dropped = 0
+        finally:
+            self._subscribers.discard(subscriber)
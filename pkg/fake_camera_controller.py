@@ -0,0 +1,124 @@
+"""
+Fake V4L2 control device for tests and benchmarks, has CameraMotionController interface.
+"""
+
+import logging
+import threading
+import time
+from typing import Any, Callable
+
+
+def _control(name: str, ctrl_type: str, minimum: int, maximum: int, default: int, step: int = 1) -> dict[str, Any]:
+    return {'name': name, 'tooltip': '', 'type': ctrl_type, 'value': default, 'min': minimum, 'max': maximum,
+            'default': default, 'step': step, 'inactive': False, 'readonly': False, 'unrestorable': False}
+
+
+def default_controls() -> dict[str, dict[str, Any]]:
+    return {
+        'brightness': _control('Brightness', 'integer', 0, 255, 128),
+        'contrast': _control('Contrast', 'integer', 0, 255, 128),
+        'pan_absolute': _control('Pan, Absolute', 'integer', -36000, 36000, 0, 3600),
+        'tilt_absolute': _control('Tilt, Absolute', 'integer', -36000, 36000, 0, 3600),
+        'zoom_absolute': _control('Zoom, Absolute', 'integer', 0, 10, 0),
+        'focus_automatic_continuous': _control('Focus, Automatic Continuous', 'boolean', 0, 1, 1),
+        'focus_absolute': _control('Focus, Absolute', 'integer', 0, 255, 0),
+    }
+
+
+class FakeCameraMotionController:
+    """
+    Controls live in memory, every device round trip takes ioctl_latency seconds.
+    """
+
+    def __init__(self, camera_device: int | str = 'synthetic', ioctl_latency: float = 0.002):
+        self._device = str(camera_device)
+        self._ioctl_latency = ioctl_latency
+        self._lock = threading.Lock()
+        self._controls = default_controls()
+        self._version = 0
+        self._change_listeners: list[Callable[[int, dict[str, Any]], None]] = []
+
+    @property
+    def has_ptz(self) -> bool:
+        return True
+
+    @property
+    def version(self) -> int:
+        return self._version
+
+    def add_change_listener(self, listener: Callable[[int, dict[str, Any]], None]):
+        self._change_listeners.append(listener)
+
+    def _value(self, text_id: str) -> int:
+        return self._controls[text_id]['value']
+
+    @property
+    def ptz(self) -> (int, int, int):
+        return self._value('pan_absolute'), self._value('tilt_absolute'), self._value('zoom_absolute')
+
+    @ptz.setter
+    def ptz(self, value: (int, int, int)):
+        self.set_ptz(*value)
+
+    @property
+    def focus(self) -> (bool, int):
+        return bool(self._value('focus_automatic_continuous')), self._value('focus_absolute')
+
+    @focus.setter
+    def focus(self, value: (bool, int)):
+        self.set_focus(*value)
+
+    def set_ptz(self, pan: int, tilt: int, zoom: int):
+        errors = self.apply_controls({
+            'pan_absolute': self._value('pan_absolute') + pan * self._controls['pan_absolute']['step'],
+            'tilt_absolute': self._value('tilt_absolute') + tilt * self._controls['tilt_absolute']['step'],
+            'zoom_absolute': zoom,
+        })
+        return list(errors.values())
+
+    def set_focus(self, auto: bool, value: int | None = None):
+        changes = {'focus_automatic_continuous': auto}
+        if value is not None:
+            changes['focus_absolute'] = value
+        return list(self.apply_controls(changes).values())
+
+    def reset(self):
+        return list(self.apply_controls({text_id: self._controls[text_id]['default']
+                                         for text_id in ['pan_absolute', 'tilt_absolute', 'zoom_absolute']}).values())
+
+    def apply_controls(self, changes: dict[str, int | bool | str]) -> dict[str, str]:
+        errors = {}
+        changed = {}
+
+        # One batched round trip.
+        time.sleep(self._ioctl_latency)
+
+        with self._lock:
+            controls = {text_id: dict(state) for text_id, state in self._controls.items()}
+            for text_id, value in changes.items():
+                if (state := controls.get(text_id)) is None:
+                    errors[text_id] = f'control {text_id} was not found'
+                    continue
+
+                value = min(state['max'], max(state['min'], int(value)))
+                if state['value'] != value:
+                    state['value'] = changed[text_id] = value
+
+            if not changed:
+                return errors
+
+            self._controls = controls
+            self._version += 1
+            version = self._version
+
+        logging.debug('Fake controls changed: %s', changed)
+        for listener in self._change_listeners:
+            listener(version, changed)
+
+        return errors
+
+    def close(self):
+        pass
+
+    def get_controls(self, hierarchy: bool = False):
+        return self._controls
@@ -1,31 +1,98 @@
 import asyncio
 import logging
+import time
 from typing import AsyncGenerator
 
-from .capturers.capturer import CameraCapturer
+from .adaptive_stream import AdaptiveStreamController
+from .frame_hub import FrameHub
+from .metrics import FRAME_STAGE_SECONDS, FRAMES_DELIVERED, FRAMES_DROPPED, FpsMeter
+from .renditions import Rendition, RenditionCache, SOURCE
+from .scene_change import SceneChangeDetector, StaticSceneFilter
+
+
+FRAME_HEADER = b'--frame\r\nContent-Type: image/jpeg\r\nContent-Length: %d\r\n\r\n'
+FRAME_TRAILER = b'\r\n'
 
 
 class FrameGenerator:
-    def __init__(self, capturer: CameraCapturer):
-        self._capturer = capturer
+    def __init__(self, frame_hub: FrameHub):
+        self._frame_hub = frame_hub
+        self._renditions = RenditionCache()
+        self._scene_detector = SceneChangeDetector()
+
+    @property
+    def scene_detector(self) -> SceneChangeDetector:
+        return self._scene_detector
 
-    async def __call__(self) -> AsyncGenerator[bytes, None]:
+    async def __call__(self, rendition: Rendition = SOURCE, max_fps: float | None = None,
+                       adaptive: AdaptiveStreamController | None = None,
+                       suppress_static: bool = False) -> AsyncGenerator[bytes, None]:
         """
         An asynchronous generator function that yields camera frames.
 
-        :yield: JPEG encoded image bytes.
+        :param rendition: client frame size and quality.
+        :param max_fps: maximal client frame rate, frames are paced by capture timestamps.
+        :param adaptive: controller, which overrides rendition and max_fps depending on the link quality.
+        :param suppress_static: don't send frames of the static scene, except keepalive ones.
+        :yield: multipart chunks: part header, JPEG encoded image bytes and part trailer.
         """
 
+        rendition = rendition.normalized()
+        min_interval = 1 / max_fps if max_fps else 0
+        last_timestamp = None
+        last_seq = None
+        camera_id = self._frame_hub.camera_id
+        fps_meter = FpsMeter(camera_id, 'mjpeg')
+        scene_filter = StaticSceneFilter(self._scene_detector, camera_id, 'mjpeg', fps_meter.client) \
+            if suppress_static else None
+
         try:
-            while True:
-                frame = self._capturer.capture_image()
-                if frame:
-                    yield (b'--frame\r\nContent-Type: image/jpeg\r\n\r\n' + frame + b'\r\n')
-                else:
-                    break
-                await asyncio.sleep(0)
+            async for frame in self._frame_hub.subscribe():
+                # Gaps are frames, which were produced while this client was busy.
+                if last_seq is not None and frame.seq - last_seq > 1:
+                    FRAMES_DROPPED.inc(frame.seq - last_seq - 1, camera=camera_id, stream='mjpeg')
+                last_seq = frame.seq
+
+                if adaptive is not None:
+                    rendition = adaptive.rendition
+                    min_interval = 1 / adaptive.max_fps
+
+                if last_timestamp is not None and (delay := last_timestamp + min_interval - frame.timestamp) > 0:
+                    # Too early: wait and take the newest frame after that.
+                    await asyncio.sleep(delay)
+                    continue
+
+                if scene_filter is not None and not await scene_filter.should_send(frame):
+                    continue
+
+                last_timestamp = frame.timestamp
+                frame = await self._renditions.get(frame, rendition)
+
+                send_started = time.monotonic()
+                FRAME_STAGE_SECONDS.observe(send_started - frame.timestamp, camera=camera_id, stage='queue_wait')
+
+                # Separate chunks, so the frame itself is never copied into a bigger buffer.
+                yield FRAME_HEADER % len(frame.data)
+                yield frame.data
+                yield FRAME_TRAILER
+
+                sent = time.monotonic()
+                FRAME_STAGE_SECONDS.observe(sent - send_started, camera=camera_id, stage='send')
+                FRAMES_DELIVERED.inc(camera=camera_id, stream='mjpeg')
+                fps_meter.tick(sent)
+                if scene_filter is not None:
+                    scene_filter.on_sent(len(frame.data))
+
+                if adaptive is not None:
+                    # Generator is resumed, when the previous chunks were sent.
+                    adaptive.on_frame_sent(frame.timestamp)
 
         except (asyncio.CancelledError, GeneratorExit):
             logging.info('Frame generation cancelled.')
         finally:
+            fps_meter.close()
+            if scene_filter is not None:
+                scene_filter.close()
+                logging.info('Static scene: %d frames, %d bytes were not sent.', scene_filter.frames_suppressed,
+                             scene_filter.bytes_saved)
             logging.info('Frame generator exited.')
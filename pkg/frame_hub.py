@@ -0,0 +1,129 @@
+import asyncio
+from dataclasses import dataclass
+import logging
+import time
+from typing import AsyncGenerator
+
+from .capturers.capturer import CameraCapturer
+from .metrics import FRAMES_CAPTURED
+
+
+@dataclass(frozen=True)
+class Frame:
+    """
+    Encoded frame, shared between all subscribers.
+    """
+
+    seq: int
+    timestamp: float
+    data: bytes
+    # Capturer seq of the raw frame (skipped frames included), matches ProcessingResult.seq, None - not tracked.
+    capture_seq: int | None = None
+
+
+class FrameHub:
+    """
+    Single-producer frame broadcaster.
+
+    One background task captures and encodes every frame once, subscribers always get the newest frame.
+    Slow subscribers skip frames instead of blocking the producer or other subscribers.
+    """
+
+    def __init__(self, capturer: CameraCapturer, camera_id: str = '', retry_delay: float = 0.1):
+        """
+        :param camera_id: metrics label of the frame hub and its consumers.
+        """
+        self._capturer = capturer
+        self._camera_id = camera_id
+        self._retry_delay = retry_delay
+        self._frame: Frame | None = None
+        self._seq = 0
+        self._subscribers = 0
+        self._new_frame = asyncio.Condition()
+        self._has_subscribers = asyncio.Event()
+        self._first_frame = asyncio.Event()
+        self._producer: asyncio.Task | None = None
+
+    @property
+    def capturer(self) -> CameraCapturer:
+        return self._capturer
+
+    @property
+    def camera_id(self) -> str:
+        return self._camera_id
+
+    @property
+    def subscribers(self) -> int:
+        return self._subscribers
+
+    @property
+    def latest(self) -> Frame | None:
+        return self._frame
+
+    async def wait_first_frame(self) -> Frame:
+        await self._first_frame.wait()
+        return self._frame
+
+    def start(self):
+        if self._producer is None:
+            self._producer = asyncio.create_task(self._produce(), name='frame_hub_producer')
+
+    async def stop(self):
+        if self._producer is None:
+            return
+
+        self._producer.cancel()
+        try:
+            await self._producer
+        except asyncio.CancelledError:
+            pass
+        finally:
+            self._producer = None
+
+    async def _capture(self) -> bytes | None:
+        return await self._capturer.capture_image_async()
+
+    async def _produce(self):
+        logging.info('Frame producer started.')
+
+        try:
+            while True:
+                # Don't capture frames nobody will see.
+                await self._has_subscribers.wait()
+
+                data = await self._capture()
+                if not data:
+                    await asyncio.sleep(self._retry_delay)
+                    continue
+
+                self._seq += 1
+                self._frame = Frame(self._seq, time.monotonic(), data, self._capturer.capture_seq)
+                self._first_frame.set()
+                FRAMES_CAPTURED.inc(camera=self._camera_id)
+
+                async with self._new_frame:
+                    self._new_frame.notify_all()
+        finally:
+            logging.info('Frame producer exited.')
+
+    async def subscribe(self) -> AsyncGenerator[Frame, None]:
+        """
+        Yields the newest frames, frames produced while subscriber is busy are skipped.
+        """
+
+        last_seq = 0
+        self._subscribers += 1
+        self._has_subscribers.set()
+
+        try:
+            while True:
+                async with self._new_frame:
+                    await self._new_frame.wait_for(lambda: self._frame is not None and self._frame.seq > last_seq)
+                    frame = self._frame
+
+                last_seq = frame.seq
+                yield frame
+        finally:
+            self._subscribers -= 1
+            if not self._subscribers:
+                self._has_subscribers.clear()
@@ -0,0 +1,251 @@
+"""
+GPIO backends: wiringPi, libgpiod character device and simulated one.
+"""
+
+from abc import ABC, abstractmethod
+from collections import deque
+from dataclasses import dataclass
+from enum import IntEnum
+import logging
+import os
+import threading
+import time
+
+
+class PinMode(IntEnum):
+    OUTPUT = 0
+    SOFT_PWM = 1
+    HARD_PWM = 2
+
+
+# wiringPi pin numbers to the BCM GPIO numbers (Raspberry Pi header).
+WIRINGPI_TO_BCM = {0: 17, 1: 18, 2: 27, 3: 22, 4: 23, 5: 24, 6: 25, 7: 4}
+
+
+class GPIOBackend(ABC):
+    """
+    Abstract GPIO backend.
+
+    Pin values are levels (0, 1) for the OUTPUT pins and duty values (0 - pwm_range(mode)) for the PWM pins.
+    """
+
+    def pwm_range(self, mode: PinMode) -> int:
+        return 1
+
+    @abstractmethod
+    def setup(self, pins: dict[int, PinMode]):
+        pass
+
+    @abstractmethod
+    def write(self, values: dict[int, int]):
+        """
+        Write pin values, backend groups writes, when the hardware allows it.
+        """
+        pass
+
+    def close(self):
+        pass
+
+
+class WiringPiBackend(GPIOBackend):
+    """
+    wiringPi backend, supports software and hardware PWM.
+    """
+
+    SOFT_PWM_RANGE = 100
+    HARD_PWM_RANGE = 1024
+
+    def __init__(self):
+        import wiringpi
+
+        self._wpi = wiringpi
+        self._modes: dict[int, PinMode] = {}
+
+        self._wpi.wiringPiSetup()
+
+    def pwm_range(self, mode: PinMode) -> int:
+        return {
+            PinMode.OUTPUT: 1, PinMode.SOFT_PWM: self.SOFT_PWM_RANGE, PinMode.HARD_PWM: self.HARD_PWM_RANGE
+        }[mode]
+
+    def setup(self, pins: dict[int, PinMode]):
+        for pin, mode in pins.items():
+            match mode:
+                case PinMode.HARD_PWM:
+                    self._wpi.pinMode(pin, self._wpi.GPIO.PWM_OUTPUT)
+                case PinMode.SOFT_PWM:
+                    self._wpi.softPwmCreate(pin, 0, self.SOFT_PWM_RANGE)
+                case _:
+                    self._wpi.pinMode(pin, self._wpi.GPIO.OUTPUT)
+
+            self._modes[pin] = mode
+
+    def write(self, values: dict[int, int]):
+        for pin, value in values.items():
+            match self._modes.get(pin, PinMode.OUTPUT):
+                case PinMode.HARD_PWM:
+                    self._wpi.pwmWrite(pin, value)
+                case PinMode.SOFT_PWM:
+                    self._wpi.softPwmWrite(pin, value)
+                case _:
+                    self._wpi.digitalWrite(pin, value)
+
+
+class GpiodBackend(GPIOBackend):
+    """
+    libgpiod (v2 bindings) character device backend, all lines are set with one request.
+
+    PWM isn't supported: PWM pins work as plain outputs.
+    """
+
+    def __init__(self, chip: str = '/dev/gpiochip0', pin_map: dict[int, int] | None = WIRINGPI_TO_BCM,
+                 consumer: str = 'simple_robo'):
+        """
+        :param pin_map: pin numbers to the chip line offsets, None for the direct mapping.
+        """
+        import gpiod
+
+        if not os.path.exists(chip):
+            raise OSError(f'GPIO chip {chip} was not found')
+
+        self._gpiod = gpiod
+        self._chip = chip
+        self._pin_map = pin_map
+        self._consumer = consumer
+        self._request = None
+
+    def _offset(self, pin: int) -> int:
+        return pin if self._pin_map is None else self._pin_map[pin]
+
+    def setup(self, pins: dict[int, PinMode]):
+        gpiod = self._gpiod
+        if any(PinMode.OUTPUT != mode for mode in pins.values()):
+            logging.warning('gpiod backend: PWM is not supported, pins will be used as outputs.')
+
+        self._request = gpiod.request_lines(
+            self._chip, consumer=self._consumer,
+            config={tuple(self._offset(pin) for pin in pins): gpiod.LineSettings(
+                direction=gpiod.line.Direction.OUTPUT, output_value=gpiod.line.Value.INACTIVE)})
+
+    def write(self, values: dict[int, int]):
+        line_value = self._gpiod.line.Value
+        self._request.set_values({
+            self._offset(pin): line_value.ACTIVE if value else line_value.INACTIVE for pin, value in values.items()
+        })
+
+    def close(self):
+        if self._request is not None:
+            self._request.release()
+            self._request = None
+
+
+@dataclass(frozen=True)
+class PinTransition:
+    timestamp: float
+    pin: int
+    value: int
+
+
+class SimulatedBackend(GPIOBackend):
+    """
+    Simulated backend: records timestamped pin transitions (time.perf_counter()), for tests and benchmarks.
+    """
+
+    PWM_RANGE = 100
+
+    def __init__(self, history_size: int = 100000):
+        self._lock = threading.Lock()
+        self._transitions: deque[PinTransition] = deque(maxlen=history_size)
+        self._pins: dict[int, int] = {}
+        self._modes: dict[int, PinMode] = {}
+        self.write_calls = 0
+
+    def pwm_range(self, mode: PinMode) -> int:
+        return 1 if PinMode.OUTPUT == mode else self.PWM_RANGE
+
+    def setup(self, pins: dict[int, PinMode]):
+        with self._lock:
+            self._modes.update(pins)
+            self._pins.update({pin: 0 for pin in pins})
+
+    def write(self, values: dict[int, int]):
+        timestamp = time.perf_counter()
+
+        with self._lock:
+            self.write_calls += 1
+            for pin, value in values.items():
+                if self._pins.get(pin) != value:
+                    self._transitions.append(PinTransition(timestamp, pin, value))
+                self._pins[pin] = value
+
+    @property
+    def pins(self) -> dict[int, int]:
+        with self._lock:
+            return dict(self._pins)
+
+    def transitions(self, clear: bool = False) -> list[PinTransition]:
+        with self._lock:
+            result = list(self._transitions)
+            if clear:
+                self._transitions.clear()
+            return result
+
+
+class ShadowGPIO:
+    """
+    Keeps shadow copy of the pin values: redundant writes are skipped, the rest is written with one backend call.
+    """
+
+    def __init__(self, backend: GPIOBackend):
+        self._backend = backend
+        self._shadow: dict[int, int] = {}
+        self._modes: dict[int, PinMode] = {}
+        self._lock = threading.Lock()
+        self.skipped = 0
+
+    @property
+    def backend(self) -> GPIOBackend:
+        return self._backend
+
+    def pwm_range(self, pin: int) -> int:
+        return self._backend.pwm_range(self._modes.get(pin, PinMode.OUTPUT))
+
+    def setup(self, pins: dict[int, PinMode]):
+        with self._lock:
+            self._backend.setup(pins)
+            self._modes.update(pins)
+            self._backend.write({pin: 0 for pin in pins})
+            self._shadow.update({pin: 0 for pin in pins})
+
+    def write(self, values: dict[int, int]):
+        with self._lock:
+            changes = {pin: value for pin, value in values.items() if self._shadow.get(pin) != value}
+            self.skipped += len(values) - len(changes)
+
+            if changes:
+                self._backend.write(changes)
+                self._shadow.update(changes)
+
+    def close(self):
+        self._backend.close()
+
+
+def make_gpio_backend(name: str = 'auto') -> GPIOBackend:
+    """
+    :param name: 'wiringpi', 'gpiod', 'simulated' or 'auto' (the first available).
+    """
+    backends = {'wiringpi': WiringPiBackend, 'gpiod': GpiodBackend, 'simulated': SimulatedBackend}
+
+    if name != 'auto':
+        return backends[name]()
+
+    for backend_name in ['wiringpi', 'gpiod']:
+        try:
+            return backends[backend_name]()
+        except (ModuleNotFoundError, OSError) as e:
+            logging.info('GPIO backend %s is not available: %s', backend_name, e)
+
+    logging.warning('GPIO hardware backends are not available, using simulated one. Probably it\'s a testing '
+                    'environment?')
+
+    return SimulatedBackend()
@@ -0,0 +1,375 @@
+"""
+H.264 streaming: one persistent encoder per camera, fragmented MP4 for Media Source Extensions.
+"""
+
+import asyncio
+import logging
+import struct
+import subprocess
+from typing import AsyncGenerator
+
+import ffmpeg
+
+from .frame_hub import FrameHub
+
+
+# trun/tfhd flags and sample flags, ISO/IEC 14496-12.
+TFHD_DEFAULT_SAMPLE_FLAGS = 0x20
+TRUN_FIRST_SAMPLE_FLAGS = 0x04
+TRUN_SAMPLE_DURATION = 0x100
+TRUN_SAMPLE_SIZE = 0x200
+TRUN_SAMPLE_FLAGS = 0x400
+SAMPLE_IS_NON_SYNC = 0x10000
+
+
+def iter_boxes(data: bytes | memoryview, offset: int = 0, end: int | None = None):
+    """
+    Iterate over the MP4 boxes: (type, payload offset, box end).
+    """
+    end = len(data) if end is None else end
+
+    while offset + 8 <= end:
+        size, box_type = struct.unpack_from('>I4s', data, offset)
+        header = 8
+        if 1 == size:
+            size, = struct.unpack_from('>Q', data, offset + 8)
+            header = 16
+        elif 0 == size:
+            size = end - offset
+
+        if size < header:
+            break
+
+        yield box_type, offset + header, offset + size
+        offset += size
+
+
+def find_box(data: bytes, path: list[bytes], offset: int = 0, end: int | None = None) -> tuple[int, int] | None:
+    """
+    Find nested box, i.e. [b'moof', b'traf', b'trun'], returns payload offset and box end.
+    """
+    for box_type, payload, box_end in iter_boxes(data, offset, end):
+        if box_type == path[0]:
+            if 1 == len(path):
+                return payload, box_end
+            return find_box(data, path[1:], payload + (8 if b'stsd' == box_type else 0), box_end)
+
+    return None
+
+
+def is_keyframe_fragment(moof: bytes) -> bool:
+    """
+    Check, that the first sample of the movie fragment is a sync sample.
+    """
+    default_flags = None
+
+    if (tfhd := find_box(moof, [b'moof', b'traf', b'tfhd'])) is not None:
+        flags = int.from_bytes(moof[tfhd[0] + 1:tfhd[0] + 4], 'big')
+        if flags & TFHD_DEFAULT_SAMPLE_FLAGS:
+            # version/flags, track_ID, then optional fields in fixed order.
+            field = tfhd[0] + 8
+            field += 8 if flags & 0x01 else 0
+            field += 4 if flags & 0x02 else 0
+            field += 4 if flags & 0x08 else 0
+            field += 4 if flags & 0x10 else 0
+            default_flags, = struct.unpack_from('>I', moof, field)
+
+    if (trun := find_box(moof, [b'moof', b'traf', b'trun'])) is None:
+        return False
+
+    flags = int.from_bytes(moof[trun[0] + 1:trun[0] + 4], 'big')
+    # version/flags, sample_count, optional data_offset.
+    field = trun[0] + 8 + (4 if flags & 0x01 else 0)
+
+    if flags & TRUN_FIRST_SAMPLE_FLAGS:
+        sample_flags, = struct.unpack_from('>I', moof, field)
+    elif flags & TRUN_SAMPLE_FLAGS:
+        field += (4 if flags & TRUN_SAMPLE_DURATION else 0) + (4 if flags & TRUN_SAMPLE_SIZE else 0)
+        sample_flags, = struct.unpack_from('>I', moof, field)
+    elif default_flags is not None:
+        sample_flags = default_flags
+    else:
+        return False
+
+    return not sample_flags & SAMPLE_IS_NON_SYNC
+
+
+def mime_codec(init_segment: bytes) -> str:
+    """
+    MSE codec string from the avcC box of the init segment.
+    """
+    avc_c = find_box(init_segment, [b'moov', b'trak', b'mdia', b'minf', b'stbl', b'stsd', b'avc1'])
+    if avc_c is not None:
+        # Visual sample entry has 78 bytes before the child boxes.
+        avc_c = find_box(init_segment, [b'avcC'], avc_c[0] + 78, avc_c[1])
+
+    if avc_c is None:
+        return 'video/mp4; codecs="avc1.42E01E"'
+
+    profile, compatibility, level = init_segment[avc_c[0] + 1:avc_c[0] + 4]
+
+    return f'video/mp4; codecs="avc1.{profile:02X}{compatibility:02X}{level:02X}"'
+
+
+class Mp4FragmentSplitter:
+    """
+    Splits fragmented MP4 byte stream into the init segment (ftyp + moov) and media fragments (moof + mdat).
+    """
+
+    def __init__(self):
+        self._buffer = bytearray()
+        self._pending = bytearray()
+
+    def feed(self, data: bytes) -> list[tuple[bytes, bytes]]:
+        """
+        :return: list of (segment kind, segment), kind is b'moov' for the init segment or b'moof'.
+        """
+        self._buffer += data
+        segments = []
+        offset = 0
+
+        for box_type, _, box_end in iter_boxes(self._buffer):
+            if box_end > len(self._buffer):
+                break
+
+            self._pending += self._buffer[offset:box_end]
+            offset = box_end
+
+            if box_type in (b'moov', b'mdat'):
+                segments.append((b'moov' if b'moov' == box_type else b'moof', bytes(self._pending)))
+                self._pending.clear()
+
+        del self._buffer[:offset]
+
+        return segments
+
+
+def find_encoder(preferred: str = 'auto') -> str:
+    """
+    Use V4L2 M2M hardware encoder when it works, ffmpeg lists it even without the hardware.
+    """
+    if preferred != 'auto':
+        return preferred
+
+    probe = (
+        ffmpeg
+        .input('color=size=128x128', format='lavfi')
+        .output('-', format='null', vcodec='h264_v4l2m2m', pix_fmt='yuv420p', frames=1)
+        .global_args('-loglevel', 'error')
+        .compile()
+    )
+
+    try:
+        if 0 == subprocess.run(probe, capture_output=True, timeout=10).returncode:
+            return 'h264_v4l2m2m'
+    except (OSError, subprocess.SubprocessError) as e:
+        logging.warning('H.264 hardware encoder probe failed: %s', e)
+
+    return 'libx264'
+
+
+class H264EncoderError(RuntimeError):
+    """
+    Encoder couldn't be started or exited.
+    """
+
+
+class H264Streamer:
+    """
+    Persistent H.264 encoder, fed by the frame hub, one encoder for all viewers.
+
+    New viewers get the init segment and the current GOP, so they start from the keyframe instantly.
+    """
+
+    def __init__(self, frame_hub: FrameHub, encoder: str = 'auto', gop: int = 30, bitrate: str = '1M',
+                 max_queue: int = 60, init_timeout: float = 10.0):
+        """
+        :param init_timeout: viewers get H264EncoderError, when there is no init segment after this time (seconds).
+        """
+        self._frame_hub = frame_hub
+        self._encoder = encoder
+        # Probed once: the probe takes up to 10 s.
+        self._found_encoder: str | None = None
+        self._init_timeout = init_timeout
+        self._gop = gop
+        self._bitrate = bitrate
+        self._max_queue = max_queue
+
+        self._process: asyncio.subprocess.Process | None = None
+        self._tasks: list[asyncio.Task] = []
+        self._lock = asyncio.Lock()
+        self._init_ready = asyncio.Event()
+        # Encoder exited: waiting viewers are woken up and get H264EncoderError.
+        self._failed = False
+        self._init_segment = b''
+        self._gop_fragments: list[bytes] = []
+        self._subscribers: set[asyncio.Queue] = set()
+        self._resync: set[asyncio.Queue] = set()
+        self._viewers = 0
+
+    @property
+    def mime_codec(self) -> str:
+        return mime_codec(self._init_segment)
+
+    def _ffmpeg_args(self, encoder: str) -> list[str]:
+        output_args = {
+            'format': 'mp4', 'vcodec': encoder, 'pix_fmt': 'yuv420p', 'g': self._gop, 'bf': 0,
+            'b:v': self._bitrate, 'movflags': 'empty_moov+default_base_moof+frag_keyframe',
+            # Fragment every frame, not only keyframes.
+            'frag_duration': 1,
+        }
+        if 'libx264' == encoder:
+            output_args.update(preset='ultrafast', tune='zerolatency')
+
+        return (
+            ffmpeg
+            .input('pipe:', format='mjpeg', use_wallclock_as_timestamps=1)
+            .output('pipe:', **output_args)
+            .global_args('-loglevel', 'error')
+            .compile()
+        )
+
+    async def _start(self):
+        if self._found_encoder is None:
+            self._found_encoder = await asyncio.to_thread(find_encoder, self._encoder)
+        encoder = self._found_encoder
+        logging.info('Starting H.264 encoder: %s', encoder)
+
+        args = self._ffmpeg_args(encoder)
+        try:
+            self._process = await asyncio.create_subprocess_exec(*args, stdin=asyncio.subprocess.PIPE,
+                                                                 stdout=asyncio.subprocess.PIPE)
+        except OSError as e:
+            raise H264EncoderError(f'H.264 encoder can\'t be started: {e}') from e
+
+        self._tasks = [asyncio.create_task(self._feed(self._process), name='h264_feed'),
+                       asyncio.create_task(self._read(self._process), name='h264_read')]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+        if self._process is not None:
+            process, self._process = self._process, None
+            if process.returncode is None:
+                process.terminate()
+                try:
+                    await asyncio.wait_for(process.wait(), 3)
+                except asyncio.TimeoutError:
+                    process.kill()
+                    await process.wait()
+
+        self._init_ready.clear()
+        self._failed = False
+        self._init_segment = b''
+        self._gop_fragments = []
+        logging.info('H.264 encoder stopped.')
+
+    async def _feed(self, process: asyncio.subprocess.Process):
+        try:
+            async for frame in self._frame_hub.subscribe():
+                process.stdin.write(frame.data)
+                # Encoder is slow: the hub skips frames meanwhile.
+                await process.stdin.drain()
+        except (BrokenPipeError, ConnectionResetError) as e:
+            logging.error('H.264 encoder input closed: %s', e)
+        finally:
+            process.stdin.close()
+
+    async def _read(self, process: asyncio.subprocess.Process):
+        splitter = Mp4FragmentSplitter()
+
+        while data := await process.stdout.read(64 * 1024):
+            for kind, segment in splitter.feed(data):
+                if b'moov' == kind:
+                    self._init_segment = segment
+                    self._init_ready.set()
+                else:
+                    self._publish(segment)
+
+        returncode = await process.wait()
+        logging.error('H.264 encoder output closed, exit code: %s', returncode)
+
+        if not self._init_segment and 'auto' == self._encoder and 'libx264' != self._found_encoder:
+            # Hardware encoder passed the probe, but can't encode the stream.
+            logging.warning('H.264 encoder %s failed, falling back to libx264.', self._found_encoder)
+            self._found_encoder = 'libx264'
+
+        # Wake up all viewers, the last one stops the streamer, so the next viewer restarts the encoder.
+        self._failed = True
+        self._init_ready.set()
+        for queue in self._subscribers:
+            while not queue.empty():
+                queue.get_nowait()
+            queue.put_nowait(None)
+
+    def _publish(self, fragment: bytes):
+        keyframe = is_keyframe_fragment(fragment)
+
+        if keyframe:
+            self._gop_fragments = [fragment]
+        elif self._gop_fragments:
+            self._gop_fragments.append(fragment)
+        else:
+            # Nobody can decode it without the keyframe.
+            return
+
+        for queue in self._subscribers:
+            if queue in self._resync:
+                if not keyframe:
+                    continue
+                self._resync.discard(queue)
+
+            if queue.full():
+                # Slow viewer: drop the backlog and wait for the next keyframe.
+                while not queue.empty():
+                    queue.get_nowait()
+                self._resync.add(queue)
+            else:
+                queue.put_nowait(fragment)
+
+    async def subscribe(self) -> AsyncGenerator[bytes, None]:
+        """
+        Yields init segment first, then media fragments starting from the keyframe.
+
+        :raise H264EncoderError: encoder couldn't be started, exited or didn't produce the init segment in time.
+        """
+        queue: asyncio.Queue[bytes | None] = asyncio.Queue(self._max_queue)
+
+        async with self._lock:
+            if self._process is None:
+                await self._start()
+            self._viewers += 1
+
+        try:
+            try:
+                await asyncio.wait_for(self._init_ready.wait(), self._init_timeout)
+            except asyncio.TimeoutError:
+                raise H264EncoderError(f'No H.264 init segment in {self._init_timeout} s') from None
+            if self._failed:
+                raise H264EncoderError('H.264 encoder exited')
+
+            yield self._init_segment
+
+            # No awaits between GOP copying and subscription, so no fragment is lost or duplicated.
+            if len(self._gop_fragments) < self._max_queue:
+                for fragment in self._gop_fragments:
+                    queue.put_nowait(fragment)
+            else:
+                self._resync.add(queue)
+            self._subscribers.add(queue)
+
+            while (fragment := await queue.get()) is not None:
+                yield fragment
+
+            raise H264EncoderError('H.264 encoder exited')
+        finally:
+            self._subscribers.discard(queue)
+            self._resync.discard(queue)
+
+            async with self._lock:
+                self._viewers -= 1
+                if not self._viewers:
+                    await self.stop()
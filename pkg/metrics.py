@@ -0,0 +1,212 @@
+"""
+Lightweight metrics in the Prometheus text format.
+
+Metrics are cheap enough to stay enabled: an observation is one bisect and a few additions under the lock.
+"""
+
+from abc import ABC, abstractmethod
+from bisect import bisect_left
+import math
+import threading
+from typing import Callable, Iterable
+
+
+# Seconds: from 0.1 ms to 2.5 s.
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return '+Inf' if value > 0 else '-Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labels: Iterable[tuple[str, str]]) -> str:
+    labels = [f'{name}="{_escape(str(value))}"' for name, value in labels]
+    return '{' + ','.join(labels) + '}' if labels else ''
+
+
+class Metric(ABC):
+    type_name = 'untyped'
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._lock = threading.Lock()
+
+    def _key(self, labels: dict[str, str]) -> tuple[str, ...]:
+        if len(labels) != len(self.labelnames):
+            raise ValueError(f'{self.name}: labels {self.labelnames} are expected, got {tuple(labels)}')
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    @abstractmethod
+    def samples(self) -> list[tuple[str, tuple[tuple[str, str], ...], float]]:
+        pass
+
+    def render(self) -> str:
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.type_name}']
+        lines.extend(f'{name}{_format_labels(labels)} {_format_value(value)}' for name, labels, value in self.samples())
+        return '\n'.join(lines)
+
+
+class Counter(Metric):
+    type_name = 'counter'
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: dict[tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            values = list(self._values.items())
+        return [(f'{self.name}_total', tuple(zip(self.labelnames, key)), value) for key, value in values]
+
+
+class Gauge(Metric):
+    type_name = 'gauge'
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = (),
+                 function: Callable[[], float] | None = None):
+        """
+        :param function: value is computed on scraping (only without labels).
+        """
+        super().__init__(name, documentation, labelnames)
+        self._values: dict[tuple[str, ...], float] = {}
+        self._function = function
+
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def remove(self, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values.pop(key, None)
+
+    def samples(self):
+        if self._function is not None:
+            return [(self.name, (), self._function())]
+
+        with self._lock:
+            values = list(self._values.items())
+        return [(self.name, tuple(zip(self.labelnames, key)), value) for key, value in values]
+
+
+class Histogram(Metric):
+    type_name = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = (),
+                 buckets: tuple[float, ...] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self._buckets = tuple(sorted(buckets))
+        # Label values: per-bucket (not cumulative) counts, the last one is +Inf, sum.
+        self._values: dict[tuple[str, ...], tuple[list[int], list[float]]] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        index = bisect_left(self._buckets, value)
+
+        with self._lock:
+            if (data := self._values.get(key)) is None:
+                data = self._values[key] = ([0] * (len(self._buckets) + 1), [0.0])
+            data[0][index] += 1
+            data[1][0] += value
+
+    def samples(self):
+        samples = []
+
+        with self._lock:
+            values = [(key, list(counts), total[0]) for key, (counts, total) in self._values.items()]
+
+        for key, counts, total in values:
+            labels = tuple(zip(self.labelnames, key))
+            cumulative = 0
+            for bound, count in zip([*self._buckets, math.inf], counts):
+                cumulative += count
+                samples.append((f'{self.name}_bucket', (*labels, ('le', _format_value(float(bound)))), cumulative))
+            samples.append((f'{self.name}_sum', labels, total))
+            samples.append((f'{self.name}_count', labels, cumulative))
+
+        return samples
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: dict[str, Metric] = {}
+
+    def register(self, metric: Metric) -> Metric:
+        if metric.name in self._metrics:
+            raise ValueError(f'Metric {metric.name} is already registered')
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, *args, **kwargs) -> Counter:
+        return self.register(Counter(*args, **kwargs))
+
+    def gauge(self, *args, **kwargs) -> Gauge:
+        return self.register(Gauge(*args, **kwargs))
+
+    def histogram(self, *args, **kwargs) -> Histogram:
+        return self.register(Histogram(*args, **kwargs))
+
+    def render(self) -> str:
+        return '\n'.join(metric.render() for metric in self._metrics.values()) + '\n'
+
+
+REGISTRY = Registry()
+
+# Per-camera series have the 'camera' label: the camera id.
+# Frame pipeline stages: wait (for the sensor), dequeue, encode, queue_wait (from capture to the client), send.
+FRAME_STAGE_SECONDS = REGISTRY.histogram('robo_frame_stage_seconds', 'Frame pipeline stage latency.',
+                                         ('camera', 'stage'))
+FRAMES_CAPTURED = REGISTRY.counter('robo_frames_captured', 'Frames captured by the frame hub.', ('camera',))
+FRAMES_DELIVERED = REGISTRY.counter('robo_frames_delivered', 'Frames sent to the clients.', ('camera', 'stream'))
+FRAMES_DROPPED = REGISTRY.counter('robo_frames_dropped', 'Frames skipped by the slow clients.', ('camera', 'stream'))
+CLIENT_FPS = REGISTRY.gauge('robo_client_fps', 'Delivered frame rate per client.', ('camera', 'stream', 'client'))
+EVENTS_DROPPED = REGISTRY.counter('robo_events_dropped', 'Events dropped by the slow event subscribers.')
+CONTROL_COMMAND_SECONDS = REGISTRY.histogram('robo_control_command_seconds', 'Control command handling latency.',
+                                             ('command',))
+PTZ_APPLY_SECONDS = REGISTRY.histogram('robo_ptz_apply_seconds', 'PTZ latency from submission to the camera.',
+                                       ('camera',))
+
+
+class FpsMeter:
+    """
+    Per-client delivered frame rate, reported to the CLIENT_FPS gauge once per interval.
+    """
+
+    _next_client = 0
+
+    def __init__(self, camera_id: str, stream: str, interval: float = 1.0):
+        FpsMeter._next_client += 1
+        self._labels = {'camera': camera_id, 'stream': stream, 'client': str(FpsMeter._next_client)}
+        self._interval = interval
+        self._started: float | None = None
+        self._frames = 0
+
+    @property
+    def client(self) -> str:
+        return self._labels['client']
+
+    def tick(self, now: float):
+        if self._started is None:
+            self._started = now
+        self._frames += 1
+
+        if (elapsed := now - self._started) >= self._interval:
+            CLIENT_FPS.set(self._frames / elapsed, **self._labels)
+            self._started, self._frames = now, 0
+
+    def close(self):
+        CLIENT_FPS.remove(**self._labels)
@@ -0,0 +1,164 @@
+"""
+Fixed-rate motor control loop: joystick mixing, speed ramps and deadman watchdog.
+"""
+
+from collections import deque
+from dataclasses import dataclass
+import logging
+import threading
+import time
+
+from .robot_motion_controller import RobotMotionController
+
+
+def mix_joystick(x: float, y: float) -> tuple[float, float]:
+    """
+    Arcade drive mixing: joystick x/y (-1.0 - 1.0) to the left and right track speeds.
+    """
+    left, right = y + x, y - x
+    # Keep turning ratio, when speed is saturated.
+    scale = max(1.0, abs(left), abs(right))
+
+    return left / scale, right / scale
+
+
+def ramp(current: float, target: float, max_step: float) -> float:
+    return current + max(-max_step, min(max_step, target - current))
+
+
+@dataclass(frozen=True)
+class TimingStats:
+    count: int
+    mean: float
+    p50: float
+    p99: float
+    max: float
+
+
+def timing_stats(samples) -> TimingStats | None:
+    if not samples:
+        return None
+
+    ordered = sorted(samples)
+    return TimingStats(len(ordered), sum(ordered) / len(ordered), ordered[len(ordered) // 2],
+                       ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))], ordered[-1])
+
+
+class MotorControlLoop:
+    """
+    Motor control thread, works with the fixed tick rate.
+
+    Commands only set the target, the loop mixes it into track speeds, limits acceleration and stops both tracks,
+    when commands stop arriving (deadman).
+    """
+
+    def __init__(self, robot_controller: RobotMotionController, tick_rate: float = 100,
+                 acceleration: float = 4.0, deceleration: float = 8.0, deadman_timeout: float = 0.5,
+                 stats_size: int = 1000):
+        """
+        :param acceleration: maximal speed increase per second (full speed is 1.0).
+        :param deceleration: maximal speed decrease per second.
+        :param deadman_timeout: stop the tracks, when there were no commands during this time (seconds).
+        """
+        self._robot_controller = robot_controller
+        self._period = 1 / tick_rate
+        self._acceleration = acceleration
+        self._deceleration = deceleration
+        self._deadman_timeout = deadman_timeout
+
+        # Command is replaced as a whole, so no locking is needed.
+        self._command: tuple[float, float, float] = (0.0, 0.0, 0.0)
+        self._speeds = (0.0, 0.0)
+        self._pending_command_time: float | None = None
+        self._deadman_triggered = False
+
+        self._jitter = deque(maxlen=stats_size)
+        self._latency = deque(maxlen=stats_size)
+
+        self._running = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    @property
+    def speeds(self) -> tuple[float, float]:
+        return self._speeds
+
+    def set_command(self, x: float, y: float):
+        """
+        :param x: turn, -1.0 (left) - 1.0 (right).
+        :param y: speed, -1.0 (back) - 1.0 (forward).
+        """
+        self._command = (max(-1.0, min(1.0, x)), max(-1.0, min(1.0, y)), time.perf_counter())
+
+    def stats(self) -> dict[str, TimingStats | None]:
+        """
+        Tick jitter and command-to-pin latency in seconds.
+        """
+        return {
+            'tick_jitter': timing_stats(list(self._jitter)),
+            'command_latency': timing_stats(list(self._latency)),
+        }
+
+    def start(self):
+        if self._thread is not None:
+            return
+
+        self._running.set()
+        self._thread = threading.Thread(target=self._run, name='motor_control', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if self._thread is None:
+            return
+
+        self._running.clear()
+        self._thread.join()
+        self._thread = None
+        self._robot_controller.stop()
+
+    def _tick(self, now: float):
+        x, y, command_time = self._command
+        new_command = False
+
+        if now - command_time > self._deadman_timeout:
+            if not self._deadman_triggered and self._speeds != (0.0, 0.0):
+                logging.warning('Motor deadman: no commands during %.2f s, stopping.', self._deadman_timeout)
+            self._deadman_triggered = True
+            x = y = 0.0
+        else:
+            self._deadman_triggered = False
+            if command_time != self._pending_command_time:
+                self._pending_command_time = command_time
+                new_command = True
+
+        targets = mix_joystick(x, y)
+        speeds = tuple(
+            ramp(current, target, (self._acceleration if abs(target) > abs(current) else self._deceleration)
+                 * self._period)
+            for current, target in zip(self._speeds, targets)
+        )
+
+        if speeds != self._speeds:
+            self._robot_controller.set_tracks(*speeds)
+            self._speeds = speeds
+
+        if new_command:
+            self._latency.append(time.perf_counter() - command_time)
+
+    def _run(self):
+        logging.info('Motor control loop started.')
+        next_tick = time.perf_counter()
+
+        while self._running.is_set():
+            now = time.perf_counter()
+            self._jitter.append(now - next_tick)
+
+            self._tick(now)
+
+            next_tick += self._period
+            if (delay := next_tick - time.perf_counter()) > 0:
+                time.sleep(delay)
+            else:
+                # Overrun: don't try to catch up with the missed ticks.
+                next_tick = time.perf_counter()
+
+        logging.info('Motor control loop stopped.')
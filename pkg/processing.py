@@ -0,0 +1,234 @@
+"""
+On-robot frame processing: registered stages get raw frames between the capturer and the encoders.
+
+Stages get read-only NumPy views of the raw frames without copying and run on their own worker threads. A stage,
+which is busy, gets only the newest frame, when it is free again: slow stages skip frames and never slow down
+the live stream. Results are passed to the callback (published as ProcessingResult events).
+"""
+
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+import logging
+import threading
+import time
+from typing import Any, Callable
+
+import numpy as np
+
+from .metrics import REGISTRY
+
+
+STAGE_SECONDS = REGISTRY.histogram('robo_stage_seconds', 'Processing stage duration.', ('camera', 'stage'))
+STAGE_SKIPPED = REGISTRY.counter('robo_stage_skipped', 'Frames skipped by the busy processing stage.',
+                                 ('camera', 'stage'))
+STAGE_OVER_BUDGET = REGISTRY.counter('robo_stage_over_budget', 'Frames processed longer than the stage budget.',
+                                     ('camera', 'stage'))
+
+
+@dataclass(frozen=True)
+class RawFrame:
+    # Capture seq, see Frame.capture_seq.
+    seq: int
+    # time.monotonic() of the capture.
+    timestamp: float
+    # Read-only view of the capturer buffer: (height, width, 3) for 'BGR' and 'RGB', (height, width * 2) for 'YUYV'.
+    image: np.ndarray
+    pixelformat: str
+
+
+@dataclass(frozen=True)
+class StageResult:
+    stage: str
+    seq: int
+    timestamp: float
+    duration: float
+    # Processing took longer than the stage budget.
+    late: bool
+    data: dict[str, Any]
+
+
+class ProcessingStage(ABC):
+    """
+    Abstract interface for the processing stages, i.e. detectors or HUD data sources.
+    """
+
+    # Unique stage name, used for the results and the metrics.
+    name: str = 'stage'
+    # Expected processing time of one frame (seconds), slower results are marked late.
+    budget: float = 0.05
+    # Minimal time between the processed frames (seconds), 0 - as often as the stage is free.
+    interval: float = 0.0
+
+    def start(self):
+        pass
+
+    def stop(self):
+        pass
+
+    @abstractmethod
+    def process(self, frame: RawFrame) -> dict[str, Any] | None:
+        """
+        Called from the stage worker thread, frame.image must not be modified.
+
+        :return: result data, None - nothing to publish.
+        """
+        pass
+
+
+class FrameStatsStage(ProcessingStage):
+    """
+    Luminance statistics: mean and fractions of the under- and overexposed pixels.
+    """
+
+    name = 'frame_stats'
+    budget = 0.01
+    interval = 0.5
+
+    def __init__(self, step: int = 4):
+        """
+        :param step: every step-th row and column is used.
+        """
+        self._step = step
+
+    def process(self, frame: RawFrame) -> dict[str, Any] | None:
+        match frame.pixelformat:
+            case 'YUYV':
+                luminance = frame.image[::self._step, 0::2 * self._step]
+            case 'BGR' | 'RGB':
+                # Green is the closest to the luminance.
+                luminance = frame.image[::self._step, ::self._step, 1]
+            case _:
+                return None
+
+        return {
+            'mean': round(float(luminance.mean()), 1),
+            'dark': round(float(np.count_nonzero(luminance < 16) / luminance.size), 4),
+            'bright': round(float(np.count_nonzero(luminance > 239) / luminance.size), 4),
+        }
+
+
+# Stages, which can be enabled by name.
+STAGES: dict[str, Callable[[], ProcessingStage]] = {
+    FrameStatsStage.name: FrameStatsStage,
+}
+
+
+class StageWorker:
+    """
+    Stage thread with the one-frame mailbox: the pending frame is replaced by the newer one.
+    """
+
+    def __init__(self, stage: ProcessingStage, on_result: Callable[[StageResult], None] | None = None,
+                 camera_id: str = ''):
+        """
+        :param camera_id: metrics label.
+        """
+        self._stage = stage
+        self._on_result = on_result
+        self._labels = {'camera': camera_id, 'stage': stage.name}
+        self._pending: RawFrame | None = None
+        self._condition = threading.Condition()
+        self._running = False
+        self._thread: threading.Thread | None = None
+
+    @property
+    def stage(self) -> ProcessingStage:
+        return self._stage
+
+    def start(self):
+        if self._thread is not None:
+            return
+
+        self._stage.start()
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name=f'stage_{self._stage.name}', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if self._thread is None:
+            return
+
+        with self._condition:
+            self._running = False
+            self._condition.notify()
+        self._thread.join()
+        self._thread = None
+        self._pending = None
+        self._stage.stop()
+
+    def submit(self, frame: RawFrame):
+        with self._condition:
+            if self._pending is not None:
+                STAGE_SKIPPED.inc(**self._labels)
+            self._pending = frame
+            self._condition.notify()
+
+    def _run(self):
+        stage = self._stage
+
+        while True:
+            with self._condition:
+                self._condition.wait_for(lambda: not self._running or self._pending is not None)
+                if not self._running:
+                    return
+                frame, self._pending = self._pending, None
+
+            started = time.monotonic()
+            try:
+                data = stage.process(frame)
+            except Exception as e:
+                logging.error('Processing stage %s failed: %s', stage.name, e)
+                continue
+
+            duration = time.monotonic() - started
+            STAGE_SECONDS.observe(duration, **self._labels)
+            if late := duration > stage.budget:
+                STAGE_OVER_BUDGET.inc(**self._labels)
+
+            if data is not None and self._on_result is not None:
+                self._on_result(StageResult(stage.name, frame.seq, frame.timestamp, duration, late, data))
+
+            if (delay := started + stage.interval - time.monotonic()) > 0:
+                with self._condition:
+                    self._condition.wait_for(lambda: not self._running, delay)
+
+
+class FrameProcessor:
+    """
+    Distributes raw frames of one camera to the stage workers, submit() never blocks the capture.
+    """
+
+    def __init__(self, stages: list[ProcessingStage] | None = None,
+                 on_result: Callable[[StageResult], None] | None = None, camera_id: str = ''):
+        """
+        :param camera_id: metrics label.
+        """
+        self._workers = [StageWorker(stage, on_result, camera_id) for stage in stages or []]
+
+    @property
+    def stages(self) -> list[ProcessingStage]:
+        return [worker.stage for worker in self._workers]
+
+    def start(self):
+        for worker in self._workers:
+            worker.start()
+
+    def stop(self):
+        for worker in self._workers:
+            worker.stop()
+
+    def submit(self, image: np.ndarray, pixelformat: str, seq: int, timestamp: float | None = None):
+        """
+        Called from the capture thread, the image must not be modified after that.
+
+        :param seq: capture seq, the encoded frame has the same Frame.capture_seq.
+        """
+        if not self._workers:
+            return
+
+        view = image.view()
+        view.flags.writeable = False
+        frame = RawFrame(seq, time.monotonic() if timestamp is None else timestamp, view, pixelformat)
+
+        for worker in self._workers:
+            worker.submit(frame)
@@ -0,0 +1,121 @@
+from dataclasses import dataclass
+import logging
+import threading
+import time
+from typing import Callable
+
+from .camera_motion_controller import CameraMotionController
+
+
+@dataclass(frozen=True)
+class PTZTarget:
+    """
+    PTZ target, submitted by the client.
+    """
+
+    seq: int
+    # Relative steps, including the steps of the replaced targets.
+    pan: int
+    tilt: int
+    # Absolute.
+    zoom: int
+    submitted: float
+
+
+class PTZScheduler:
+    """
+    Latest-wins PTZ actuation scheduler.
+
+    PTZ ioctls are slow, so they run in the dedicated worker thread. Only the newest target is kept and targets are
+    applied not faster than max_rate. Pan and tilt are relative steps: steps of the replaced target are added to the
+    new one, so fast input moves the camera as far as requested. Zoom is absolute, the latest one wins.
+    """
+
+    def __init__(self, controller: CameraMotionController, max_rate: float = 10,
+                 on_applied: Callable[[PTZTarget, float, list[str]], None] | None = None):
+        """
+        :param max_rate: maximal number of the PTZ updates per second.
+        :param on_applied: called from the worker thread with the target, time when it was applied
+                           (time.monotonic()) and errors.
+        """
+        self._controller = controller
+        self._min_interval = 1 / max_rate
+        self._on_applied = on_applied
+
+        self._condition = threading.Condition()
+        self._pending: PTZTarget | None = None
+        self._seq = 0
+        self._dropped = 0
+        self._running = False
+        self._worker: threading.Thread | None = None
+
+    @property
+    def dropped(self) -> int:
+        return self._dropped
+
+    def start(self):
+        if self._worker is not None:
+            return
+
+        self._running = True
+        self._worker = threading.Thread(target=self._run, name='ptz_scheduler', daemon=True)
+        self._worker.start()
+
+    def stop(self):
+        if self._worker is None:
+            return
+
+        with self._condition:
+            self._running = False
+            self._condition.notify()
+
+        self._worker.join()
+        self._worker = None
+
+    def submit(self, pan: int, tilt: int, zoom: int) -> int:
+        """
+        Replace pending target, its pan and tilt steps are added to the new ones.
+
+        :return: target sequence number.
+        """
+        with self._condition:
+            if self._pending is not None:
+                self._dropped += 1
+                pan += self._pending.pan
+                tilt += self._pending.tilt
+
+            self._seq += 1
+            self._pending = PTZTarget(self._seq, pan, tilt, zoom, time.monotonic())
+            self._condition.notify()
+
+            return self._seq
+
+    def _run(self):
+        logging.info('PTZ scheduler started.')
+
+        while True:
+            with self._condition:
+                self._condition.wait_for(lambda: self._pending is not None or not self._running)
+                if not self._running:
+                    break
+
+                target, self._pending = self._pending, None
+
+            started = time.monotonic()
+            try:
+                errors = self._controller.set_ptz(target.pan, target.tilt, target.zoom)
+            except Exception as e:
+                errors = [str(e)]
+            applied = time.monotonic()
+
+            if errors:
+                logging.warning('PTZ target %d: %s', target.seq, errors)
+
+            if self._on_applied is not None:
+                self._on_applied(target, applied, errors)
+
+            # Rate limit: newer targets will replace each other meanwhile.
+            if (delay := started + self._min_interval - time.monotonic()) > 0:
+                time.sleep(delay)
+
+        logging.info('PTZ scheduler stopped.')
@@ -0,0 +1,308 @@
+"""
+Stream recorder: encoded frames are stored as is into time-segmented indexed frame stores.
+
+Segment is a pair of files: <name>.mjpg with concatenated JPEG frames and <name>.idx with fixed-size entries
+(wall clock timestamp, offset, size). Both files can be read, while the segment is being written.
+"""
+
+import asyncio
+from dataclasses import dataclass
+from datetime import datetime
+import logging
+from pathlib import Path
+import queue
+import struct
+import threading
+import time
+from typing import AsyncGenerator, Iterator
+
+from .frame_generator import FRAME_HEADER, FRAME_TRAILER
+from .frame_hub import FrameHub
+from .metrics import REGISTRY
+
+
+INDEX_ENTRY = struct.Struct('<dQI')
+DATA_SUFFIX = '.mjpg'
+INDEX_SUFFIX = '.idx'
+
+FRAMES_RECORDED = REGISTRY.counter('robo_frames_recorded', 'Frames written by the recorder.', ('camera',))
+RECORDER_DROPPED = REGISTRY.counter('robo_recorder_dropped', 'Frames dropped, because the recorder was too slow.',
+                                    ('camera',))
+
+
+@dataclass
+class Segment:
+    name: str
+    # Wall clock timestamps of the first and the last frames.
+    start: float
+    end: float
+    frames: int
+    size: int
+
+    def to_dict(self) -> dict:
+        return {'name': self.name, 'start': self.start, 'end': self.end, 'frames': self.frames, 'size': self.size}
+
+
+def read_index(path: Path) -> list[tuple[float, int, int]]:
+    """
+    :return: (timestamp, offset, size) entries, incomplete trailing entry is ignored.
+    """
+    data = path.read_bytes()
+    usable = len(data) - len(data) % INDEX_ENTRY.size
+    return list(INDEX_ENTRY.iter_unpack(data[:usable]))
+
+
+class SegmentWriter:
+    def __init__(self, directory: Path, timestamp: float):
+        self.name = datetime.fromtimestamp(timestamp).strftime('%Y%m%d-%H%M%S-%f')
+        self.segment = Segment(self.name, timestamp, timestamp, 0, 0)
+        self._data = open(directory / f'{self.name}{DATA_SUFFIX}', 'wb')
+        try:
+            self._index = open(directory / f'{self.name}{INDEX_SUFFIX}', 'wb')
+        except OSError:
+            self._data.close()
+            raise
+
+    def write(self, timestamp: float, data: bytes):
+        self._data.write(data)
+        self._index.write(INDEX_ENTRY.pack(timestamp, self.segment.size, len(data)))
+        self.segment.end = timestamp
+        self.segment.frames += 1
+        self.segment.size += len(data)
+
+    def flush(self):
+        # Data first: readers trust the index.
+        self._data.flush()
+        self._index.flush()
+
+    def close(self):
+        self.flush()
+        self._data.close()
+        self._index.close()
+
+
+class Recorder:
+    """
+    Records frames from the frame hub without re-encoding.
+
+    Frames are handed to the writer thread through the bounded queue: when disk is too slow, frames are dropped,
+    the live stream is never blocked. The oldest segments are removed to stay within the disk budget.
+    """
+
+    def __init__(self, frame_hub: FrameHub, directory: str | Path, disk_budget: int = 1024 * 2 ** 20,
+                 segment_duration: float = 60.0, max_gap: float = 5.0, flush_interval: float = 1.0,
+                 queue_size: int = 64, max_retry_delay: float = 60.0):
+        """
+        :param disk_budget: maximal size of all segments (bytes).
+        :param segment_duration: new segment is started after this time (seconds).
+        :param max_gap: new segment is started, when there were no frames during this time (seconds).
+        :param max_retry_delay: after write errors, recording is retried with exponential backoff up to this delay
+            (seconds), frames are dropped meanwhile.
+        """
+        self._frame_hub = frame_hub
+        self._directory = Path(directory)
+        self._disk_budget = disk_budget
+        self._segment_duration = segment_duration
+        self._max_gap = max_gap
+        self._flush_interval = flush_interval
+        self._max_retry_delay = max_retry_delay
+
+        self._queue: queue.Queue[tuple[float, bytes] | None] = queue.Queue(maxsize=queue_size)
+        self._segments: list[Segment] = []
+        self._segments_lock = threading.Lock()
+        self._writer: SegmentWriter | None = None
+        self._reader: asyncio.Task | None = None
+        self._thread: threading.Thread | None = None
+
+    @property
+    def directory(self) -> Path:
+        return self._directory
+
+    def segments(self) -> list[Segment]:
+        with self._segments_lock:
+            return [Segment(**vars(segment)) for segment in self._segments]
+
+    def _load_segments(self):
+        segments = []
+
+        for index_path in sorted(self._directory.glob(f'*{INDEX_SUFFIX}')):
+            data_path = index_path.with_suffix(DATA_SUFFIX)
+            try:
+                entries = read_index(index_path)
+            except OSError as e:
+                logging.warning('Recording index %s can\'t be read: %s', index_path, e)
+                continue
+
+            if not entries or not data_path.exists():
+                index_path.unlink(missing_ok=True)
+                data_path.unlink(missing_ok=True)
+                continue
+
+            segments.append(Segment(index_path.stem, entries[0][0], entries[-1][0], len(entries),
+                                    data_path.stat().st_size))
+
+        self._segments = segments
+
+    def start(self):
+        if self._reader is not None:
+            return
+
+        self._directory.mkdir(parents=True, exist_ok=True)
+        self._load_segments()
+        self._enforce_budget()
+
+        self._thread = threading.Thread(target=self._write_frames, name='recorder', daemon=True)
+        self._thread.start()
+        self._reader = asyncio.create_task(self._read_frames(), name='recorder_reader')
+        logging.info('Recording to %s, %d segments available.', self._directory, len(self._segments))
+
+    async def stop(self):
+        if self._reader is None:
+            return
+
+        self._reader.cancel()
+        try:
+            await self._reader
+        except asyncio.CancelledError:
+            pass
+        self._reader = None
+
+        # Queue may be full: wait for the free slot in the thread.
+        await asyncio.to_thread(self._queue.put, None)
+        await asyncio.to_thread(self._thread.join)
+        self._thread = None
+
+    async def _read_frames(self):
+        # Wall clock timestamps: recordings are searched by the wall time.
+        clock_offset = time.time() - time.monotonic()
+
+        async for frame in self._frame_hub.subscribe():
+            try:
+                self._queue.put_nowait((frame.timestamp + clock_offset, frame.data))
+            except queue.Full:
+                RECORDER_DROPPED.inc(camera=self._frame_hub.camera_id)
+
+    def _rotate(self, timestamp: float):
+        if self._writer is not None:
+            self._writer.close()
+            logging.info('Recording segment %s closed: %d frames.', self._writer.name, self._writer.segment.frames)
+            self._writer = None
+            self._enforce_budget()
+
+        self._writer = SegmentWriter(self._directory, timestamp)
+        with self._segments_lock:
+            self._segments.append(self._writer.segment)
+
+    def _close_failed_writer(self):
+        try:
+            self._writer.close()
+        except OSError:
+            pass
+        self._writer = None
+
+    def _write_frames(self):
+        last_flush = time.monotonic()
+        failures = 0
+        retry_at = 0.0
+
+        while (item := self._queue.get()) is not None:
+            timestamp, data = item
+
+            if failures and time.monotonic() < retry_at:
+                # Disk failed recently: don't retry (and log) on every frame.
+                RECORDER_DROPPED.inc(camera=self._frame_hub.camera_id)
+                continue
+
+            segment = None if self._writer is None else self._writer.segment
+
+            try:
+                if segment is None or timestamp - segment.start >= self._segment_duration or \
+                        timestamp - segment.end >= self._max_gap:
+                    self._rotate(timestamp)
+
+                with self._segments_lock:
+                    self._writer.write(timestamp, data)
+                FRAMES_RECORDED.inc(camera=self._frame_hub.camera_id)
+
+                if (now := time.monotonic()) - last_flush >= self._flush_interval:
+                    self._writer.flush()
+                    last_flush = now
+                failures = 0
+            except OSError as e:
+                failures += 1
+                delay = min(self._max_retry_delay, 2 ** (failures - 1))
+                retry_at = time.monotonic() + delay
+                logging.error('Recording failed: %s, retrying in %d s.', e, delay)
+                RECORDER_DROPPED.inc(camera=self._frame_hub.camera_id)
+                if self._writer is not None:
+                    self._close_failed_writer()
+
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+    def _enforce_budget(self):
+        """
+        Remove the oldest closed segments, while the total size exceeds the budget.
+        """
+        with self._segments_lock:
+            total = sum(segment.size for segment in self._segments)
+            current = None if self._writer is None else self._writer.segment
+
+            while total > self._disk_budget and self._segments and self._segments[0] is not current:
+                segment = self._segments.pop(0)
+                total -= segment.size
+
+                for suffix in [DATA_SUFFIX, INDEX_SUFFIX]:
+                    (self._directory / f'{segment.name}{suffix}').unlink(missing_ok=True)
+                logging.info('Recording segment %s removed: disk budget.', segment.name)
+
+    def _read_range(self, segment: Segment, start: float, end: float) -> Iterator[tuple[float, bytes]]:
+        try:
+            entries = read_index(self._directory / f'{segment.name}{INDEX_SUFFIX}')
+            with open(self._directory / f'{segment.name}{DATA_SUFFIX}', 'rb') as data_file:
+                for timestamp, offset, size in entries:
+                    if timestamp < start:
+                        continue
+                    if timestamp > end:
+                        break
+
+                    data_file.seek(offset)
+                    if len(data := data_file.read(size)) < size:
+                        # Not flushed yet.
+                        break
+
+                    yield timestamp, data
+        except FileNotFoundError:
+            # Removed by the retention.
+            return
+
+    def frames(self, start: float, end: float) -> Iterator[tuple[float, bytes]]:
+        """
+        Recorded frames in the wall clock time range.
+        """
+        for segment in self.segments():
+            if segment.end >= start and segment.start <= end:
+                yield from self._read_range(segment, start, end)
+
+    async def replay(self, start: float, end: float, speed: float = 1.0) -> AsyncGenerator[bytes, None]:
+        """
+        Multipart JPEG stream of the recorded time range.
+
+        :param speed: playback speed, 0 - as fast as possible.
+        """
+        frames = self.frames(start, end)
+        first_timestamp = None
+        started = time.monotonic()
+
+        while (item := await asyncio.to_thread(next, frames, None)) is not None:
+            timestamp, data = item
+
+            if first_timestamp is None:
+                first_timestamp = timestamp
+            elif speed > 0 and (delay := started + (timestamp - first_timestamp) / speed - time.monotonic()) > 0:
+                await asyncio.sleep(delay)
+
+            yield FRAME_HEADER % len(data)
+            yield data
+            yield FRAME_TRAILER
@@ -0,0 +1,103 @@
+"""
+Stream renditions: scaled and/or recompressed variants of the source frames.
+"""
+
+import asyncio
+from dataclasses import dataclass, replace
+import io
+import logging
+
+from PIL import Image
+
+from .frame_hub import Frame
+
+
+DEFAULT_QUALITY = 80
+MIN_WIDTH = 160
+WIDTH_STEP = 16
+QUALITY_STEP = 5
+
+
+@dataclass(frozen=True)
+class Rendition:
+    """
+    Rendition parameters, None means "as in source".
+    """
+
+    width: int | None = None
+    quality: int | None = None
+
+    @property
+    def is_source(self) -> bool:
+        return self.width is None and self.quality is None
+
+    def normalized(self) -> 'Rendition':
+        """
+        Quantize parameters, so similar requests share the same rendition.
+        """
+        width = None if self.width is None else max(MIN_WIDTH, self.width // WIDTH_STEP * WIDTH_STEP)
+        quality = None if self.quality is None else \
+            min(95, max(QUALITY_STEP, round(self.quality / QUALITY_STEP) * QUALITY_STEP))
+
+        return Rendition(width, quality)
+
+
+SOURCE = Rendition()
+
+
+def transcode(data: bytes, rendition: Rendition) -> bytes:
+    """
+    Scale and recompress JPEG image.
+    """
+    image = Image.open(io.BytesIO(data))
+
+    if rendition.width is not None and rendition.width < image.width:
+        size = (rendition.width, max(1, round(image.height * rendition.width / image.width)))
+        # Let libjpeg downscale while decoding, then finish with a cheap resize.
+        image.draft('RGB', size)
+        if image.size != size:
+            image = image.resize(size, Image.Resampling.BILINEAR)
+
+    result = io.BytesIO()
+    image.save(result, format='jpeg', quality=rendition.quality or DEFAULT_QUALITY)
+
+    return result.getvalue()
+
+
+class RenditionCache:
+    """
+    Produces every rendition once per source frame and shares it between all clients.
+    """
+
+    def __init__(self, max_lag: int = 30):
+        """
+        :param max_lag: renditions older than this number of source frames are dropped.
+        """
+        self._max_lag = max_lag
+        self._renditions: dict[Rendition, tuple[int, asyncio.Future]] = {}
+
+    async def _transcode(self, frame: Frame, rendition: Rendition) -> Frame:
+        try:
+            data = await asyncio.to_thread(transcode, frame.data, rendition)
+        except OSError as e:
+            # Some cameras send imperfect frames, send them as is.
+            logging.warning('Frame %d transcoding failed: %s', frame.seq, e)
+            return frame
+
+        return replace(frame, data=data)
+
+    def _prune(self, seq: int):
+        for rendition in [r for r, (r_seq, _) in self._renditions.items() if seq - r_seq > self._max_lag]:
+            del self._renditions[rendition]
+
+    async def get(self, frame: Frame, rendition: Rendition) -> Frame:
+        if rendition.is_source:
+            return frame
+
+        if (entry := self._renditions.get(rendition)) is None or entry[0] < frame.seq:
+            self._prune(frame.seq)
+            entry = (frame.seq, asyncio.ensure_future(self._transcode(frame, rendition)))
+            self._renditions[rendition] = entry
+
+        # Shield: one client disconnecting must not cancel the rendition for others.
+        return await asyncio.shield(entry[1])
@@ -1,30 +1,6 @@
 from enum import IntEnum
-import logging
 
-try:
-    import wiringpi as wpi
-    from wiringpi import GPIO
-except ModuleNotFoundError:
-    logging.warning('WiringPi module can\'t be imported! Probably it\'s a testing environment?')
-
-    class GPIO(IntEnum):
-        OUTPUT = 0
-        INPUT = 1
-
-    class wpi:
-        _msg = 'WiringPi stub: module was not imported!'
-
-        @classmethod
-        def wiringPiSetup(cls):
-            logging.warning(cls._msg)
-
-        @classmethod
-        def pinMode(cls, a, b):
-            logging.warning(cls._msg)
-
-        @classmethod
-        def digitalWrite(cls, a, b):
-            logging.warning(cls._msg)
+from .gpio_backends import GPIOBackend, PinMode, ShadowGPIO, make_gpio_backend
 
 
 class Direction(IntEnum):
@@ -48,29 +24,62 @@ class Side(IntEnum):
 class CaterpillarController:
     """
     Controller for enabling or disabling caterpillars.
+
+    Track speeds are set with software PWM, hardware PWM (for the hardware_pwm_pins) or plain on/off outputs.
     """
 
-    def __init__(self, left_f: int = 2, left_b: int = 1, right_f: int = 0, right_b: int = 3):
+    def __init__(self, left_f: int = 2, left_b: int = 1, right_f: int = 0, right_b: int = 3,
+                 soft_pwm: bool = True, hardware_pwm_pins: tuple[int, ...] = (),
+                 backend: GPIOBackend | None = None):
         self._motion_table = ((left_f, left_b), (right_f, right_b))
+        self._gpio = ShadowGPIO(make_gpio_backend() if backend is None else backend)
+
+        self._gpio.setup({
+            i: PinMode.HARD_PWM if i in hardware_pwm_pins else PinMode.SOFT_PWM if soft_pwm else PinMode.OUTPUT
+            for i in [left_f, left_b, right_f, right_b]
+        })
+
+    @property
+    def gpio(self) -> ShadowGPIO:
+        return self._gpio
+
+    def _pin_value(self, pin: int, duty: float) -> int:
+        """
+        :param duty: duty cycle, 0.0 - 1.0.
+        """
+        pwm_range = self._gpio.pwm_range(pin)
+        return round(duty * pwm_range) if pwm_range > 1 else int(duty >= 0.5)
+
+    def set_tracks(self, left: float, right: float):
+        """
+        Set track speeds: -1.0 (full back) - 1.0 (full forward).
+        """
+        values = {}
+
+        for side, speed in ((Side.LEFT, left), (Side.RIGHT, right)):
+            pins = self._motion_table[side]
+            direction = Direction.FORWARD if speed >= 0 else Direction.BACK
+            # Low output to other pin.
+            values[pins[1 - direction]] = 0
+            # Duty cycle to destination pin.
+            values[pins[direction]] = self._pin_value(pins[direction], min(1.0, abs(speed)))
 
-        wpi.wiringPiSetup()
-
-        for i in [left_f, left_b, right_f, right_b]:
-            wpi.pinMode(i, GPIO.OUTPUT)
-            wpi.digitalWrite(i, 0)
+        self._gpio.write(values)
 
     def start_caterpillars(self, sides: {Side: Direction}):
+        values = {}
+
         for side, direction in sides.items():
             pins = self._motion_table[side]
             # Low output to other pin.
-            wpi.digitalWrite(pins[1 - direction], 0)
+            values[pins[1 - direction]] = 0
             # High output to destination pin.
-            wpi.digitalWrite(pins[direction], 1)
+            values[pins[direction]] = self._pin_value(pins[direction], 1.0)
+
+        self._gpio.write(values)
 
     def stop_caterpillars(self, sides: [Side]):
-        for side in sides:
-            for pin in self._motion_table[side]:
-                wpi.digitalWrite(pin, 0)
+        self._gpio.write({pin: 0 for side in sides for pin in self._motion_table[side]})
 
 
 class RobotMotionController:
@@ -78,8 +87,9 @@ class RobotMotionController:
     Robot motion controller.
     """
 
-    def __init__(self, cat_controller: CaterpillarController = CaterpillarController()):
-        self._cat_controller = cat_controller
+    def __init__(self, cat_controller: CaterpillarController | None = None):
+        # GPIO is initialized here, not when the module is imported.
+        self._cat_controller = CaterpillarController() if cat_controller is None else cat_controller
 
     def shift(self, direction: Direction):
         self._cat_controller.start_caterpillars(
@@ -91,3 +101,6 @@ class RobotMotionController:
     def stop(self):
         self._cat_controller.stop_caterpillars([Side.LEFT, Side.RIGHT])
 
+    def set_tracks(self, left: float, right: float):
+        self._cat_controller.set_tracks(left, right)
+
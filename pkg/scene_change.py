@@ -0,0 +1,146 @@
+"""
+Static scene suppression: frames, which don't differ from the last sent one, aren't sent to the client.
+
+Frames are compared by the small luminance thumbnails, the thumbnail is computed once per source frame and shared
+between all clients.
+"""
+
+import asyncio
+import io
+import logging
+import time
+
+import numpy as np
+from PIL import Image
+
+from .frame_hub import Frame
+from .metrics import REGISTRY
+
+
+THUMBNAIL_SIZE = (32, 24)
+
+FRAMES_SUPPRESSED = REGISTRY.counter('robo_frames_suppressed', 'Frames not sent, because the scene was static.',
+                                     ('camera', 'stream'))
+BYTES_SAVED = REGISTRY.counter('robo_bytes_saved', 'Bytes not sent, because the scene was static.',
+                               ('camera', 'stream'))
+CLIENT_BYTES_SAVED = REGISTRY.gauge('robo_client_bytes_saved', 'Bytes not sent to the client, because the scene '
+                                    'was static.', ('camera', 'stream', 'client'))
+
+
+def luminance_thumbnail(data: bytes, size: tuple[int, int] = THUMBNAIL_SIZE) -> np.ndarray:
+    """
+    Downscaled luminance of the JPEG image.
+    """
+    image = Image.open(io.BytesIO(data))
+    # Let libjpeg decode only luminance and downscale while decoding.
+    image.draft('L', size)
+    image = image.convert('L').resize(size, Image.Resampling.BOX)
+
+    return np.asarray(image, dtype=np.int16)
+
+
+def changed_fraction(thumbnail: np.ndarray, reference: np.ndarray, pixel_threshold: int) -> float:
+    """
+    Fraction of the thumbnail pixels, which luminance changed more than pixel_threshold.
+    """
+    if thumbnail.shape != reference.shape:
+        return 1.0
+
+    return np.count_nonzero(np.abs(thumbnail - reference) > pixel_threshold) / thumbnail.size
+
+
+class SceneChangeDetector:
+    """
+    Per-camera shared state: thumbnail of the newest frame and the time of the last wake up.
+    """
+
+    def __init__(self, threshold: float = 0.01, pixel_threshold: int = 8, keepalive: float = 1.0,
+                 hold: float = 2.0):
+        """
+        :param threshold: minimal fraction of the changed thumbnail pixels for the frame to be sent.
+        :param pixel_threshold: minimal luminance change of the thumbnail pixel (0-255), filters out sensor noise.
+        :param keepalive: static frame is sent after this time anyway (seconds).
+        :param hold: full frame rate is kept during this time after motion or wake up (seconds).
+        """
+        self.threshold = threshold
+        self.pixel_threshold = pixel_threshold
+        self.keepalive = keepalive
+        self.hold = hold
+        self._thumbnail: tuple[int, asyncio.Future] | None = None
+        self._woken = 0.0
+
+    @property
+    def woken(self) -> float:
+        return self._woken
+
+    def wake(self):
+        """
+        Return all clients to the full frame rate, i.e. motion is expected after the command.
+        """
+        self._woken = time.monotonic()
+
+    async def _compute(self, frame: Frame) -> np.ndarray | None:
+        try:
+            return await asyncio.to_thread(luminance_thumbnail, frame.data)
+        except OSError as e:
+            logging.warning('Frame %d thumbnail failed: %s', frame.seq, e)
+            return None
+
+    async def thumbnail(self, frame: Frame) -> np.ndarray | None:
+        if self._thumbnail is None or self._thumbnail[0] < frame.seq:
+            self._thumbnail = (frame.seq, asyncio.ensure_future(self._compute(frame)))
+        elif self._thumbnail[0] > frame.seq:
+            # Slow client got an older frame.
+            return await self._compute(frame)
+
+        # Shield: one client disconnecting must not cancel the thumbnail for others.
+        return await asyncio.shield(self._thumbnail[1])
+
+
+class StaticSceneFilter:
+    """
+    Per-client decision: frame is sent, when the scene changed since the last sent frame, during the hold time
+    after motion or wake up and once per keepalive interval.
+    """
+
+    def __init__(self, detector: SceneChangeDetector, camera_id: str, stream: str, client: str):
+        self._detector = detector
+        self._labels = {'camera': camera_id, 'stream': stream, 'client': client}
+        self._reference: np.ndarray | None = None
+        self._last_sent = 0.0
+        self._last_check = 0.0
+        self._active_until = 0.0
+        self._last_size = 0
+        self.frames_suppressed = 0
+        self.bytes_saved = 0
+
+    async def should_send(self, frame: Frame) -> bool:
+        detector = self._detector
+        now = frame.timestamp
+
+        if (thumbnail := await detector.thumbnail(frame)) is None:
+            return True
+
+        woken, self._last_check = detector.woken > self._last_check, time.monotonic()
+        if woken or self._reference is None or \
+                changed_fraction(thumbnail, self._reference, detector.pixel_threshold) >= detector.threshold:
+            self._active_until = now + detector.hold
+
+        if now < self._active_until or now - self._last_sent >= detector.keepalive:
+            self._reference = thumbnail
+            self._last_sent = now
+            return True
+
+        # Suppressed frame would be about the size of the last sent one.
+        self.frames_suppressed += 1
+        self.bytes_saved += self._last_size
+        FRAMES_SUPPRESSED.inc(camera=self._labels['camera'], stream=self._labels['stream'])
+        BYTES_SAVED.inc(self._last_size, camera=self._labels['camera'], stream=self._labels['stream'])
+        CLIENT_BYTES_SAVED.set(self.bytes_saved, **self._labels)
+        return False
+
+    def on_sent(self, size: int):
+        self._last_size = size
+
+    def close(self):
+        CLIENT_BYTES_SAVED.remove(**self._labels)
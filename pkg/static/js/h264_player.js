@@ -0,0 +1,77 @@
+/**
+ * H.264 fragmented MP4 player over WebSocket, uses Media Source Extensions.
+ */
+
+function start_h264_view(container, max_latency = 0.5)
+{
+    console.log("start_h264_view()");
+
+    const video = $("<video autoplay muted playsinline></video>")
+        .css({"width": "100%", "height": "100%", "object-fit": "contain"});
+    container.css("background-image", "none").empty().append(video);
+
+    const media_source = new MediaSource();
+    video[0].src = URL.createObjectURL(media_source);
+
+    const segments = [];
+    var source_buffer = null;
+
+    function append_next()
+    {
+        if (source_buffer === null || source_buffer.updating || segments.length === 0)
+        {
+            return;
+        }
+
+        const buffered = source_buffer.buffered;
+        if (buffered.length > 0 && video[0].currentTime - buffered.start(0) > 10)
+        {
+            // Drop played data, "updateend" will call us again.
+            source_buffer.remove(0, video[0].currentTime - 5);
+            return;
+        }
+
+        source_buffer.appendBuffer(segments.shift());
+    }
+
+    function catch_up()
+    {
+        // Don't accumulate latency: jump to the live edge.
+        const buffered = video[0].buffered;
+        if (buffered.length > 0 && buffered.end(buffered.length - 1) - video[0].currentTime > max_latency)
+        {
+            video[0].currentTime = buffered.end(buffered.length - 1) - 0.05;
+        }
+    }
+
+    media_source.addEventListener("sourceopen", () =>
+    {
+        const protocol = window.location.protocol === "https:" ? "wss:" : "ws:";
+        const socket = new WebSocket(protocol + "//" + window.location.host + "/video_ws");
+        socket.binaryType = "arraybuffer";
+
+        socket.onmessage = (event) =>
+        {
+            if (typeof event.data === "string")
+            {
+                const codec = JSON.parse(event.data).codec;
+                console.log("H.264 codec: " + codec);
+                source_buffer = media_source.addSourceBuffer(codec);
+                source_buffer.mode = "segments";
+                source_buffer.addEventListener("updateend", () => { catch_up(); append_next(); });
+                return;
+            }
+
+            segments.push(event.data);
+            append_next();
+        };
+
+        socket.onclose = () =>
+        {
+            console.log("H.264 stream closed, reconnecting...");
+            setTimeout(() => start_h264_view(container, max_latency), 1000);
+        };
+    });
+
+    return video;
+}
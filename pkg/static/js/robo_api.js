@@ -7,6 +7,11 @@ async function api_send_direction(direction, x, y)
     stop_sync = true;
     console.log("api_send_direction()")
 
+    if (control_send_direction(direction, x, y))
+    {
+        return;
+    }
+
     direction= {
         "direction": direction,
         "x": x,
@@ -36,6 +41,11 @@ async function api_send_ptz(pan, tilt, zoom)
     stop_sync = true;
     console.log("api_send_ptz()")
 
+    if (control_send_ptz(Number(pan), Number(tilt), Number(zoom)))
+    {
+        return;
+    }
+
     ptz_record = {
         "pan": pan,
         "tilt": tilt,
@@ -64,6 +74,11 @@ async function api_send_focus(auto_focus, focus_value)
 {
     console.log("api_send_focus()")
 
+    if (control_send_focus(auto_focus, focus_value))
+    {
+        return;
+    }
+
     focus = {
         "auto": auto_focus,
         "value": focus_value
@@ -120,6 +135,12 @@ async function api_get_connection()
 async function api_reset()
 {
     console.log("api_reset()");
+
+    if (control_send_reset())
+    {
+        return;
+    }
+
     return $.ajax("/api/camera/reset",
     {
         type : 'POST',
@@ -134,3 +155,137 @@ async function api_reset()
         }
     });
 }
+
+
+/**
+ * WebSocket control channel: compact binary commands, see pkg/control_protocol.py.
+ */
+
+const MSG_MOTION = 1;
+const MSG_PTZ = 2;
+const MSG_FOCUS = 3;
+const MSG_RESET = 4;
+const MSG_ACK = 0x80;
+const HEADER_SIZE = 4;
+const DIRECTIONS = ["C", "N", "NE", "E", "SE", "S", "SW", "W", "NW"];
+const NO_COORDINATE = -128;
+const NO_FOCUS_VALUE = -1;
+
+var control_socket = null;
+var control_seq = 0;
+var control_last_event_id = null;
+const control_sent = new Map();
+
+
+function api_connect_control(event_handler)
+{
+    const protocol = window.location.protocol === "https:" ? "wss:" : "ws:";
+    const query = control_last_event_id === null ? "" : "?last_event_id=" + control_last_event_id;
+
+    const socket = new WebSocket(protocol + "//" + window.location.host + "/api/control_ws" + query);
+    socket.binaryType = "arraybuffer";
+
+    socket.onopen = () => { control_socket = socket; };
+
+    socket.onmessage = (event) =>
+    {
+        if (typeof event.data === "string")
+        {
+            const message = JSON.parse(event.data);
+            control_last_event_id = message.id;
+            event_handler(message.event, message.data);
+            return;
+        }
+
+        const view = new DataView(event.data);
+        if (view.getUint8(0) === MSG_ACK)
+        {
+            const seq = view.getUint16(2, true);
+            const sent = control_sent.get(seq);
+            control_sent.delete(seq);
+
+            if (view.getUint8(HEADER_SIZE) !== 0)
+            {
+                console.error("Command " + seq + " failed, status = " + view.getUint8(HEADER_SIZE));
+            }
+            else if (sent !== undefined)
+            {
+                console.debug("Command " + seq + " RTT: " + (performance.now() - sent).toFixed(1) + " ms");
+            }
+        }
+    };
+
+    socket.onclose = () =>
+    {
+        console.log("Control channel closed, reconnecting...");
+        control_socket = null;
+        control_sent.clear();
+        setTimeout(() => api_connect_control(event_handler), 1000);
+    };
+}
+
+
+function control_send(type, payload_size, fill_payload)
+{
+    if (control_socket === null || control_socket.readyState !== WebSocket.OPEN)
+    {
+        return false;
+    }
+
+    const buffer = new ArrayBuffer(HEADER_SIZE + payload_size);
+    const view = new DataView(buffer);
+
+    control_seq = (control_seq + 1) & 0xffff;
+    view.setUint8(0, type);
+    view.setUint16(2, control_seq, true);
+    fill_payload(view);
+
+    control_sent.set(control_seq, performance.now());
+    control_socket.send(buffer);
+
+    return true;
+}
+
+
+function coordinate(value)
+{
+    return (value === null || value === undefined) ? NO_COORDINATE : Math.max(-127, Math.min(127, Number(value)));
+}
+
+
+function control_send_direction(direction, x, y)
+{
+    return control_send(MSG_MOTION, 3, (view) =>
+    {
+        view.setUint8(HEADER_SIZE, Math.max(0, DIRECTIONS.indexOf(direction)));
+        view.setInt8(HEADER_SIZE + 1, coordinate(x));
+        view.setInt8(HEADER_SIZE + 2, coordinate(y));
+    });
+}
+
+
+function control_send_ptz(pan, tilt, zoom)
+{
+    return control_send(MSG_PTZ, 12, (view) =>
+    {
+        view.setInt32(HEADER_SIZE, pan, true);
+        view.setInt32(HEADER_SIZE + 4, tilt, true);
+        view.setInt32(HEADER_SIZE + 8, zoom, true);
+    });
+}
+
+
+function control_send_focus(auto_focus, focus_value)
+{
+    return control_send(MSG_FOCUS, 5, (view) =>
+    {
+        view.setUint8(HEADER_SIZE, auto_focus ? 1 : 0);
+        view.setInt32(HEADER_SIZE + 1, (focus_value === null || focus_value === undefined) ? NO_FOCUS_VALUE : focus_value, true);
+    });
+}
+
+
+function control_send_reset()
+{
+    return control_send(MSG_RESET, 0, (view) => {});
+}
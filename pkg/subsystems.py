@@ -0,0 +1,182 @@
+"""
+Hardware subsystems startup: concurrent lazy initialization, readiness and startup timings.
+"""
+
+import asyncio
+from dataclasses import dataclass
+from enum import StrEnum
+import inspect
+import logging
+import time
+from typing import Any, Awaitable, Callable
+
+
+class SubsystemState(StrEnum):
+    PENDING = 'pending'
+    STARTING = 'starting'
+    READY = 'ready'
+    FAILED = 'failed'
+    STOPPED = 'stopped'
+
+
+@dataclass
+class Subsystem:
+    name: str
+    start: Callable[[], Awaitable[Any] | Any]
+    stop: Callable[[], Awaitable[Any] | Any] | None = None
+    # Subsystem is required for the readiness.
+    required: bool = True
+    # Retry failed start after this delay (seconds), None - don't retry.
+    retry_delay: float | None = None
+
+    state: SubsystemState = SubsystemState.PENDING
+    error: str | None = None
+    attempts: int = 0
+    # Seconds since the boot.
+    ready_at: float | None = None
+    start_duration: float | None = None
+
+    def status(self) -> dict[str, Any]:
+        return {
+            'state': self.state, 'error': self.error, 'required': self.required, 'attempts': self.attempts,
+            'ready_at': self.ready_at, 'start_duration': self.start_duration,
+        }
+
+
+async def _call(function: Callable[[], Awaitable[Any] | Any]):
+    result = function()
+    if inspect.isawaitable(result):
+        result = await result
+    return result
+
+
+class SubsystemManager:
+    """
+    Starts subsystems concurrently in the background, so the server is available while hardware is coming up.
+
+    Failed subsystems don't stop the others: the server works in the degraded mode.
+    """
+
+    def __init__(self, boot_time: float | None = None):
+        """
+        :param boot_time: time.monotonic() of the process start.
+        """
+        self.boot_time = time.monotonic() if boot_time is None else boot_time
+        self.subsystems: dict[str, Subsystem] = {}
+        # Startup phase name: seconds since the boot.
+        self.phases: dict[str, float] = {}
+        self._starter: asyncio.Future | None = None
+
+    def add(self, name: str, start: Callable[[], Awaitable[Any] | Any],
+            stop: Callable[[], Awaitable[Any] | Any] | None = None, required: bool = True,
+            retry_delay: float | None = None) -> Subsystem:
+        """
+        :param start: blocking functions must be wrapped with asyncio.to_thread() by the caller.
+        :param stop: called for the started subsystem and for the one, which start was cancelled by stop().
+        """
+        subsystem = Subsystem(name, start, stop, required, retry_delay)
+        self.subsystems[name] = subsystem
+        return subsystem
+
+    def mark(self, phase: str) -> float:
+        """
+        Record startup phase.
+
+        :return: seconds since the boot.
+        """
+        elapsed = time.monotonic() - self.boot_time
+        self.phases.setdefault(phase, elapsed)
+        logging.info('Startup phase "%s": %.3f s since boot.', phase, elapsed)
+        return elapsed
+
+    def is_ready(self, name: str) -> bool:
+        return (subsystem := self.subsystems.get(name)) is not None and SubsystemState.READY == subsystem.state
+
+    @property
+    def ready(self) -> bool:
+        return all(SubsystemState.READY == s.state for s in self.subsystems.values() if s.required)
+
+    def health(self) -> dict[str, Any]:
+        states = [s.state for s in self.subsystems.values()]
+
+        if all(SubsystemState.READY == state for state in states):
+            status = 'ok'
+        elif any(state in (SubsystemState.PENDING, SubsystemState.STARTING) for state in states):
+            status = 'starting'
+        else:
+            status = 'degraded'
+
+        return {
+            'status': status,
+            'uptime': time.monotonic() - self.boot_time,
+            'subsystems': {name: s.status() for name, s in self.subsystems.items()},
+            'phases': self.phases,
+        }
+
+    async def _start(self, subsystem: Subsystem):
+        while True:
+            subsystem.state = SubsystemState.STARTING
+            subsystem.attempts += 1
+            started = time.monotonic()
+
+            try:
+                await _call(subsystem.start)
+            except Exception as e:
+                subsystem.state = SubsystemState.FAILED
+                subsystem.error = str(e) or e.__class__.__name__
+                logging.error('Subsystem "%s" start failed (attempt %d): %s', subsystem.name, subsystem.attempts,
+                              subsystem.error)
+
+                if subsystem.retry_delay is None:
+                    return
+
+                await asyncio.sleep(subsystem.retry_delay)
+                continue
+
+            subsystem.state = SubsystemState.READY
+            subsystem.error = None
+            subsystem.start_duration = time.monotonic() - started
+            subsystem.ready_at = self.mark(f'{subsystem.name}_ready')
+            logging.info('Subsystem "%s" started in %.3f s.', subsystem.name, subsystem.start_duration)
+            return
+
+    def start(self):
+        """
+        Start all subsystems concurrently, doesn't wait for them.
+        """
+        if self._starter is None:
+            self._starter = asyncio.gather(*[self._start(s) for s in self.subsystems.values()])
+
+    async def wait_started(self):
+        """
+        Wait until all subsystems are started or have failed without retries.
+        """
+        if self._starter is not None:
+            await asyncio.shield(self._starter)
+
+    async def stop(self):
+        """
+        Stop started subsystems in the reverse order.
+
+        Subsystems, which were starting, are stopped too: their start is cancelled and may leave a partially
+        started subsystem, so stop functions must handle it.
+        """
+        if self._starter is not None:
+            self._starter.cancel()
+            try:
+                await self._starter
+            except asyncio.CancelledError:
+                pass
+            self._starter = None
+
+        for subsystem in reversed(self.subsystems.values()):
+            if subsystem.state not in (SubsystemState.READY, SubsystemState.STARTING):
+                continue
+
+            try:
+                if subsystem.stop is not None:
+                    await _call(subsystem.stop)
+            except Exception as e:
+                logging.error('Subsystem "%s" stop failed: %s', subsystem.name, e)
+
+            subsystem.state = SubsystemState.STOPPED
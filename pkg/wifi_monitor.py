@@ -1,4 +1,11 @@
+from collections import deque
+from dataclasses import dataclass, replace
 import logging
+import shutil
+import subprocess
+import threading
+import time
+from typing import Callable
 
 
 def check_wf_adapter(line: str) -> bool:
@@ -10,40 +17,214 @@ def check_wf_adapter(line: str) -> bool:
     return False
 
 
-def get_wifi_signal_strength() -> int | None:
+@dataclass(frozen=True)
+class LinkSample:
     """
-    Reads the Wi-Fi signal strength from /proc/net/wireless.
-    Returns the signal strength in dBm as an integer, or None if an error occurs.
+    Wireless link metrics, None when metric isn't available.
     """
+
+    timestamp: float
+    interface: str | None
+    # Signal and noise levels, dBm.
+    level: float | None = None
+    noise: float | None = None
+    # Link quality, driver-specific units (usually 0 - 70).
+    quality: float | None = None
+    # nl80211 station info: TX bitrate (MBit/s) and cumulative counters.
+    bitrate: float | None = None
+    tx_retries: int | None = None
+    tx_failed: int | None = None
+
+
+def _parse_float(value: str) -> float | None:
     try:
-        with open('/proc/net/wireless', 'r') as wf_devs:
-            lines = wf_devs.readlines()
-            header = {i: n.lower() for i, n in enumerate(lines[1].split('|'))}
-
-            link_field_num = [i for i, n in header.items() if 'level' in n][0]
-            level_field_num = [i for i, n in header.items() if 'link' in n][0]
-
-            # Skip header lines.
-            for line in lines[2:]:
-                # Check for typical interface names.
-                if check_wf_adapter(line):
-                    parts = line.strip().split()
-                    if len(parts) > max(link_field_num, level_field_num):
-                        # Example format: interface | status | quality/max | level(dBm) | noise | ...
-                        try:
-                            # Try getting the signal level directly.
-                            signal_level_dbm = int(float(parts[link_field_num]))
-                            return signal_level_dbm
-                        except ValueError:
-                            # If not an int, try parsing quality percentage.
-                            quality_str = parts[level_field_num]
-                            if '/' in quality_str:
-                                quality, max_quality = map(int, quality_str.split('/'))
-                                # Approximate conversion to dBm if needed (less accurate)
-                                return (quality / max_quality) * 100
-                            else:
-                                return int(float(quality_str))
-    except IOError as e:
-        logging.error('Error reading /proc/net/wireless: %s', e)
+        return float(value.rstrip('.'))
+    except ValueError:
+        return None
+
+
+def read_wireless(path: str = '/proc/net/wireless') -> LinkSample | None:
+    """
+    Read the first wireless interface from /proc/net/wireless.
+    """
+    with open(path, 'r') as wf_devs:
+        # Skip header lines.
+        lines = wf_devs.readlines()[2:]
+
+    for line in lines:
+        if not check_wf_adapter(line):
+            continue
+
+        # Format: interface: status link level noise ...
+        parts = line.split()
+        if len(parts) < 5:
+            continue
+
+        level, noise = _parse_float(parts[3]), _parse_float(parts[4])
+        # Some drivers report levels as unsigned 8-bit values.
+        if level is not None and level > 0:
+            level -= 256
+        # -256: noise isn't reported.
+        if noise is not None and noise <= -256:
+            noise = None
+
+        return LinkSample(time.monotonic(), parts[0].rstrip(':'), level, noise, _parse_float(parts[2]))
 
     return None
+
+
+STATION_FIELDS = {
+    'tx bitrate': ('bitrate', float),
+    'tx retries': ('tx_retries', int),
+    'tx failed': ('tx_failed', int),
+}
+
+
+def read_station(interface: str, timeout: float = 1.0) -> dict[str, float | int]:
+    """
+    Station info from nl80211 (`iw dev <interface> station dump`).
+    """
+    result = subprocess.run(['iw', 'dev', interface, 'station', 'dump'], capture_output=True, text=True,
+                            timeout=timeout, check=True)
+    station = {}
+
+    for line in result.stdout.splitlines():
+        name, _, value = line.strip().partition(':')
+        if (field := STATION_FIELDS.get(name)) is not None and (words := value.split()):
+            try:
+                station[field[0]] = field[1](words[0])
+            except ValueError:
+                pass
+
+    return station
+
+
+def _summary(values: list[float]) -> dict[str, float] | None:
+    if not values:
+        return None
+    return {'min': min(values), 'avg': sum(values) / len(values), 'max': max(values)}
+
+
+class LinkSampler:
+    """
+    Samples link metrics with the fixed rate into the ring buffer.
+
+    Readers get cached values, so the sampling cost doesn't depend on the number of clients.
+    """
+
+    def __init__(self, interval: float = 1.0, history_size: int = 30, station_interval: float = 5.0,
+                 level_threshold: float = 3.0, on_change: Callable[[LinkSample], None] | None = None,
+                 wireless_path: str = '/proc/net/wireless'):
+        """
+        :param station_interval: nl80211 station info is read less often: it requires running `iw`.
+        :param level_threshold: on_change is called, when level changes by this value (dB).
+        :param on_change: called from the sampler thread with the new sample.
+        """
+        self._interval = interval
+        self._station_interval = station_interval
+        self._level_threshold = level_threshold
+        self._on_change = on_change
+        self._wireless_path = wireless_path
+
+        self._history: deque[LinkSample] = deque(maxlen=history_size)
+        self._station: dict[str, float | int] = {}
+        self._station_checked = -station_interval
+        self._has_iw = shutil.which('iw') is not None
+        self._reported: LinkSample | None = None
+
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    @property
+    def latest(self) -> LinkSample | None:
+        return self._history[-1] if self._history else None
+
+    def level(self) -> float | None:
+        """
+        Smoothed signal level (dBm).
+        """
+        levels = [sample.level for sample in list(self._history) if sample.level is not None]
+        return sum(levels) / len(levels) if levels else None
+
+    def stats(self) -> dict[str, dict[str, float] | None]:
+        """
+        Rolling min/avg/max values.
+        """
+        history = list(self._history)
+        return {
+            name: _summary([value for sample in history if (value := getattr(sample, name)) is not None])
+            for name in ['level', 'noise', 'quality', 'bitrate']
+        }
+
+    def start(self):
+        if self._thread is not None:
+            return
+
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='link_sampler', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if self._thread is None:
+            return
+
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+
+    def _read_station(self, interface: str, now: float) -> dict[str, float | int]:
+        if not self._has_iw or now - self._station_checked < self._station_interval:
+            return self._station
+
+        self._station_checked = now
+        try:
+            self._station = read_station(interface)
+        except (OSError, subprocess.SubprocessError) as e:
+            logging.debug('Station info for %s is not available: %s', interface, e)
+            self._station = {}
+
+        return self._station
+
+    def sample(self) -> LinkSample:
+        now = time.monotonic()
+
+        try:
+            sample = read_wireless(self._wireless_path)
+        except (IOError, IndexError) as e:
+            logging.debug('Error reading %s: %s', self._wireless_path, e)
+            sample = None
+
+        if sample is None:
+            self._station = {}
+            return LinkSample(now, None)
+
+        return replace(sample, **self._read_station(sample.interface, now))
+
+    def _changed(self, sample: LinkSample) -> bool:
+        reported = self._reported
+        if reported is None or reported.interface != sample.interface or reported.bitrate != sample.bitrate:
+            return True
+
+        if (reported.level is None) != (sample.level is None):
+            return True
+
+        return sample.level is not None and abs(sample.level - reported.level) >= self._level_threshold
+
+    def _run(self):
+        logging.info('Link sampler started.')
+
+        while not self._stop.is_set():
+            sample = self.sample()
+            self._history.append(sample)
+
+            if self._changed(sample):
+                self._reported = sample
+                if self._on_change is not None:
+                    try:
+                        self._on_change(sample)
+                    except Exception as e:
+                        logging.error('Link change handler failed: %s', e)
+
+            self._stop.wait(self._interval)
+
+        logging.info('Link sampler stopped.')